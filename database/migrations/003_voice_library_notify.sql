@@ -0,0 +1,27 @@
+-- Migration: 003_voice_library_notify
+-- Description: Track voice_library edits and notify listeners (Chatterbox TTS) of changes
+-- Created: 2026-10-19
+
+-- Edits bump updated_at, which versions a voice's cached speaker embeddings
+ALTER TABLE voice_library ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+ALTER TABLE voice_library ADD COLUMN IF NOT EXISTS gender VARCHAR(20);
+
+DROP TRIGGER IF EXISTS update_voice_library_updated_at ON voice_library;
+CREATE TRIGGER update_voice_library_updated_at BEFORE UPDATE ON voice_library
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- NOTIFY voice_library_changed with {"op": "INSERT|UPDATE|DELETE", "id": "<uuid>"}
+CREATE OR REPLACE FUNCTION notify_voice_library_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify(
+        'voice_library_changed',
+        json_build_object('op', TG_OP, 'id', COALESCE(NEW.id, OLD.id))::text
+    );
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS voice_library_changed ON voice_library;
+CREATE TRIGGER voice_library_changed AFTER INSERT OR UPDATE OR DELETE ON voice_library
+    FOR EACH ROW EXECUTE FUNCTION notify_voice_library_changed();
@@ -0,0 +1,379 @@
+"""
+Pipeline Benchmark
+Drives the real video orchestrator (and the real ComfyUI API wrapper) against local
+service stand-ins with an async load generator, then reports throughput, per-stage
+latency percentiles, Redis round trips per job and orchestrator event-loop lag.
+
+Requires a reachable Redis (REDIS_URL, default redis://localhost:6379).
+
+    python run_pipeline_benchmark.py --jobs 200 --concurrency 20
+    python run_pipeline_benchmark.py --compare results/baseline.json
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+from standins import StandinProfile
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICES_DIR = os.path.dirname(BENCHMARK_DIR)
+ORCHESTRATOR_DIR = os.path.join(SERVICES_DIR, "video-orchestrator")
+COMFYUI_DIR = os.path.join(SERVICES_DIR, "comfyui")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+# Metrics compared against a baseline, and which direction is better
+COMPARED_METRICS = {
+    "jobs_per_second": "higher",
+    "job_latency.p50": "lower",
+    "job_latency.p95": "lower",
+    "job_latency.p99": "lower",
+    "redis_ops_per_job": "lower",
+    "event_loop_lag_ms.p99": "lower",
+    "event_loop_lag_ms.max": "lower",
+}
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p90/p95/p99/max of a sample (nearest-rank)"""
+    if not values:
+        return {"count": 0, "p50": None, "p90": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return round(ordered[index], 6)
+
+    return {
+        "count": len(ordered),
+        "p50": rank(0.50),
+        "p90": rank(0.90),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "max": round(ordered[-1], 6),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVICES_DIR, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+async def wait_for_http(url: str, timeout: float = 30.0):
+    """Poll a URL until it answers 200"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag on the loop it runs in: how late a periodic
+    sleep wakes up beyond its requested interval.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples_ms: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples_ms.append(max(0.0, (loop.time() - start - self.interval) * 1000.0))
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+
+class OrchestratorThread:
+    """Runs the orchestrator app under uvicorn on its own thread and event loop"""
+
+    def __init__(self, app, port: int):
+        import uvicorn
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=port, log_level="warning", access_log=False
+        ))
+        self.server.install_signal_handlers = lambda: None
+        self.lag = LoopLagMonitor()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread = threading.Thread(target=self._run, name="orchestrator", daemon=True)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self.lag.start)
+        self.loop.run_until_complete(self.server.serve())
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.lag.stop)
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def redis_command_counts() -> Dict[str, float]:
+    """Redis round trips per command, from the orchestrator's metrics registry"""
+    from metrics import REGISTRY
+    counts: Dict[str, float] = {}
+    for family in REGISTRY.collect():
+        if family.name != "orchestrator_redis_command_duration_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_count"):
+                counts[sample.labels["command"]] = sample.value
+    return counts
+
+
+def stage_latencies() -> Dict[str, Dict[str, Optional[float]]]:
+    """Per-stage latency percentiles (seconds) from the in-memory span exporter"""
+    import tracing
+    if tracing.memory_exporter is None:
+        return {}
+    durations: Dict[str, List[float]] = {}
+    for span in tracing.memory_exporter.get_finished_spans():
+        if span.name.startswith("stage."):
+            stage = span.name[len("stage."):]
+            durations.setdefault(stage, []).append((span.end_time - span.start_time) / 1e9)
+    return {stage: percentiles(values) for stage, values in sorted(durations.items())}
+
+
+async def run_job(client: httpx.AsyncClient, base_url: str, index: int, poll_interval: float,
+                  timeout: float) -> Dict[str, Any]:
+    """Submit one job and poll it to completion"""
+    user_id = f"bench-user-{index % 50}"
+    start = time.perf_counter()
+    try:
+        response = await client.post(
+            f"{base_url}/api/video/generate",
+            params={"user_id": user_id},
+            json={"prompt": f"Benchmark job {index}: a 30-second ad for a coffee brand"},
+        )
+    except httpx.HTTPError:
+        return {"status": "submit_failed", "latency": time.perf_counter() - start}
+    if response.status_code != 200:
+        return {"status": "submit_failed", "latency": time.perf_counter() - start}
+    job_id = response.json()["job_id"]
+
+    deadline = start + timeout
+    status = "pending"
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(poll_interval)
+        try:
+            result = await client.get(f"{base_url}/api/video/jobs/{job_id}", params={"user_id": user_id})
+        except httpx.HTTPError:
+            continue
+        if result.status_code != 200:
+            continue
+        status = result.json()["status"]
+        if status in ("completed", "failed", "cancelled"):
+            break
+    else:
+        status = "timeout"
+    return {"status": status, "latency": time.perf_counter() - start}
+
+
+async def generate_load(base_url: str, jobs: int, concurrency: int, poll_interval: float,
+                        timeout: float) -> Dict[str, Any]:
+    """Closed-loop load: `concurrency` clients each run jobs back to back"""
+    counter = iter(range(jobs))
+    results: List[Dict[str, Any]] = []
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+
+    async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+        async def worker():
+            for index in counter:
+                results.append(await run_job(client, base_url, index, poll_interval, timeout))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    by_status: Dict[str, int] = {}
+    for result in results:
+        by_status[result["status"]] = by_status.get(result["status"], 0) + 1
+    completed = [r["latency"] for r in results if r["status"] == "completed"]
+    return {
+        "wall_seconds": round(wall, 3),
+        "jobs_per_second": round(len(completed) / wall, 4) if wall else 0.0,
+        "jobs_by_status": by_status,
+        "job_latency": percentiles(completed),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Return human-readable regressions beyond `threshold` (a fraction)"""
+    def lookup(data: Dict[str, Any], dotted: str):
+        for part in dotted.split("."):
+            if not isinstance(data, dict) or part not in data:
+                return None
+            data = data[part]
+        return data
+
+    regressions = []
+    print(f"\n{'metric':<28}{'baseline':>14}{'current':>14}{'change':>10}")
+    for metric, better in COMPARED_METRICS.items():
+        old = lookup(baseline["results"], metric)
+        new = lookup(current["results"], metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = change < -threshold if better == "higher" else change > threshold
+        flag = "  REGRESSION" if worse else ""
+        print(f"{metric:<28}{old:>14.4f}{new:>14.4f}{change:>+10.1%}{flag}")
+        if worse:
+            regressions.append(f"{metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+async def benchmark(args) -> Dict[str, Any]:
+    profile = StandinProfile.from_dict(json.load(open(args.profile)) if args.profile else {})
+    profile.seed = args.seed if args.seed is not None else profile.seed
+    ports = profile.ports
+
+    # 1. Stand-ins and the real ComfyUI API wrapper run in their own processes
+    standins = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARK_DIR, "standins.py"),
+         "--profile-json", json.dumps(profile.to_dict())],
+    )
+    comfyui_env = dict(os.environ, COMFYUI_URL=f"http://127.0.0.1:{ports['comfyui']}", TRACE_EXPORTER="none")
+    for name in ("whisper", "chatterbox", "comfyui", "langgraph"):
+        await wait_for_http(f"http://127.0.0.1:{ports[name]}/" + ("" if name == "comfyui" else "health"))
+    comfyui_api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(args.comfyui_api_port), "--log-level", "warning"],
+        cwd=COMFYUI_DIR, env=comfyui_env,
+    )
+
+    try:
+        await wait_for_http(f"http://127.0.0.1:{args.comfyui_api_port}/health")
+
+        # 2. The orchestrator runs in this process so its metrics and spans can be read directly
+        os.environ.update({
+            "REDIS_URL": args.redis_url,
+            "WHISPER_API_URL": f"http://127.0.0.1:{ports['whisper']}",
+            "CHATTERBOX_API_URL": f"http://127.0.0.1:{ports['chatterbox']}",
+            "COMFYUI_API_URL": f"http://127.0.0.1:{args.comfyui_api_port}",
+            "LANGGRAPH_API_URL": f"http://127.0.0.1:{ports['langgraph']}",
+            "COMFYUI_POLL_INTERVAL": str(args.comfyui_poll_interval),
+            "TRACE_EXPORTER": "memory",
+        })
+        sys.path.insert(0, ORCHESTRATOR_DIR)
+        import main as orchestrator
+
+        server = OrchestratorThread(orchestrator.app, args.port)
+        server.start()
+        base_url = f"http://127.0.0.1:{args.port}"
+        await wait_for_http(f"{base_url}/health")
+
+        redis_before = redis_command_counts()
+        load = await generate_load(base_url, args.jobs, args.concurrency, args.poll_interval, args.job_timeout)
+        redis_after = redis_command_counts()
+        server.stop()
+    finally:
+        comfyui_api.terminate()
+        standins.terminate()
+        comfyui_api.wait(timeout=10)
+        standins.wait(timeout=10)
+
+    redis_delta = {
+        command: redis_after[command] - redis_before.get(command, 0.0)
+        for command in redis_after
+        if redis_after[command] - redis_before.get(command, 0.0) > 0
+    }
+    submitted = max(1, sum(load["jobs_by_status"].values()))
+    lag = percentiles(server.lag.samples_ms)
+
+    return {
+        "meta": {
+            "benchmark": "pipeline",
+            "git_commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "config": {
+                "jobs": args.jobs,
+                "concurrency": args.concurrency,
+                "poll_interval": args.poll_interval,
+                "comfyui_poll_interval": args.comfyui_poll_interval,
+                "profile": profile.to_dict(),
+            },
+        },
+        "results": {
+            **load,
+            "stage_latency_seconds": stage_latencies(),
+            # Includes the load generator's status polls, which hit Redis too
+            "redis_ops_per_job": round(sum(redis_delta.values()) / submitted, 2),
+            "redis_ops_by_command": {k: round(v / submitted, 2) for k, v in sorted(redis_delta.items())},
+            "event_loop_lag_ms": lag,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end video pipeline benchmark")
+    parser.add_argument("--jobs", type=int, default=100, help="Total jobs to run")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent load-generator clients")
+    parser.add_argument("--profile", help="Stand-in latency/failure profile (JSON, see standins.StandinProfile)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for stand-in latency sampling")
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://localhost:6379"))
+    parser.add_argument("--port", type=int, default=18003, help="Orchestrator port")
+    parser.add_argument("--comfyui-api-port", type=int, default=18005, help="ComfyUI API wrapper port")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="Client job-status poll interval (s)")
+    parser.add_argument("--comfyui-poll-interval", type=float, default=0.25,
+                        help="Orchestrator ComfyUI poll interval (s)")
+    parser.add_argument("--job-timeout", type=float, default=600.0, help="Per-job timeout (s)")
+    parser.add_argument("--output", help="Where to write the JSON result (default: results/<commit>.json)")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Regression threshold (fraction)")
+    args = parser.parse_args()
+
+    result = asyncio.run(benchmark(args))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{result['meta']['git_commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result["results"], indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,498 @@
+"""
+Whisper Service Benchmark
+Runs the real Whisper API on CPU against synthetic speech-like audio and
+reports real-time factor, streaming time-to-first-segment, requests/s under
+concurrency, peak RSS and temp-disk usage.
+
+One server is started per model size and batch size (BATCH_MAX_SIZE); every
+response format is measured against it. Transcription caching is disabled,
+concurrent requests send distinct bytes so the cache's single-flight
+deduplication cannot merge them, and every response must report a cache
+miss, so every request does the work. The audio is generated (harmonic "syllables"
+with word and sentence pauses, so VAD and long-form splitting behave as with
+speech); pass --audio to tile a real recording to each length instead.
+
+Linux only (RSS and disk usage are read from /proc). Requires the Whisper
+API's dependencies and ffmpeg; models are downloaded on first use.
+
+    python run_whisper_benchmark.py --models tiny,base --batch-sizes 1,8
+    python run_whisper_benchmark.py --compare results/whisper-abc1234.json
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+import httpx
+import numpy as np
+
+from run_pipeline_benchmark import git_commit, percentiles, wait_for_http
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICES_DIR = os.path.dirname(BENCHMARK_DIR)
+WHISPER_DIR = os.path.join(SERVICES_DIR, "whisper-api")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+SAMPLE_RATE = 16000
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Metrics compared per case against a baseline, and which direction is better
+COMPARED_METRICS = {
+    "rtf": "lower",
+    "time_to_first_segment.p50": "lower",
+    "requests_per_second": "higher",
+    "latency.p95": "lower",
+    "peak_rss_mb": "lower",
+    "peak_temp_disk_mb": "lower",
+}
+
+
+def synthetic_speech(seconds: float, seed: int = 0) -> np.ndarray:
+    """
+    Speech-like audio: voiced syllables (a pitch contour with two formant
+    peaks) grouped into words and sentences, over a faint noise floor
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SAMPLE_RATE)
+    audio = rng.normal(0.0, 0.002, total).astype(np.float32)
+    position = int(0.3 * SAMPLE_RATE)
+    while position < total:
+        for _ in range(rng.integers(3, 12)):  # words per sentence
+            for _ in range(rng.integers(1, 4)):  # syllables per word
+                length = int(rng.uniform(0.12, 0.25) * SAMPLE_RATE)
+                t = np.arange(length) / SAMPLE_RATE
+                f0 = rng.uniform(100, 220) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(2, 5) * t))
+                phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+                formants = rng.uniform(300, 900), rng.uniform(900, 2500)
+                syllable = np.zeros(length)
+                for harmonic in range(1, 20):
+                    frequency = f0.mean() * harmonic
+                    gain = sum(np.exp(-((frequency - formant) / 150) ** 2) for formant in formants) + 0.05
+                    syllable += gain / harmonic * np.sin(harmonic * phase)
+                syllable *= np.hanning(length) * 0.3 / max(1e-6, np.abs(syllable).max())
+                end = min(total, position + length)
+                audio[position:end] += syllable[:max(0, end - position)]
+                position += length
+            position += int(rng.uniform(0.05, 0.15) * SAMPLE_RATE)
+        position += int(rng.uniform(0.4, 0.8) * SAMPLE_RATE)
+    return np.clip(audio, -1.0, 1.0)
+
+
+def load_recording(path: str) -> np.ndarray:
+    """Decode any audio file to 16 kHz mono float32 with ffmpeg"""
+    command = [os.getenv("FFMPEG_BINARY", "ffmpeg"), "-nostdin", "-v", "error", "-i", path,
+               "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"]
+    pcm = subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout
+    return np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+
+
+def to_wav(audio: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((audio * 32767).astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+
+def make_clips(lengths: List[float], recording: Optional[str]) -> Dict[float, bytes]:
+    """WAV bytes per length, synthetic or tiled from a recording"""
+    source = load_recording(recording) if recording else None
+    clips = {}
+    for index, seconds in enumerate(sorted(set(lengths))):
+        if source is None:
+            audio = synthetic_speech(seconds, seed=index)
+        else:
+            audio = np.resize(source, int(seconds * SAMPLE_RATE))
+        clips[seconds] = to_wav(audio)
+    return clips
+
+
+def unique_clip(clip: bytes, index: int) -> bytes:
+    """
+    A copy of a WAV clip whose last samples encode `index` (inaudible: at
+    most a few LSBs), so identical requests hash differently
+    """
+    return clip[:-8] + index.to_bytes(8, "little")
+
+
+def process_tree_rss(root: int) -> int:
+    """Resident bytes of a process and all of its descendants (ffmpeg, pool workers)"""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, stack = 0, [root]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            pass
+        stack += children.get(pid, [])
+    return total
+
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # removed while walking
+    return total
+
+
+class ResourceSampler:
+    """Samples a server's tree RSS and its scratch directory size on a thread"""
+
+    def __init__(self, pid: int, scratch_dir: str, interval: float = 0.1):
+        self.pid = pid
+        self.scratch_dir = scratch_dir
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_disk = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, process_tree_rss(self.pid))
+            self.peak_disk = max(self.peak_disk, directory_bytes(self.scratch_dir))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+
+class WhisperServer:
+    """The Whisper API under uvicorn, with its temp and job directories in a scratch dir"""
+
+    def __init__(self, port: int, scratch_dir: str, env: Dict[str, str]):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        tmp_dir = os.path.join(scratch_dir, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        self.env = dict(
+            os.environ,
+            TMPDIR=tmp_dir,
+            JOB_UPLOAD_DIR=os.path.join(scratch_dir, "jobs"),
+            TRANSCRIPTION_CACHE="none",
+            TRACE_EXPORTER="none",
+            **env,
+        )
+        self.process: Optional[subprocess.Popen] = None
+
+    async def start(self, timeout: float):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--log-level", "warning"],
+            cwd=WHISPER_DIR, env=self.env,
+        )
+        # Startup loads the model (downloading it the first time) before the port opens
+        waiting = asyncio.create_task(wait_for_http(f"{self.url}/health", timeout=timeout))
+        while not waiting.done():
+            if self.process.poll() is not None:
+                waiting.cancel()
+                raise RuntimeError(f"Whisper API exited during startup (code {self.process.returncode})")
+            await asyncio.sleep(0.5)
+        await waiting
+        async with httpx.AsyncClient() as client:
+            health = (await client.get(f"{self.url}/health")).json()
+        if not health.get("model_loaded"):
+            raise RuntimeError(f"Whisper model failed to load: {health}")
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+async def transcribe(client: httpx.AsyncClient, url: str, clip: bytes, response_format: str,
+                     language: Optional[str]) -> float:
+    """Seconds for one /transcribe request (which must have been transcribed, not cached or shared)"""
+    data = {"response_format": response_format}
+    if language:
+        data["language"] = language
+    started = time.perf_counter()
+    response = await client.post(f"{url}/transcribe", files={"file": ("clip.wav", clip, "audio/wav")}, data=data)
+    response.raise_for_status()
+    elapsed = time.perf_counter() - started
+    cache_status = response.headers.get("X-Transcription-Cache")
+    if cache_status != "miss":
+        raise RuntimeError(f"Expected a transcription cache miss, got {cache_status!r}: the measurement is invalid")
+    return elapsed
+
+
+async def measure_rtf(client: httpx.AsyncClient, url: str, clips: Dict[float, bytes], lengths: List[float],
+                      response_format: str, language: Optional[str], runs: int) -> Dict[str, Any]:
+    """Median processing time / audio duration per length, and over all lengths"""
+    by_length = {}
+    compute = 0.0
+    for seconds in lengths:
+        timings = [await transcribe(client, url, clips[seconds], response_format, language) for _ in range(runs)]
+        by_length[f"{seconds:g}s"] = round(statistics.median(timings) / seconds, 4)
+        compute += statistics.median(timings)
+    return {"rtf": round(compute / sum(lengths), 4), "rtf_by_length": by_length}
+
+
+async def measure_first_segment(client: httpx.AsyncClient, url: str, clip: bytes, language: Optional[str],
+                                runs: int) -> Dict[str, Any]:
+    """
+    Seconds from the start of a /transcribe/stream upload to the first
+    transcript event (partial or segment; `done` if the audio yields neither)
+    """
+    params = {"format": "wav"}
+    if language:
+        params["language"] = language
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        first = None
+        async with client.stream("POST", f"{url}/transcribe/stream", params=params, content=clip) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "error":
+                    raise RuntimeError(f"Streaming transcription failed: {event['detail']}")
+                if first is None and event["type"] in ("partial", "segment", "done"):
+                    first = time.perf_counter() - started
+        timings.append(first)
+    return percentiles([timing for timing in timings if timing is not None])
+
+
+async def measure_throughput(client: httpx.AsyncClient, url: str, clip: bytes, response_format: str,
+                             language: Optional[str], concurrency: int, requests: int) -> Dict[str, Any]:
+    """Closed-loop load: `concurrency` clients each send requests back to back"""
+    counter = iter(range(requests))
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            try:
+                # Distinct bytes per request: identical concurrent uploads would share one transcription
+                latencies.append(await transcribe(client, url, unique_clip(clip, index), response_format, language))
+            except httpx.HTTPError:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    return {
+        "requests_per_second": round(len(latencies) / wall, 4) if wall else 0.0,
+        "errors": errors,
+        "latency": percentiles(latencies),
+    }
+
+
+async def benchmark_server(args, model: str, batch_size: int, clips: Dict[float, bytes]) -> Dict[str, Any]:
+    """Start one server and measure every response format against it"""
+    scratch_dir = tempfile.mkdtemp(prefix="whisper-benchmark-")
+    server = WhisperServer(args.port, scratch_dir, {
+        "MODEL_SIZE": model,
+        "DEVICE": "cpu",
+        "BATCH_MAX_SIZE": str(batch_size),
+    })
+    print(f"Starting Whisper API: model={model} batch_size={batch_size}...")
+    try:
+        await server.start(args.startup_timeout)
+        idle_rss = process_tree_rss(server.process.pid)
+        sampler = ResourceSampler(server.process.pid, scratch_dir)
+        sampler.start()
+
+        limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+        async with httpx.AsyncClient(timeout=args.request_timeout, limits=limits) as client:
+            # Warm-up: the first requests pay for allocator growth and kernel selection
+            await transcribe(client, server.url, clips[args.load_length], "json", args.language)
+
+            first_segment = await measure_first_segment(
+                client, server.url, clips[args.stream_length], args.language, args.runs
+            )
+            cases = {}
+            for response_format in args.formats:
+                print(f"  {response_format}: real-time factor and throughput...")
+                case = {
+                    "model": model,
+                    "batch_size": batch_size,
+                    "response_format": response_format,
+                    **await measure_rtf(client, server.url, clips, args.lengths, response_format,
+                                        args.language, args.runs),
+                    "time_to_first_segment": first_segment,
+                    "concurrency": {},
+                }
+                for concurrency in args.concurrency:
+                    case["concurrency"][str(concurrency)] = await measure_throughput(
+                        client, server.url, clips[args.load_length], response_format,
+                        args.language, concurrency, args.requests
+                    )
+                # Headline throughput and latency: the highest concurrency level
+                peak_load = case["concurrency"][str(max(args.concurrency))]
+                case["requests_per_second"] = peak_load["requests_per_second"]
+                case["latency"] = peak_load["latency"]
+                cases[f"{model}/batch{batch_size}/{response_format}"] = case
+
+        sampler.stop()
+        # Memory and disk are per server: every format shares them
+        for case in cases.values():
+            case["idle_rss_mb"] = round(idle_rss / 2**20, 1)
+            case["peak_rss_mb"] = round(sampler.peak_rss / 2**20, 1)
+            case["peak_temp_disk_mb"] = round(sampler.peak_disk / 2**20, 2)
+        return cases
+    finally:
+        server.stop()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Return human-readable regressions beyond `threshold` (a fraction), per case"""
+    def lookup(data: Dict[str, Any], dotted: str):
+        for part in dotted.split("."):
+            if not isinstance(data, dict) or part not in data:
+                return None
+            data = data[part]
+        return data
+
+    regressions = []
+    print(f"\n{'case':<24}{'metric':<28}{'baseline':>12}{'current':>12}{'change':>10}")
+    for case, results in current["results"]["cases"].items():
+        old_results = baseline["results"]["cases"].get(case)
+        if old_results is None:
+            continue
+        for metric, better in COMPARED_METRICS.items():
+            old = lookup(old_results, metric)
+            new = lookup(results, metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change < -threshold if better == "higher" else change > threshold
+            flag = "  REGRESSION" if worse else ""
+            print(f"{case:<24}{metric:<28}{old:>12.4f}{new:>12.4f}{change:>+10.1%}{flag}")
+            if worse:
+                regressions.append(f"{case} {metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+async def benchmark(args) -> Dict[str, Any]:
+    clips = make_clips([*args.lengths, args.stream_length, args.load_length], args.audio)
+    cases = {}
+    for model in args.models:
+        for batch_size in args.batch_sizes:
+            cases.update(await benchmark_server(args, model, batch_size, clips))
+
+    return {
+        "meta": {
+            "benchmark": "whisper",
+            "git_commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "cpu_count": os.cpu_count(),
+            "config": {
+                "models": args.models,
+                "batch_sizes": args.batch_sizes,
+                "formats": args.formats,
+                "lengths": args.lengths,
+                "stream_length": args.stream_length,
+                "load_length": args.load_length,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "runs": args.runs,
+                "language": args.language,
+                "audio": os.path.basename(args.audio) if args.audio else "synthetic",
+                # Service settings inherited from the environment
+                "env": {
+                    name: os.environ[name]
+                    for name in ("WHISPER_QUANTIZE", "WORKER_POOL_SIZE", "CPU_THREADS", "BATCH_MAX_WAIT_MS",
+                                 "LONGFORM_MIN_SECONDS", "STREAM_STEP_SECONDS")
+                    if name in os.environ
+                },
+            },
+        },
+        "results": {"cases": cases},
+    }
+
+
+def parse_list(value: str, kind=str) -> List[Any]:
+    return [kind(item.strip()) for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper API throughput and latency benchmark (CPU)")
+    parser.add_argument("--models", default="tiny", help="Comma-separated model sizes")
+    parser.add_argument("--batch-sizes", default="1,8", help="Comma-separated BATCH_MAX_SIZE values")
+    parser.add_argument("--formats", default="json,srt", help="Comma-separated response formats")
+    parser.add_argument("--lengths", default="5,30,120", help="Audio lengths in seconds for real-time factor")
+    parser.add_argument("--stream-length", type=float, default=30.0, help="Audio length for time-to-first-segment")
+    parser.add_argument("--load-length", type=float, default=10.0, help="Audio length for the concurrency runs")
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated concurrent client counts")
+    parser.add_argument("--requests", type=int, default=16, help="Requests per concurrency level")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per length (median is reported)")
+    parser.add_argument("--language", default="en", help="Language code sent with requests (empty: detect)")
+    parser.add_argument("--audio", help="Recording to tile to each length instead of synthetic audio")
+    parser.add_argument("--port", type=int, default=18010, help="Whisper API port")
+    parser.add_argument("--startup-timeout", type=float, default=900.0,
+                        help="Seconds to wait for the model to load (includes the first download)")
+    parser.add_argument("--request-timeout", type=float, default=600.0, help="Per-request timeout (s)")
+    parser.add_argument("--output", help="Where to write the JSON result (default: results/whisper-<commit>.json)")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Regression threshold (fraction)")
+    args = parser.parse_args()
+    args.models = parse_list(args.models)
+    args.batch_sizes = parse_list(args.batch_sizes, int)
+    args.formats = parse_list(args.formats)
+    args.lengths = parse_list(args.lengths, float)
+    args.concurrency = parse_list(args.concurrency, int)
+    args.language = args.language or None
+
+    result = asyncio.run(benchmark(args))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"whisper-{result['meta']['git_commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result["results"], indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
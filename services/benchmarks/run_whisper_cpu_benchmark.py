@@ -0,0 +1,245 @@
+"""
+Whisper CPU Benchmark
+Measures the real-time factor and accuracy of CPU inference with the int8
+quantized model (WHISPER_QUANTIZE=int8) against the fp32 baseline.
+
+Each variant runs in its own process with the thread settings the service
+uses (cpu_inference.configure_threads), transcribes every file and reports
+real-time factor (processing time / audio duration, lower is better), load
+time and peak RSS. Word error rate is computed against a reference
+transcript next to each file (`clip.wav` -> `clip.txt`); files without one
+are scored against the fp32 transcript instead, which measures how far
+int8 drifts from fp32 rather than accuracy.
+
+No audio is bundled; see the README for preparing LibriSpeech test-clean.
+Requires openai-whisper, torch and ffmpeg.
+
+    python run_whisper_cpu_benchmark.py samples/*.wav --model large-v3-turbo
+    python run_whisper_cpu_benchmark.py samples/ --threads 4 --runs 3
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICES_DIR = os.path.dirname(BENCHMARK_DIR)
+WHISPER_DIR = os.path.join(SERVICES_DIR, "whisper-api")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".webm", ".mp4")
+SAMPLE_RATE = 16000
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVICES_DIR, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def find_audio(paths: List[str]) -> List[str]:
+    """Audio files given directly or found in the given directories"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(AUDIO_EXTENSIONS)
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def reference_for(audio_path: str) -> Optional[str]:
+    path = os.path.splitext(audio_path)[0] + ".txt"
+    if os.path.exists(path):
+        with open(path) as f:
+            return f.read()
+    return None
+
+
+def normalize_words(text: str) -> List[str]:
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> Dict[str, int]:
+    """Word-level edit distance and reference length"""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(
+                previous[j] + 1,  # deletion
+                current[j - 1] + 1,  # insertion
+                previous[j - 1] + (ref_word != hyp_word),  # substitution
+            ))
+        previous = current
+    return {"errors": previous[-1], "words": len(ref)}
+
+
+def peak_rss_mb() -> float:
+    import resource
+
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_variant(args) -> Dict[str, Any]:
+    """Child process: load one variant and transcribe every file"""
+    sys.path.insert(0, WHISPER_DIR)
+    from cpu_inference import available_cores, configure_threads, load_cpu_model
+
+    threads = args.threads or len(available_cores())
+    configure_threads(threads)
+
+    import whisper
+
+    started = time.perf_counter()
+    model = load_cpu_model(args.model, args.variant)
+    load_seconds = time.perf_counter() - started
+    rss_after_load = peak_rss_mb()
+
+    options = {"language": args.language, "temperature": 0.0, "word_timestamps": True, "fp16": False, "verbose": False}
+    clips = [(path, whisper.load_audio(path)) for path in args.files]
+
+    # Warm-up: first calls pay for allocator growth and kernel selection
+    model.transcribe(clips[0][1][:SAMPLE_RATE * 10], **options)
+
+    files = []
+    for path, audio in clips:
+        timings = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            result = model.transcribe(audio, **options)
+            timings.append(time.perf_counter() - started)
+        files.append({
+            "file": os.path.basename(path),
+            "duration": round(len(audio) / SAMPLE_RATE, 3),
+            "seconds": round(statistics.median(timings), 4),
+            "text": result["text"].strip(),
+        })
+
+    return {
+        "variant": args.variant,
+        "threads": threads,
+        "load_seconds": round(load_seconds, 2),
+        "rss_after_load_mb": rss_after_load,
+        "peak_rss_mb": peak_rss_mb(),
+        "files": files,
+    }
+
+
+def summarize(variants: Dict[str, Dict[str, Any]], files: List[str]) -> Dict[str, Any]:
+    """RTF and WER per variant; WER falls back to the fp32 transcript as reference"""
+    references = {os.path.basename(path): reference_for(path) for path in files}
+    baseline = {item["file"]: item["text"] for item in variants.get("fp32", {}).get("files", [])}
+
+    summary = {}
+    for name, data in variants.items():
+        audio_seconds = sum(item["duration"] for item in data["files"])
+        compute_seconds = sum(item["seconds"] for item in data["files"])
+        errors = words = 0
+        scored_against = set()
+        for item in data["files"]:
+            reference = references.get(item["file"])
+            source = "reference"
+            if reference is None:
+                if name == "fp32" or item["file"] not in baseline:
+                    continue
+                reference, source = baseline[item["file"]], "fp32"
+            score = word_error_rate(reference, item["text"])
+            errors += score["errors"]
+            words += score["words"]
+            scored_against.add(source)
+        summary[name] = {
+            "rtf": round(compute_seconds / audio_seconds, 4) if audio_seconds else None,
+            "audio_seconds": round(audio_seconds, 2),
+            "wer": round(errors / words, 4) if words else None,
+            "wer_reference": "+".join(sorted(scored_against)) or None,
+            "load_seconds": data["load_seconds"],
+            "rss_after_load_mb": data["rss_after_load_mb"],
+            "peak_rss_mb": data["peak_rss_mb"],
+            "threads": data["threads"],
+        }
+
+    if "fp32" in summary and "int8" in summary and summary["int8"]["rtf"]:
+        summary["int8_speedup"] = round(summary["fp32"]["rtf"] / summary["int8"]["rtf"], 2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper CPU int8 vs fp32 benchmark")
+    parser.add_argument("files", nargs="+", help="Audio files or directories (reference transcripts as <name>.txt)")
+    parser.add_argument("--model", default=os.getenv("MODEL_SIZE", "large-v3-turbo"), help="Whisper model size")
+    parser.add_argument("--variants", default="fp32,int8", help="Comma-separated: fp32, int8")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="Intra-op threads per process (default: all cores; use cores/N to size an N-worker pool)")
+    parser.add_argument("--runs", type=int, default=1, help="Timed runs per file (median is reported)")
+    parser.add_argument("--language", default=None, help="Language code (default: detect)")
+    parser.add_argument("--output", help="Where to write the JSON result (default: results/whisper-cpu-<commit>.json)")
+    parser.add_argument("--variant", help=argparse.SUPPRESS)  # child process mode
+    args = parser.parse_args()
+    args.files = find_audio(args.files)
+    if not args.files:
+        parser.error("no audio files found")
+
+    if args.variant:
+        print(json.dumps(run_variant(args)))
+        return
+
+    variants = {}
+    for variant in args.variants.split(","):
+        name = variant.strip()
+        print(f"Benchmarking {args.model} {name} on {len(args.files)} files...")
+        # One process per variant: thread pools can only be sized once, and RSS stays separate
+        quantize = "none" if name == "fp32" else name
+        command = [sys.executable, os.path.abspath(__file__), *args.files,
+                   "--model", args.model, "--threads", str(args.threads), "--runs", str(args.runs),
+                   "--variant", quantize]
+        if args.language:
+            command += ["--language", args.language]
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+        variants[name] = json.loads(output.strip().splitlines()[-1])
+
+    result = {
+        "meta": {
+            "benchmark": "whisper-cpu",
+            "git_commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "cpu_count": os.cpu_count(),
+            "config": {"model": args.model, "threads": args.threads, "runs": args.runs, "language": args.language},
+        },
+        "results": summarize(variants, args.files),
+        "files": {name: data["files"] for name, data in variants.items()},
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"whisper-cpu-{result['meta']['git_commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result["results"], indent=2))
+    missing = [path for path in args.files if reference_for(path) is None]
+    if missing:
+        print(
+            f"\nWarning: {len(missing)} of {len(args.files)} files have no reference transcript; "
+            "their WER is relative to fp32, not accuracy",
+            file=sys.stderr
+        )
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
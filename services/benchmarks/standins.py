@@ -0,0 +1,388 @@
+"""
+Service Stand-ins
+Lightweight fakes of Whisper, Chatterbox, raw ComfyUI and LangGraph for benchmarking
+the video pipeline without GPUs or models. Each stand-in has a configurable latency
+distribution and failure rate.
+
+Run all stand-ins in one process:
+    python standins.py --profile profile.json
+"""
+
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import random
+import signal
+import time
+import uuid
+
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+import uvicorn
+
+
+@dataclass
+class LatencyProfile:
+    """
+    Latency and failure model for one stand-in operation.
+
+    Latency is log-normal around `median_ms` (a long right tail, like real
+    inference services); `sigma` of 0 makes it constant.
+    """
+    median_ms: float = 50.0
+    sigma: float = 0.25
+    failure_rate: float = 0.0
+
+    def sample_seconds(self, rng: random.Random) -> float:
+        if self.sigma <= 0:
+            return self.median_ms / 1000.0
+        return rng.lognormvariate(0.0, self.sigma) * self.median_ms / 1000.0
+
+    def should_fail(self, rng: random.Random) -> bool:
+        return self.failure_rate > 0 and rng.random() < self.failure_rate
+
+
+@dataclass
+class StandinProfile:
+    """Latency profiles and ports for every stand-in"""
+    whisper: LatencyProfile = field(default_factory=lambda: LatencyProfile(median_ms=800))
+    chatterbox: LatencyProfile = field(default_factory=lambda: LatencyProfile(median_ms=300))
+    langgraph_scenes: LatencyProfile = field(default_factory=lambda: LatencyProfile(median_ms=1200))
+    langgraph_workflow: LatencyProfile = field(default_factory=lambda: LatencyProfile(median_ms=400))
+    comfyui_render: LatencyProfile = field(default_factory=lambda: LatencyProfile(median_ms=3000))
+    comfyui_api: LatencyProfile = field(default_factory=lambda: LatencyProfile(median_ms=5, sigma=0.1))
+    comfyui_workers: int = 1  # Prompts executed concurrently (GPU slots)
+    scenes_per_job: int = 3
+    seed: Optional[int] = None
+    ports: Dict[str, int] = field(default_factory=lambda: {
+        "whisper": 18001,
+        "chatterbox": 18002,
+        "comfyui": 18188,
+        "langgraph": 18004,
+    })
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StandinProfile":
+        profile = cls()
+        for key, value in data.items():
+            current = getattr(profile, key, None)
+            if isinstance(current, LatencyProfile):
+                setattr(profile, key, LatencyProfile(**value))
+            elif key == "ports":
+                profile.ports.update(value)
+            elif hasattr(profile, key):
+                setattr(profile, key, value)
+        return profile
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+async def _simulate(profile: LatencyProfile, rng: random.Random, what: str):
+    """Sleep for a sampled latency, then fail with the configured probability"""
+    await asyncio.sleep(profile.sample_seconds(rng))
+    if profile.should_fail(rng):
+        raise HTTPException(status_code=500, detail=f"Injected {what} failure")
+
+
+def build_whisper_app(profile: StandinProfile, rng: random.Random) -> FastAPI:
+    """Whisper API stand-in (`/transcribe`)"""
+    app = FastAPI(title="Whisper stand-in")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "model_loaded": True, "model_size": "standin", "device": "cpu"}
+
+    @app.post("/transcribe")
+    async def transcribe(request: Request):
+        await request.body()
+        await _simulate(profile.whisper, rng, "transcription")
+        return {
+            "text": "stand-in transcript",
+            "language": "en",
+            "duration": 5.0,
+            "segments": [{"id": 0, "start": 0.0, "end": 5.0, "text": "stand-in transcript"}],
+            "words": None,
+        }
+
+    return app
+
+
+def build_chatterbox_app(profile: StandinProfile, rng: random.Random) -> FastAPI:
+    """Chatterbox TTS stand-in (`/synthesize`)"""
+    app = FastAPI(title="Chatterbox stand-in")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "model_loaded": True, "supported_languages": ["en"], "available_voices": 1}
+
+    @app.post("/synthesize")
+    async def synthesize(request: Request):
+        body = await request.json()
+        await _simulate(profile.chatterbox, rng, "synthesis")
+        text = body.get("text", "")
+        return {
+            "audio_url": f"/audio/{uuid.uuid4()}.{body.get('format', 'mp3')}",
+            "audio_base64": None,
+            "duration": len(text.split()) * 0.4,
+            "text": text,
+            "voice_used": body.get("voice_id") or "default",
+            "language": body.get("language", "en"),
+            "format": body.get("format", "mp3"),
+        }
+
+    @app.delete("/audio/{filename}")
+    async def delete_audio(filename: str):
+        return {"deleted": filename}
+
+    return app
+
+
+def build_langgraph_app(profile: StandinProfile, rng: random.Random) -> FastAPI:
+    """LangGraph orchestrator stand-in (`/api/plan/scenes`, `/api/plan/workflow`)"""
+    app = FastAPI(title="LangGraph stand-in")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "langgraph_available": True, "llm_available": True,
+                "llm_model": "standin", "use_llama": False}
+
+    @app.post("/api/plan/scenes")
+    async def plan_scenes(request: Request):
+        body = await request.json()
+        await _simulate(profile.langgraph_scenes, rng, "scene planning")
+        count = max(1, profile.scenes_per_job)
+        scene_duration = body.get("duration_seconds", 30) / count
+        scenes = [
+            {
+                "scene_number": i + 1,
+                "description": f"Stand-in scene {i + 1} for the brief",
+                "duration_seconds": scene_duration,
+                "entities": [],
+                "visual_style": {},
+            }
+            for i in range(count)
+        ]
+        return {"scenes": scenes, "total_duration": scene_duration * count, "style_summary": {}, "metadata": {}}
+
+    @app.post("/api/plan/workflow")
+    async def plan_workflow(request: Request):
+        body = await request.json()
+        await _simulate(profile.langgraph_workflow, rng, "workflow planning")
+        steps = [{"step": i + 1, "type": "generate_scene"} for i, _ in enumerate(body.get("scenes", []))]
+        return {"workflow_steps": steps, "estimated_time": 60 * len(steps), "resource_requirements": {}}
+
+    return app
+
+
+class FakeComfyUI:
+    """
+    In-memory model of the ComfyUI server queue.
+
+    Prompts wait in a FIFO queue and are executed by `comfyui_workers`
+    concurrent slots; finished prompts move to the history. Progress is
+    pushed to connected `/ws` clients the way ComfyUI does.
+    """
+
+    def __init__(self, profile: StandinProfile, rng: random.Random):
+        self.profile = profile
+        self.rng = rng
+        self.pending: List[str] = []
+        self.running: Dict[str, float] = {}
+        self.history: Dict[str, Dict[str, Any]] = {}
+        self.cancelled: set = set()
+        self.sockets: Dict[str, WebSocket] = {}
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.number = 0
+        self.workers: List[asyncio.Task] = []
+
+    def start(self):
+        for _ in range(max(1, self.profile.comfyui_workers)):
+            self.workers.append(asyncio.create_task(self._worker()))
+
+    async def _broadcast(self, message: Dict[str, Any]):
+        for client_id, ws in list(self.sockets.items()):
+            try:
+                await ws.send_json(message)
+            except Exception:
+                self.sockets.pop(client_id, None)
+
+    async def _worker(self):
+        while True:
+            prompt_id = await self.queue.get()
+            if prompt_id in self.cancelled:
+                continue
+            if prompt_id in self.pending:
+                self.pending.remove(prompt_id)
+            self.running[prompt_id] = time.monotonic()
+            await self._broadcast({"type": "execution_start", "data": {"prompt_id": prompt_id}})
+
+            render_seconds = self.profile.comfyui_render.sample_seconds(self.rng)
+            steps = 4
+            failed = False
+            for step in range(steps):
+                await asyncio.sleep(render_seconds / steps)
+                if prompt_id in self.cancelled:
+                    break
+                await self._broadcast({
+                    "type": "progress",
+                    "data": {"prompt_id": prompt_id, "value": step + 1, "max": steps},
+                })
+            else:
+                failed = self.profile.comfyui_render.should_fail(self.rng)
+
+            self.running.pop(prompt_id, None)
+            if prompt_id in self.cancelled:
+                continue
+            if failed:
+                self.history[prompt_id] = {"outputs": {}, "status": {"status_str": "error", "completed": False}}
+                await self._broadcast({"type": "execution_error", "data": {"prompt_id": prompt_id}})
+            else:
+                self.history[prompt_id] = {
+                    "outputs": {"9": {"videos": [{"filename": f"{prompt_id}.mp4", "type": "output"}]}},
+                    "status": {"status_str": "success", "completed": True},
+                }
+                await self._broadcast({"type": "executing", "data": {"node": None, "prompt_id": prompt_id}})
+
+    def queue_snapshot(self) -> Dict[str, Any]:
+        running = [[0, pid, {}, {}, []] for pid in self.running]
+        pending = [[i + 1, pid, {}, {}, []] for i, pid in enumerate(self.pending)]
+        return {"queue_running": running, "queue_pending": pending}
+
+
+def build_comfyui_app(profile: StandinProfile, rng: random.Random) -> FastAPI:
+    """Raw ComfyUI server stand-in (`/prompt`, `/queue`, `/history`, `/interrupt`, `/ws`)"""
+    app = FastAPI(title="ComfyUI stand-in")
+    comfy = FakeComfyUI(profile, rng)
+
+    @app.on_event("startup")
+    async def startup():
+        comfy.start()
+
+    @app.get("/")
+    async def index():
+        return {"status": "ok"}
+
+    @app.post("/prompt")
+    async def prompt(request: Request):
+        await request.json()
+        await _simulate(profile.comfyui_api, rng, "prompt submission")
+        prompt_id = str(uuid.uuid4())
+        comfy.number += 1
+        comfy.pending.append(prompt_id)
+        await comfy.queue.put(prompt_id)
+        return {"prompt_id": prompt_id, "number": comfy.number, "node_errors": {}}
+
+    @app.get("/queue")
+    async def get_queue():
+        await _simulate(profile.comfyui_api, rng, "queue read")
+        return comfy.queue_snapshot()
+
+    @app.post("/queue")
+    async def edit_queue(request: Request):
+        body = await request.json()
+        for prompt_id in body.get("delete", []):
+            comfy.cancelled.add(prompt_id)
+            if prompt_id in comfy.pending:
+                comfy.pending.remove(prompt_id)
+        if body.get("clear"):
+            comfy.cancelled.update(comfy.pending)
+            comfy.pending.clear()
+        return {}
+
+    @app.post("/interrupt")
+    async def interrupt(request: Request):
+        body = await request.body()
+        prompt_id = json.loads(body).get("prompt_id") if body else None
+        if prompt_id is None:
+            comfy.cancelled.update(comfy.running)
+        elif prompt_id in comfy.running:
+            comfy.cancelled.add(prompt_id)
+        return {}
+
+    @app.get("/history/{prompt_id}")
+    async def get_history(prompt_id: str):
+        await _simulate(profile.comfyui_api, rng, "history read")
+        if prompt_id in comfy.history:
+            return {prompt_id: comfy.history[prompt_id]}
+        return {}
+
+    @app.get("/history")
+    async def get_all_history():
+        return comfy.history
+
+    @app.get("/object_info")
+    async def object_info():
+        return {}
+
+    @app.websocket("/ws")
+    async def websocket(ws: WebSocket):
+        await ws.accept()
+        client_id = ws.query_params.get("clientId") or str(uuid.uuid4())
+        comfy.sockets[client_id] = ws
+        await ws.send_json({"type": "status", "data": {"sid": client_id, "status": {
+            "exec_info": {"queue_remaining": len(comfy.pending) + len(comfy.running)}}}})
+        try:
+            while True:
+                await ws.receive_text()
+        except WebSocketDisconnect:
+            comfy.sockets.pop(client_id, None)
+
+    return app
+
+
+BUILDERS = {
+    "whisper": build_whisper_app,
+    "chatterbox": build_chatterbox_app,
+    "comfyui": build_comfyui_app,
+    "langgraph": build_langgraph_app,
+}
+
+
+async def serve_all(profile: StandinProfile, host: str = "127.0.0.1"):
+    """Serve every stand-in on its configured port in one event loop"""
+    rng = random.Random(profile.seed)
+    servers = []
+    for name, builder in BUILDERS.items():
+        config = uvicorn.Config(
+            builder(profile, rng),
+            host=host,
+            port=profile.ports[name],
+            log_level="warning",
+            access_log=False,
+        )
+        server = uvicorn.Server(config)
+        # uvicorn's handlers would only stop the last server; stop them all together instead
+        server.install_signal_handlers = lambda: None
+        servers.append(server)
+
+    def shutdown():
+        for server in servers:
+            server.should_exit = True
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, shutdown)
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run pipeline service stand-ins")
+    parser.add_argument("--profile", help="JSON file with a StandinProfile")
+    parser.add_argument("--profile-json", help="StandinProfile as an inline JSON string")
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    data: Dict[str, Any] = {}
+    if args.profile:
+        with open(args.profile) as f:
+            data = json.load(f)
+    elif args.profile_json:
+        data = json.loads(args.profile_json)
+
+    asyncio.run(serve_all(StandinProfile.from_dict(data), host=args.host))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+"""
+Artifact store module
+Generated audio files behind stable URLs that any replica can serve.
+
+Artifacts are files named `<id>.<format>` and served by `/audio/{artifact}`.
+Each replica keeps the artifacts it has written or served recently on local
+disk (ARTIFACT_DIR) and serves them from there. With an object store backend
+the local disk is a read-through cache in front of it: an artifact written
+by one replica is fetched from the object store by any other replica asked
+for it.
+
+Backends (ARTIFACT_BACKEND):
+    local  local disk only; share ARTIFACT_DIR between replicas for
+           cross-replica URLs (default)
+    s3     S3-compatible bucket (ARTIFACT_BUCKET, ARTIFACT_PREFIX and
+           ARTIFACT_S3_ENDPOINT for MinIO and friends; needs boto3)
+    dir    object store stand-in on a directory (ARTIFACT_OBJECT_DIR), with
+           the same semantics as s3; for tests and single-host setups
+
+Artifacts older than ARTIFACT_TTL_HOURS are deleted locally and from the
+backend by a periodic sweep, and the local copies are kept under
+ARTIFACT_MAX_MB by evicting the least recently served first.
+
+Files are sent with HTTP Range support. Zero-copy sendfile is used when the
+ASGI server offers the `http.response.zerocopysend` extension, or delegated
+to a reverse proxy with ARTIFACT_ACCEL_REDIRECT (nginx X-Accel-Redirect);
+otherwise the file is read in chunks on a worker thread.
+"""
+
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Any, Dict, Iterator, Optional, Tuple
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# Configuration
+ARTIFACT_BACKEND = os.getenv("ARTIFACT_BACKEND", "local").lower()
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "/tmp/tts-artifacts")
+ARTIFACT_MAX_MB = float(os.getenv("ARTIFACT_MAX_MB", "4096"))
+ARTIFACT_TTL_HOURS = float(os.getenv("ARTIFACT_TTL_HOURS", "72"))
+ARTIFACT_SWEEP_SECONDS = float(os.getenv("ARTIFACT_SWEEP_SECONDS", "600"))
+ARTIFACT_BUCKET = os.getenv("ARTIFACT_BUCKET", "")
+ARTIFACT_PREFIX = os.getenv("ARTIFACT_PREFIX", "tts/")
+ARTIFACT_S3_ENDPOINT = os.getenv("ARTIFACT_S3_ENDPOINT", "")
+ARTIFACT_OBJECT_DIR = os.getenv("ARTIFACT_OBJECT_DIR", "/tmp/tts-artifact-objects")
+ARTIFACT_ACCEL_REDIRECT = os.getenv("ARTIFACT_ACCEL_REDIRECT", "")  # e.g. /internal/artifacts/
+ARTIFACT_PUBLIC_URL = os.getenv("ARTIFACT_PUBLIC_URL", "").rstrip("/")  # prefix for audio URLs
+
+ARTIFACT_NAME = re.compile(r"^[0-9a-f]{32,64}\.\w+$")
+READ_SIZE = 1 << 16
+
+
+class DirectoryObjectStore:
+    """Objects as files in a directory; stands in for a bucket"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, name: str, source_path: str):
+        temp_path = os.path.join(self.directory, f".{name}.{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, os.path.join(self.directory, name))
+
+    def get(self, name: str, dest_path: str) -> bool:
+        try:
+            shutil.copyfile(os.path.join(self.directory, name), dest_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def delete(self, name: str) -> bool:
+        try:
+            os.unlink(os.path.join(self.directory, name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def list(self) -> Iterator[Tuple[str, float]]:
+        """(name, modification time) of every object"""
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                yield entry.name, entry.stat().st_mtime
+
+
+class S3ObjectStore:
+    """Objects in an S3-compatible bucket under a key prefix"""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client_error = ClientError
+
+    def put(self, name: str, source_path: str):
+        self.client.upload_file(source_path, self.bucket, self.prefix + name)
+
+    def get(self, name: str, dest_path: str) -> bool:
+        try:
+            self.client.download_file(self.bucket, self.prefix + name, dest_path)
+            return True
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return False
+            raise
+
+    def delete(self, name: str) -> bool:
+        # S3 deletes are idempotent and don't say whether the object existed
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + name)
+        return True
+
+    def list(self) -> Iterator[Tuple[str, float]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(self.prefix):], item["LastModified"].timestamp()
+
+
+class ArtifactStore:
+    """
+    Local artifact files under a byte budget, optionally backed by an object store.
+
+    All methods block (file and network I/O); call them from a worker
+    thread. A file is only visible under its name once it is complete.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: float, backend=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()  # least recently served first
+        self._total = 0
+        self.fetches = 0
+        self.evictions = 0
+        self.expired = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load_index(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and ARTIFACT_NAME.match(entry.name):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._sizes[name] = size
+            self._total += size
+
+    def new_name(self, format: str) -> str:
+        """A fresh artifact name for non-deterministic output"""
+        return f"{uuid.uuid4().hex}.{format}"
+
+    def temp_path(self, name: str) -> str:
+        """Where to write an artifact before `put(..., move=True)`"""
+        return self._path(f".{name}.{uuid.uuid4().hex}.tmp")
+
+    def put(self, name: str, source_path: str, move: bool = False):
+        """Store a complete file as artifact `name` (hard-linked when not moved, copied across filesystems)"""
+        path = self._path(name)
+        temp_path = self.temp_path(name)
+        if move:
+            os.replace(source_path, temp_path)
+        else:
+            try:
+                os.link(source_path, temp_path)
+            except OSError:
+                shutil.copyfile(source_path, temp_path)
+        if self.backend is not None:
+            try:
+                self.backend.put(name, temp_path)
+            except Exception:
+                os.unlink(temp_path)
+                raise
+        os.replace(temp_path, path)
+        os.utime(path)  # a link keeps the source's mtime; the TTL counts from now
+        self._track(name, os.path.getsize(path))
+
+    def publish(self, name: str, source_path: str):
+        """
+        Make sure artifact `name` exists, putting it if not.
+
+        For content-addressed artifacts that are handed out again and again;
+        one older than half the TTL is put again so its URL stays valid.
+        """
+        try:
+            age = time.time() - os.stat(self._path(name)).st_mtime
+            if age < self.ttl / 2:
+                return
+        except FileNotFoundError:
+            pass
+        self.put(name, source_path)
+
+    def open(self, name: str) -> Optional[str]:
+        """Local path of artifact `name`, fetched from the backend if needed; None if it doesn't exist"""
+        if not ARTIFACT_NAME.match(name):
+            return None
+        path = self._path(name)
+        if os.path.exists(path):
+            with self._lock:
+                if name in self._sizes:
+                    self._sizes.move_to_end(name)
+            return path
+        if self.backend is None:
+            return None
+
+        temp_path = self.temp_path(name)
+        try:
+            if not self.backend.get(name, temp_path):
+                return None
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        self.fetches += 1
+        self._track(name, os.path.getsize(path))
+        return path
+
+    def delete(self, name: str) -> bool:
+        """Delete artifact `name` everywhere; False if it didn't exist locally or in the backend"""
+        if not ARTIFACT_NAME.match(name):
+            return False
+        with self._lock:
+            self._total -= self._sizes.pop(name, 0)
+        existed = False
+        try:
+            os.unlink(self._path(name))
+            existed = True
+        except FileNotFoundError:
+            pass
+        if self.backend is not None:
+            existed = self.backend.delete(name) or existed
+        return existed
+
+    def sweep(self) -> int:
+        """Delete artifacts older than the TTL, locally and in the backend; returns how many"""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for entry in list(os.scandir(self.directory)):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            # Temp files older than the TTL were left behind by a crash mid-write
+            if stat.st_mtime < cutoff:
+                with self._lock:
+                    self._total -= self._sizes.pop(entry.name, 0)
+                try:
+                    os.unlink(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        if self.backend is not None:
+            for name, modified in list(self.backend.list()):
+                if modified < cutoff:
+                    self.backend.delete(name)
+                    removed += 1
+        self.expired += removed
+        return removed
+
+    def _track(self, name: str, size: int):
+        with self._lock:
+            self._total += size - self._sizes.pop(name, 0)
+            self._sizes[name] = size
+            evicted = []
+            while self._total > self.max_bytes and len(self._sizes) > 1:
+                old_name, old_size = self._sizes.popitem(last=False)
+                self._total -= old_size
+                evicted.append(old_name)
+        # Only the local copy goes; the backend still has it
+        for old_name in evicted:
+            try:
+                os.unlink(self._path(old_name))
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+
+    def url(self, name: str) -> str:
+        return f"{ARTIFACT_PUBLIC_URL}/audio/{name}"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__ if self.backend else "local",
+            "local_files": len(self._sizes),
+            "local_bytes": self._total,
+            "fetches": self.fetches,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+
+def create_artifact_store() -> ArtifactStore:
+    """Build the store selected by ARTIFACT_BACKEND"""
+    backend = None
+    if ARTIFACT_BACKEND == "s3":
+        backend = S3ObjectStore(ARTIFACT_BUCKET, ARTIFACT_PREFIX, ARTIFACT_S3_ENDPOINT)
+    elif ARTIFACT_BACKEND == "dir":
+        backend = DirectoryObjectStore(ARTIFACT_OBJECT_DIR)
+    elif ARTIFACT_BACKEND != "local":
+        raise ValueError(f"Unknown ARTIFACT_BACKEND: {ARTIFACT_BACKEND}")
+    return ArtifactStore(
+        ARTIFACT_DIR,
+        int(ARTIFACT_MAX_MB * 1024 * 1024),
+        ARTIFACT_TTL_HOURS * 3600,
+        backend,
+    )
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Byte range (start, end inclusive) requested by a Range header.
+
+    None means the whole file (no header, or several ranges, which are
+    answered with the whole file as RFC 9110 allows); ValueError means the
+    range can't be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+class ArtifactResponse(Response):
+    """A file response with Range support, sent with zero-copy sendfile where the server allows"""
+
+    def __init__(
+        self,
+        path: str,
+        name: str,
+        media_type: str,
+        range_header: Optional[str] = None,
+        if_none_match: Optional[str] = None
+    ):
+        self.path = path
+        self.media_type = media_type
+        self.background = None
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{name}"'
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(stat.st_mtime, usegmt=True),
+            # Artifact names are never reused for different content
+            "cache-control": "public, max-age=86400, immutable",
+            "content-disposition": f'inline; filename="{name}"',
+        }
+        self.offset, self.length = 0, size
+        self.status_code = 200
+        if if_none_match and etag in if_none_match:
+            self.status_code, self.length = 304, 0
+        else:
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                byte_range = None
+                self.status_code, self.length = 416, 0
+                headers["content-range"] = f"bytes */{size}"
+            if byte_range is not None:
+                start, end = byte_range
+                self.status_code = 206
+                self.offset, self.length = start, end - start + 1
+                headers["content-range"] = f"bytes {start}-{end}/{size}"
+        if ARTIFACT_ACCEL_REDIRECT and self.status_code in (200, 206):
+            # The proxy sends the file (and handles Range itself)
+            headers["x-accel-redirect"] = ARTIFACT_ACCEL_REDIRECT + name
+            self.length = 0
+        if self.status_code != 304:
+            headers["content-length"] = str(self.length)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+            return
+
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            offset, remaining = self.offset, self.length
+            while remaining > 0:
+                data = await anyio.to_thread.run_sync(os.pread, fd, min(READ_SIZE, remaining), offset)
+                if not data:
+                    break
+                offset += len(data)
+                remaining -= len(data)
+                await send({"type": "http.response.body", "body": data, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            os.close(fd)
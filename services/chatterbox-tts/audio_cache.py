@@ -0,0 +1,249 @@
+"""
+Audio cache module
+Content-addressed cache of synthesized audio.
+
+The key is a hash of the normalized text and every setting that changes the
+audio: voice, language, emotion, speed, pitch, format, sample rate and the
+model version. Repeated texts (scene descriptions, intros, taglines) are
+answered from disk without touching the model, and concurrent requests for
+the same key share one synthesis.
+
+Entries are audio files under TTS_CACHE_DIR (`<key>.<format>` plus a small
+JSON sidecar) and are served directly by `/audio/{filename}`. Past
+TTS_CACHE_MAX_MB the least recently used entries are deleted. TTS_CACHE=none
+disables caching.
+
+A second cache (SENTENCE_CACHE_*) holds raw float32 PCM per sentence, so a
+script that differs from an earlier one in a few lines only synthesizes
+those lines.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+# Configuration
+TTS_CACHE = os.getenv("TTS_CACHE", "disk").lower()  # disk, none
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "/tmp/tts-cache")
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "2048"))
+SENTENCE_CACHE = os.getenv("SENTENCE_CACHE", "disk").lower()  # disk, none
+SENTENCE_CACHE_DIR = os.getenv("SENTENCE_CACHE_DIR", "/tmp/tts-sentence-cache")
+SENTENCE_CACHE_MAX_MB = float(os.getenv("SENTENCE_CACHE_MAX_MB", "1024"))
+
+# Bump when the stored audio or sidecar changes so old entries are ignored
+CACHE_VERSION = "1"
+
+ENTRY_NAME = re.compile(r"^([0-9a-f]{64})\.(\w+)$")
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalized text with whitespace collapsed (differences that don't change the speech)"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(text: str, model_version: str, **options) -> str:
+    """Key covering the normalized text, the model and every synthesis option"""
+    parts = [CACHE_VERSION, model_version, normalize_text(text)]
+    parts += [f"{name}={options[name]!r}" for name in sorted(options)]
+    return hashlib.sha256("\x00".join(parts).encode()).hexdigest()
+
+
+@dataclass
+class CachedAudio:
+    key: str
+    path: str
+    format: str
+    duration: float
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+
+class AudioCache:
+    """
+    Audio files on disk under a byte budget; least recently used entries are
+    evicted first.
+
+    `get_or_create(key, format, create)` returns `(entry, source)` where
+    source is "hit", "miss" or "shared". On a miss `create(path)` writes the
+    audio to a temporary path and returns its duration; the file only
+    becomes an entry once it is complete. Concurrent callers for the same
+    key await the first caller's synthesis, which finishes (and fills the
+    cache) even if that caller disconnects.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()  # oldest access first
+        self._total = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _audio_path(self, key: str, format: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{format}")
+
+    def _load_index(self):
+        """Rebuild the LRU order from sidecar mtimes (bumped on every read)"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                key = name[:-5]
+                try:
+                    with open(os.path.join(root, name)) as f:
+                        meta = json.load(f)
+                    size = os.path.getsize(os.path.join(root, name))
+                    size += os.path.getsize(self._audio_path(key, meta["format"]))
+                    entries.append((os.path.getmtime(os.path.join(root, name)), key, size))
+                except (OSError, ValueError, KeyError):
+                    continue
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self._total += size
+
+    def lookup(self, key: str) -> Optional[CachedAudio]:
+        """A complete entry, marked as recently used (blocking)"""
+        meta_path = self._meta_path(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            entry = CachedAudio(key, self._audio_path(key, meta["format"]), meta["format"], meta["duration"])
+            if not os.path.exists(entry.path):
+                return None
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+            self.hits += 1
+        return entry
+
+    def find(self, filename: str) -> Optional[str]:
+        """Path of a cached audio file by its served filename (`<key>.<format>`)"""
+        match = ENTRY_NAME.match(filename)
+        if not match:
+            return None
+        path = self._audio_path(match.group(1), match.group(2))
+        return path if os.path.exists(path) else None
+
+    def temp_path(self, key: str, format: str) -> str:
+        path = self._audio_path(key, format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{path}.{os.getpid()}.tmp"
+
+    def commit(self, key: str, format: str, temp_path: str, duration: float) -> CachedAudio:
+        """Turn a completely written temp file into an entry and evict past the budget (blocking)"""
+        entry = CachedAudio(key, self._audio_path(key, format), format, duration)
+        os.replace(temp_path, entry.path)
+        meta = json.dumps({"format": format, "duration": duration}).encode()
+        meta_path = self._meta_path(key)
+        with open(f"{meta_path}.{os.getpid()}.tmp", "wb") as f:
+            f.write(meta)
+        os.replace(f"{meta_path}.{os.getpid()}.tmp", meta_path)
+
+        size = os.path.getsize(entry.path) + len(meta)
+        with self._lock:
+            self._total += size - self._sizes.pop(key, 0)
+            self._sizes[key] = size
+            evicted = []
+            while self._total > self.max_bytes and len(self._sizes) > 1:
+                old_key, old_size = self._sizes.popitem(last=False)
+                self._total -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._remove(old_key)
+        return entry
+
+    def _remove(self, key: str):
+        meta_path = self._meta_path(key)
+        try:
+            with open(meta_path) as f:
+                format = json.load(f)["format"]
+            os.unlink(meta_path)
+            os.unlink(self._audio_path(key, format))
+        except (OSError, ValueError, KeyError):
+            pass
+
+    async def get_or_create(
+        self,
+        key: str,
+        format: str,
+        create: Callable[[str], Awaitable[float]]
+    ) -> Tuple[CachedAudio, str]:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fill(key, format, create))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            return await asyncio.shield(task)
+
+        self.shared += 1
+        entry, _ = await asyncio.shield(task)
+        return entry, "shared"
+
+    def _finished(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here so abandoned failures aren't logged as unhandled
+
+    async def _fill(self, key: str, format: str, create) -> Tuple[CachedAudio, str]:
+        entry = await asyncio.to_thread(self.lookup, key)
+        if entry is not None:
+            return entry, "hit"
+
+        self.misses += 1
+        temp_path = self.temp_path(key, format)
+        try:
+            duration = await create(temp_path)
+            return await asyncio.to_thread(self.commit, key, format, temp_path, duration), "miss"
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "entries": len(self._sizes),
+            "bytes": self._total,
+        }
+
+
+def create_cache(
+    mode: str = TTS_CACHE,
+    directory: str = TTS_CACHE_DIR,
+    max_mb: float = TTS_CACHE_MAX_MB
+) -> Optional[AudioCache]:
+    """Build the cache selected by `mode` (None when disabled or unusable)"""
+    if mode != "disk":
+        return None
+    try:
+        return AudioCache(directory, int(max_mb * 1024 * 1024))
+    except Exception as e:
+        print(f"Error creating TTS audio cache in {directory}: {e}")
+        return None
+
+
+def create_sentence_cache() -> Optional[AudioCache]:
+    """Build the per-sentence PCM cache selected by SENTENCE_CACHE"""
+    return create_cache(SENTENCE_CACHE, SENTENCE_CACHE_DIR, SENTENCE_CACHE_MAX_MB)
@@ -0,0 +1,115 @@
+"""
+Audio pipeline module
+Converts model PCM to the requested sample rate, pitch and speed.
+
+Resampling is polyphase (scipy.signal.resample_poly). It runs chunk by chunk
+as synthesis produces audio, with enough overlap between chunks that the
+result matches resampling the whole clip at once. Pitch is shifted by
+resampling too: the audio is treated as if it had been recorded at
+`rate * pitch`, which raises the pitch and shortens it. ffmpeg's atempo
+filter then sets the speed and undoes the change in length (see
+`tempo_filters`).
+
+The numerical work runs on a small thread pool (numpy and scipy release the
+GIL), so it never blocks the event loop. Chunks are passed along as array
+views; the only copies are the ones resampling itself needs.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from typing import AsyncIterator, List
+import asyncio
+import math
+import os
+
+import numpy as np
+from scipy.signal import resample_poly
+
+# Configuration
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "2"))
+RESAMPLE_MAX_DENOMINATOR = 1000  # bounds the polyphase filter size for odd ratios (e.g. pitch shifts)
+
+_executor = ThreadPoolExecutor(max_workers=max(1, AUDIO_WORKERS), thread_name_prefix="tts-audio")
+
+EMPTY = np.zeros(0, dtype=np.float32)
+
+
+class StreamResampler:
+    """
+    Polyphase resampling of a stream of float32 chunks.
+
+    `process()` returns the output for as much input as can be resampled
+    exactly: it holds back `context` samples of lookahead and keeps
+    `context` samples of history so the filter sees real audio on both
+    sides of every chunk boundary. `flush()` returns the rest.
+    """
+
+    def __init__(self, input_rate: float, output_rate: int):
+        ratio = (Fraction(output_rate) / Fraction(input_rate)).limit_denominator(RESAMPLE_MAX_DENOMINATOR)
+        self.up = ratio.numerator
+        self.down = ratio.denominator
+        # resample_poly's filter spans 10 * max(up, down) upsampled samples on each side;
+        # a whole number of `down` blocks keeps output samples aligned with input samples
+        span = math.ceil(10 * max(self.up, self.down) / self.up) + 1
+        self.context = -(-span // self.down) * self.down
+        self._history = EMPTY
+        self._pending = EMPTY
+
+    @property
+    def passthrough(self) -> bool:
+        return self.up == self.down
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        if self.passthrough:
+            return chunk
+        self._pending = np.concatenate([self._pending, chunk]) if len(self._pending) else chunk
+        ready = (len(self._pending) - self.context) // self.down * self.down
+        if ready <= 0:
+            return EMPTY
+        return self._resample(ready, self.context)
+
+    def flush(self) -> np.ndarray:
+        if self.passthrough or not len(self._pending):
+            return EMPTY
+        return self._resample(len(self._pending), 0)
+
+    def _resample(self, count: int, lookahead: int) -> np.ndarray:
+        segment = np.concatenate([self._history, self._pending[:count + lookahead]])
+        resampled = resample_poly(segment, self.up, self.down)
+        start = len(self._history) * self.up // self.down
+        end = start + math.ceil(count * self.up / self.down)
+        consumed = segment[:len(segment) - lookahead]
+        self._history = consumed[-self.context:]
+        self._pending = self._pending[count:]
+        return resampled[start:end].astype(np.float32, copy=False)
+
+
+async def resample_stream(pcm: AsyncIterator[np.ndarray], resampler: StreamResampler) -> AsyncIterator[np.ndarray]:
+    """Resample PCM chunks on the audio thread pool as they arrive"""
+    loop = asyncio.get_running_loop()
+    chunks = pcm.__aiter__()
+    try:
+        async for chunk in chunks:
+            resampled = await loop.run_in_executor(_executor, resampler.process, chunk)
+            if len(resampled):
+                yield resampled
+        tail = await loop.run_in_executor(_executor, resampler.flush)
+        if len(tail):
+            yield tail
+    finally:
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
+
+
+def tempo_filters(tempo: float) -> List[str]:
+    """ffmpeg atempo filters for a tempo change (each instance covers 0.5-2.0)"""
+    filters = []
+    while tempo > 2.0:
+        filters.append("atempo=2.0")
+        tempo /= 2.0
+    while tempo < 0.5:
+        filters.append("atempo=0.5")
+        tempo /= 0.5
+    if abs(tempo - 1.0) > 1e-6:
+        filters.append(f"atempo={tempo:.6f}")
+    return filters
@@ -0,0 +1,231 @@
+"""
+Duration model module
+Predicts how long synthesized speech will be without running the model.
+
+A text is reduced to a few counts: syllables (estimated per script: vowel
+groups for alphabetic languages, characters for CJK and Hangul, consonant
+clusters for Devanagari), sentence breaks and clause breaks. Duration is a
+linear function of those counts plus a constant per model call, with one
+set of weights per language and one per voice.
+
+The weights are calibrated from past syntheses: every model call records
+its text and the length of the audio it produced. Each voice's weights are
+a ridge regression pulled towards its language's weights, which are pulled
+towards built-in defaults, so a new voice predicts like the average voice
+of its language until it has some history. Statistics are summed across
+worker processes in DURATION_MODEL_PATH (under a file lock) and decay so
+recent syntheses count most.
+
+Prediction is a few regex counts and a dot product: microseconds per
+sentence.
+"""
+
+from typing import Any, Dict, Optional
+import fcntl
+import json
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+# Configuration
+DURATION_MODEL_PATH = os.getenv("DURATION_MODEL_PATH", "/tmp/tts-duration-model.json")
+DURATION_PRIOR_STRENGTH = float(os.getenv("DURATION_PRIOR_STRENGTH", "10"))  # sentences' worth of evidence in the prior
+DURATION_MAX_OBSERVATIONS = int(os.getenv("DURATION_MAX_OBSERVATIONS", "5000"))  # older observations are halved past this
+DURATION_SAVE_SECONDS = float(os.getenv("DURATION_SAVE_SECONDS", "60"))
+
+# Features: syllables, sentence breaks, clause breaks, model call
+FEATURES = 4
+# Default weights in seconds per feature (about 4.5 syllables/second)
+DEFAULT_WEIGHTS = np.array([0.22, 0.35, 0.15, 0.2])
+LANGUAGE_WEIGHTS = {
+    "ja": np.array([0.13, 0.35, 0.15, 0.2]),  # morae are shorter than syllables
+    "zh": np.array([0.24, 0.35, 0.15, 0.2]),
+}
+# Scale of each feature in a typical sentence, so the prior pulls equally on every weight
+TYPICAL_FEATURES = np.array([15.0, 1.0, 1.0, 1.0])
+
+COMBINING_MARKS = re.compile(r"[\u0300-\u036f]")
+VOWEL_GROUPS = re.compile(r"[aeiouy\u00e6\u00f8\u0153\u00e5\u0430\u0435\u0451\u0438\u043e\u0443\u044b\u044d\u044e\u044f\u0456\u0457\u0454]+")
+DIGITS = re.compile(r"\d")
+HAN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]")
+KANA = re.compile(r"[\u3041-\u3096\u30a1-\u30fa\u30fc]")
+SMALL_KANA = re.compile(r"[\u3041\u3043\u3045\u3047\u3049\u3083\u3085\u3087\u30a1\u30a3\u30a5\u30a7\u30a9\u30e3\u30e5\u30e7]")
+HANGUL = re.compile(r"[\uac00-\ud7a3]")
+DEVANAGARI = re.compile(r"[\u0904-\u0914]|[\u0915-\u0939](?!\u094d)")  # vowels, and consonants not joined by a virama
+ARABIC = re.compile(r"[\u0621-\u064a]")
+SENTENCE_BREAKS = re.compile(r"[.!?\u2026\u3002\uff01\uff1f]+")
+CLAUSE_BREAKS = re.compile(r"[,;:\u2013\u2014\uff0c\u3001\uff1b\uff1a]")
+
+
+def speech_features(text: str, language: str = "en") -> np.ndarray:
+    """Syllables, sentence breaks, clause breaks and one model call for `text`"""
+    # Accents are dropped so vowels match one class; NFC then restores Hangul syllables and kana
+    text = unicodedata.normalize("NFC", COMBINING_MARKS.sub("", unicodedata.normalize("NFD", text.lower())))
+    syllables = len(VOWEL_GROUPS.findall(text)) + len(DIGITS.findall(text)) + len(HANGUL.findall(text))
+    syllables += len(KANA.findall(text)) - len(SMALL_KANA.findall(text))
+    # A kanji is read with about two morae; a hanzi is one syllable
+    syllables += len(HAN.findall(text)) * (2 if language == "ja" else 1)
+    syllables += len(DEVANAGARI.findall(text))
+    # Short vowels aren't written in Arabic: about two letters per syllable
+    syllables += len(ARABIC.findall(text)) / 2
+    return np.array([
+        syllables,
+        len(SENTENCE_BREAKS.findall(text)),
+        len(CLAUSE_BREAKS.findall(text)),
+        1.0,
+    ])
+
+
+class RateStats:
+    """Sufficient statistics of a least-squares fit (X'X, X'y and the number of observations)"""
+
+    def __init__(self, xtx: Optional[np.ndarray] = None, xty: Optional[np.ndarray] = None, count: float = 0.0):
+        self.xtx = np.zeros((FEATURES, FEATURES)) if xtx is None else xtx
+        self.xty = np.zeros(FEATURES) if xty is None else xty
+        self.count = count
+
+    def add(self, features: np.ndarray, seconds: float):
+        self.xtx += np.outer(features, features)
+        self.xty += features * seconds
+        self.count += 1
+
+    def merge(self, other: "RateStats"):
+        self.xtx += other.xtx
+        self.xty += other.xty
+        self.count += other.count
+
+    def decay(self):
+        """Halve the weight of everything seen so far once there is plenty of it"""
+        if self.count > DURATION_MAX_OBSERVATIONS:
+            self.xtx *= 0.5
+            self.xty *= 0.5
+            self.count *= 0.5
+
+    def fit(self, prior: np.ndarray) -> np.ndarray:
+        """Ridge regression towards `prior`"""
+        ridge = np.diag(DURATION_PRIOR_STRENGTH * TYPICAL_FEATURES ** 2)
+        weights = np.linalg.solve(self.xtx + ridge, self.xty + ridge @ prior)
+        # Durations never shrink with more text
+        return np.maximum(weights, 0.0)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"xtx": self.xtx.tolist(), "xty": self.xty.tolist(), "count": self.count}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "RateStats":
+        return cls(np.array(data["xtx"], dtype=float), np.array(data["xty"], dtype=float), float(data["count"]))
+
+
+class DurationModel:
+    """
+    Per-language and per-voice speech rate models for one TTS model version.
+
+    `observe()` records a synthesized text and its length; `predict()`
+    returns the expected length in seconds of one model call's audio.
+    `save()` merges this process's observations into the shared file and
+    picks up everyone else's.
+    """
+
+    def __init__(self, path: str = DURATION_MODEL_PATH):
+        self.path = path
+        self.model_version = ""
+        self._lock = threading.Lock()
+        self._stats: Dict[str, RateStats] = {}  # "<language>" and "<language>/<voice>"
+        self._pending: Dict[str, RateStats] = {}  # observed since the last save
+        self._weights: Dict[str, np.ndarray] = {}
+        self.observations = 0
+
+    def load(self, model_version: str):
+        """Read the shared statistics for `model_version` (earlier versions' are ignored)"""
+        with self._lock:
+            self.model_version = model_version
+            self._stats = self._read().get(model_version, {})
+            self._pending.clear()
+            self._weights.clear()
+
+    def observe(self, text: str, language: str, voice_id: str, seconds: float):
+        features = speech_features(text, language)
+        with self._lock:
+            for key in (language, f"{language}/{voice_id}"):
+                for stats in (self._stats, self._pending):
+                    stats.setdefault(key, RateStats()).add(features, seconds)
+                self._stats[key].decay()
+                self._weights.pop(key, None)
+            self.observations += 1
+
+    def weights(self, language: str, voice_id: Optional[str] = None) -> np.ndarray:
+        """Fitted weights for a voice (or a language), falling back through language to the defaults"""
+        key = f"{language}/{voice_id}" if voice_id else language
+        weights = self._weights.get(key)
+        if weights is None:
+            prior = self.weights(language) if voice_id else LANGUAGE_WEIGHTS.get(language, DEFAULT_WEIGHTS)
+            stats = self._stats.get(key)
+            weights = stats.fit(prior) if stats else prior
+            self._weights[key] = weights
+        return weights
+
+    def predict(self, text: str, language: str = "en", voice_id: Optional[str] = None) -> float:
+        """Seconds of audio one model call produces for `text`"""
+        return float(speech_features(text, language) @ self.weights(language, voice_id))
+
+    def calibration(self, language: str, voice_id: Optional[str] = None) -> Dict[str, Any]:
+        """How much history the prediction for a voice rests on"""
+        voice = self._stats.get(f"{language}/{voice_id}") if voice_id else None
+        language_stats = self._stats.get(language)
+        return {
+            "voice_observations": round(voice.count) if voice else 0,
+            "language_observations": round(language_stats.count) if language_stats else 0,
+        }
+
+    def save(self):
+        """Add this process's new observations to the shared file and reload the merged result"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            versions = self._read()
+            stats = versions.setdefault(self.model_version, {})
+            for key, delta in pending.items():
+                merged = stats.setdefault(key, RateStats())
+                merged.merge(delta)
+                merged.decay()
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({
+                    version: {key: entry.to_json() for key, entry in entries.items()}
+                    for version, entries in versions.items()
+                }, f)
+            os.replace(temp_path, self.path)
+        with self._lock:
+            # Observations made while saving are in _pending; keep them on top of the merged file
+            for key, delta in self._pending.items():
+                stats.setdefault(key, RateStats()).merge(delta)
+            self._stats = stats
+            self._weights.clear()
+
+    def _read(self) -> Dict[str, Dict[str, RateStats]]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            print(f"Ignoring unreadable duration model {self.path}: {e}")
+            return {}
+        return {
+            version: {key: RateStats.from_json(entry) for key, entry in entries.items()}
+            for version, entries in data.items()
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        languages = sorted(key for key in self._stats if "/" not in key)
+        return {
+            "observations": self.observations,
+            "languages": {language: round(self._stats[language].count) for language in languages},
+            "voices": sum(1 for key in self._stats if "/" in key),
+        }
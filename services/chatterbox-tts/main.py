@@ -4,23 +4,38 @@ FastAPI service for text-to-speech using Chatterbox TTS
 Open-source TTS that outperforms ElevenLabs with MIT licensing
 """
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, FileResponse
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from typing import Annotated, Optional, List, Dict, Any, AsyncIterator, Tuple, Union
 import os
-import tempfile
 import asyncio
 from datetime import datetime
 import json
 
+import numpy as np
+
+from artifact_store import ARTIFACT_SWEEP_SECONDS, ArtifactResponse, create_artifact_store
+from duration_model import DURATION_SAVE_SECONDS, DurationModel
+from audio_cache import cache_key, create_cache, create_sentence_cache
+from streaming import AUDIO_FORMATS, CROSSFADE_MS, OPUS_SAMPLE_RATES, ChunkedSynthesis, encode_stream
+from scheduler import SynthesisScheduler
+from text_chunking import chunk_text, sentence_chunks
+from tracing import setup_tracing, start_span
+from model_manager import MODEL_PIN_LANGUAGES, MODEL_PIN_TOP, MODEL_PRELOAD, ModelManager
+from voice_embeddings import EmbeddingStore
+from voice_library import VoiceLibrary
+
 # Try to import chatterbox - will need to be implemented or use API
 # For now, we'll create a structure that can work with the actual implementation
 CHATTERBOX_AVAILABLE = False
 
 app = FastAPI(title="Kolony Chatterbox TTS", version="1.0.0")
 
+# Distributed tracing (W3C traceparent in and out)
+setup_tracing(app, "chatterbox-tts")
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -31,14 +46,15 @@ app.add_middleware(
 )
 
 # Configuration
-MODEL_PATH = os.getenv("MODEL_PATH", "/models/chatterbox")
 API_KEY = os.getenv("API_KEY", "")
 SUPPORTED_LANGUAGES = [
     "en", "es", "fr", "de", "it", "pt", "ru", "ja", "zh", "ko",
     "ar", "hi", "nl", "pl", "tr", "sv", "da", "no", "fi", "cs", "hu", "ro"
 ]
-DEFAULT_VOICE = "default"
 DEFAULT_LANGUAGE = "en"
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))  # items of one batch synthesized at once
+BATCH_STREAM_MIN_ITEMS = int(os.getenv("BATCH_STREAM_MIN_ITEMS", "20"))  # larger batches stream results
 
 
 # Pydantic Models
@@ -49,8 +65,36 @@ class TTSRequest(BaseModel):
     emotion: Optional[str] = Field(default=None, description="Emotion: neutral, happy, sad, angry, excited, calm")
     speed: float = Field(default=1.0, ge=0.5, le=2.0, description="Speech speed multiplier")
     pitch: float = Field(default=1.0, ge=0.5, le=2.0, description="Pitch multiplier")
-    format: str = Field(default="mp3", description="Output format: mp3, wav, ogg")
-    sample_rate: int = Field(default=24000, description="Sample rate in Hz")
+    format: str = Field(default="mp3", description="Output format: mp3, wav, ogg, opus, pcm")
+    sample_rate: int = Field(default=24000, ge=8000, le=48000, description="Sample rate in Hz")
+
+
+class SpeechRequest(BaseModel):
+    """OpenAI `audio.speech.create` request body"""
+    model: str = Field(default="chatterbox-tts", description="Accepted for compatibility and ignored")
+    input: str = Field(..., min_length=1, max_length=5000)
+    voice: Optional[str] = Field(default=None, description="Voice ID from voice library")
+    response_format: str = Field(default="mp3", description="mp3, wav, ogg, opus or pcm (24 kHz 16-bit mono)")
+    speed: float = Field(default=1.0, ge=0.25, le=4.0)
+    instructions: Optional[str] = Field(default=None, description="Accepted for compatibility and ignored")
+    language: str = Field(default="en", description="Language code (ISO 639-1)")
+    emotion: Optional[str] = None
+
+
+class DurationRequest(BaseModel):
+    # Each text is bounded like a synthesis request so one call can't stall the event loop
+    texts: List[Annotated[str, Field(min_length=1, max_length=5000)]] = Field(..., min_length=1, max_length=1000)
+    voice_id: Optional[str] = Field(default=None, description="Voice ID from voice library")
+    language: str = Field(default="en", description="Language code (ISO 639-1)")
+    speed: float = Field(default=1.0, ge=0.25, le=4.0, description="Speech speed multiplier")
+
+
+class DurationResponse(BaseModel):
+    durations: List[float]
+    total: float
+    voice_used: str
+    language: str
+    calibration: Dict[str, Any]
 
 
 class TTSResponse(BaseModel):
@@ -61,6 +105,20 @@ class TTSResponse(BaseModel):
     voice_used: str
     language: str
     format: str
+    cached: bool = False
+
+
+class BatchTTSRequest(BaseModel):
+    items: List[Union[str, Dict[str, Any]]] = Field(
+        ..., min_length=1, max_length=BATCH_MAX_ITEMS,
+        description="Texts, or objects with the fields of a /synthesize request"
+    )
+    defaults: Dict[str, Any] = Field(default={}, description="Fields applied to every item that doesn't set them")
+    return_audio: bool = Field(default=True, description="Return audio URLs or just metadata")
+    stream: Optional[bool] = Field(
+        default=None,
+        description="Stream results as NDJSON as they complete (default: for batches over BATCH_STREAM_MIN_ITEMS)"
+    )
 
 
 class VoiceInfo(BaseModel):
@@ -77,57 +135,290 @@ class HealthResponse(BaseModel):
     model_loaded: bool
     supported_languages: List[str]
     available_voices: int
+    cache: Optional[Dict[str, Any]] = None
+    batching: Optional[Dict[str, Any]] = None
+    artifacts: Optional[Dict[str, Any]] = None
+    voices: Optional[Dict[str, Any]] = None
+    duration_model: Optional[Dict[str, Any]] = None
+    models: Optional[Dict[str, Any]] = None
+
+
+# Models per language, loaded on first use; cloned voices' conditioning embeddings are
+# shared by all workers through one mapped file
+tts_models = ModelManager(embeddings=EmbeddingStore())
+# All model calls go through the scheduler, which batches same-voice texts
+synthesis_scheduler = SynthesisScheduler(tts_models.generate_batch)
+
+# Synthesized audio by content hash (None when TTS_CACHE=none)
+audio_cache = create_cache()
+# PCM per sentence, reused across texts that share sentences (None when SENTENCE_CACHE=none)
+sentence_cache = create_sentence_cache()
+# Audio handed out by URL (local disk, optionally backed by an object store)
+artifact_store = create_artifact_store()
+# Speech rate per language and voice, calibrated from every model call
+duration_model = DurationModel()
+
+
+async def prepare_voices(voices: List[Dict[str, Any]], full: bool):
+    """Compute embeddings for new or edited voices before their first request"""
+    if not CHATTERBOX_AVAILABLE:
+        return
+    prepared = 0
+    for voice in voices:
+        try:
+            prepared += await asyncio.to_thread(tts_models.prepare_voice, voice)
+        except Exception as e:
+            print(f"Error preparing voice {voice['id']}: {e}")
+    if full:
+        await asyncio.to_thread(tts_models.compact_voices, voices)
+    if prepared:
+        print(f"Prepared embeddings for {prepared} voices")
 
 
-# Global voice library (would be loaded from database in production)
-voice_library = {
-    "default": {
-        "id": "default",
-        "name": "Default English",
-        "language": "en",
-        "gender": "neutral",
-        "emotion_profile": {
-            "neutral": 1.0,
-            "happy": 0.8,
-            "calm": 0.9
-        }
-    }
-}
+# Voices from the voice_library table, kept current by change notifications
+voice_library = VoiceLibrary(on_change=prepare_voices)
 
 
 # Initialize TTS model
 def load_tts_model():
-    """Load Chatterbox TTS model on startup"""
+    """Find the installed Chatterbox models on startup (they are loaded on first use)"""
     global CHATTERBOX_AVAILABLE
     
-    # TODO: Implement actual Chatterbox TTS model loading
-    # This would load the model from MODEL_PATH
-    # For now, we'll mark as available if the path exists or use API mode
+    try:
+        CHATTERBOX_AVAILABLE = tts_models.probe()
+    except Exception as e:
+        print(f"Error loading Chatterbox TTS model: {e}")
+        CHATTERBOX_AVAILABLE = False
     
-    if os.path.exists(MODEL_PATH) or API_KEY:
-        CHATTERBOX_AVAILABLE = True
-        print("Chatterbox TTS model ready")
+    if CHATTERBOX_AVAILABLE:
+        kind = "multilingual" if tts_models.default.multilingual else "English"
+        print(f"Chatterbox TTS available ({kind}, {tts_models.device})")
     else:
         print("Warning: Chatterbox TTS model not found. Using mock mode.")
-        CHATTERBOX_AVAILABLE = False
+
+
+async def preload_models():
+    """Load the pinned models, then precompute voices for them"""
+    await tts_models.preload()
+    await prepare_voices(list(voice_library.catalog), True)
 
 
 @app.on_event("startup")
 async def startup_event():
     """Load model on startup"""
+    global sweep_task, save_task, preload_task
+    await synthesis_scheduler.start()
+    sweep_task = asyncio.create_task(sweep_artifacts())
+    await voice_library.start()
     await asyncio.to_thread(load_tts_model)
+    await asyncio.to_thread(duration_model.load, tts_models.default.model_version)
+    save_task = asyncio.create_task(save_duration_model())
+    # Pin the configured languages and the most synthesized ones (from the duration model's history)
+    usage = duration_model.stats()["languages"]
+    tts_models.pin(MODEL_PIN_LANGUAGES + sorted(usage, key=usage.get, reverse=True)[:MODEL_PIN_TOP])
+    if CHATTERBOX_AVAILABLE and MODEL_PRELOAD:
+        preload_task = asyncio.create_task(preload_models())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in (sweep_task, save_task, preload_task):
+        if task is not None:
+            task.cancel()
+    await voice_library.stop()
+    await synthesis_scheduler.stop()
+    await asyncio.to_thread(duration_model.save)
+
+
+sweep_task: Optional[asyncio.Task] = None
+save_task: Optional[asyncio.Task] = None
+preload_task: Optional[asyncio.Task] = None
+
+
+async def sweep_artifacts():
+    """Delete expired artifacts periodically"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(artifact_store.sweep)
+            if removed:
+                print(f"Removed {removed} expired audio artifacts")
+        except Exception as e:
+            print(f"Error sweeping audio artifacts: {e}")
+        await asyncio.sleep(ARTIFACT_SWEEP_SECONDS)
+
+
+async def save_duration_model():
+    """Share duration observations with other workers periodically"""
+    while True:
+        await asyncio.sleep(DURATION_SAVE_SECONDS)
+        try:
+            await asyncio.to_thread(duration_model.save)
+        except Exception as e:
+            print(f"Error saving duration model: {e}")
 
 
 # Health check endpoint
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
+    models = tts_models.stats()
     return HealthResponse(
         status="healthy" if CHATTERBOX_AVAILABLE else "model_not_loaded",
-        model_loaded=CHATTERBOX_AVAILABLE,
+        model_loaded=any(model["loaded"] for model in models["models"].values()),
         supported_languages=SUPPORTED_LANGUAGES,
-        available_voices=len(voice_library)
+        available_voices=len(voice_library.catalog),
+        cache={
+            "audio": audio_cache.stats() if audio_cache else None,
+            "sentences": sentence_cache.stats() if sentence_cache else None,
+        },
+        batching=synthesis_scheduler.stats(),
+        artifacts=artifact_store.stats(),
+        voices={
+            **voice_library.stats(),
+            "embeddings": tts_models.embeddings.stats() if tts_models.embeddings else None,
+            "embeddings_computed": tts_models.voices_prepared,
+        },
+        duration_model=duration_model.stats(),
+        models=models
+    )
+
+
+def validate_request(request: TTSRequest):
+    """Reject languages and formats the loaded model can't produce"""
+    if request.language not in SUPPORTED_LANGUAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported language. Supported: {', '.join(SUPPORTED_LANGUAGES)}"
+        )
+    if not tts_models.supports(request.language):
+        raise HTTPException(status_code=400, detail="Only English is available with the English-only model")
+    if request.format not in AUDIO_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported format. Supported: {', '.join(AUDIO_FORMATS)}"
+        )
+    if request.format == "opus" and request.sample_rate not in OPUS_SAMPLE_RATES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Opus sample rate must be one of: {', '.join(map(str, OPUS_SAMPLE_RATES))}"
+        )
+
+
+def resolve_voice(request: TTSRequest) -> Tuple[str, Dict[str, Any]]:
+    """Voice ID and configuration for a request (unknown voices fall back to the default)"""
+    catalog = voice_library.catalog
+    voice_id = request.voice_id or catalog.default_id
+    return voice_id, catalog.get(voice_id) or catalog.get(catalog.default_id)
+
+
+def request_cache_key(request: TTSRequest, voice_id: str, voice_config: Dict[str, Any]) -> str:
+    """Cache key for the audio a request produces"""
+    return cache_key(
+        request.text,
+        tts_models.model_version(request.language),
+        voice=voice_id,
+        # Editing a voice (e.g. a new reference clip) must not serve its old audio
+        voice_config=json.dumps(voice_config, sort_keys=True, default=str),
+        language=request.language,
+        emotion=request.emotion,
+        speed=request.speed,
+        pitch=request.pitch,
+        format=request.format,
+        sample_rate=request.sample_rate,
+    )
+
+
+async def generate_pcm(text: str, request: TTSRequest, voice_id: str, voice_config: Dict[str, Any]) -> np.ndarray:
+    """PCM for one chunk of text from the model (via the batching scheduler)"""
+    # Loads the language's model off the inference thread if it isn't resident
+    await tts_models.ensure(request.language)
+    pcm = await synthesis_scheduler.submit(
+        text, language=request.language, voice_id=voice_id, voice=voice_config, emotion=request.emotion
+    )
+    duration_model.observe(text, request.language, voice_id, len(pcm) / tts_models.sample_rate)
+    return pcm
+
+
+def synthesis_chunks(text: str) -> List[str]:
+    """The pieces a text is synthesized in (one model call each)"""
+    return sentence_chunks(text) if sentence_cache else chunk_text(text)
+
+
+def predict_duration(text: str, language: str, voice_id: str, speed: float = 1.0) -> float:
+    """Expected length in seconds of the audio for `text`, without synthesizing it"""
+    chunks = synthesis_chunks(text)
+    seconds = sum(duration_model.predict(chunk, language, voice_id) for chunk in chunks)
+    # Each join overlaps the chunks by a crossfade
+    seconds -= max(0, len(chunks) - 1) * CROSSFADE_MS / 1000
+    return max(0.0, seconds) / speed
+
+
+async def synthesize_sentence(
+    text: str,
+    request: TTSRequest,
+    voice_id: str,
+    voice_config: Dict[str, Any]
+) -> np.ndarray:
+    """
+    PCM for one sentence from the sentence cache, synthesizing it on a miss.
+    
+    The key covers only what the model sees (text, voice, language, emotion
+    and model version); format, sample rate, speed and pitch are applied
+    after synthesis, so the PCM is shared across them.
+    """
+    key = cache_key(
+        text,
+        tts_models.model_version(request.language),
+        voice=voice_id,
+        voice_config=json.dumps(voice_config, sort_keys=True, default=str),
+        language=request.language,
+        emotion=request.emotion,
+    )
+    synthesized: Dict[str, np.ndarray] = {}
+    
+    async def create(path: str) -> float:
+        pcm = await generate_pcm(text, request, voice_id, voice_config)
+        await asyncio.to_thread(pcm.tofile, path)
+        synthesized["pcm"] = pcm
+        return len(pcm) / tts_models.sample_rate
+    
+    entry, _ = await sentence_cache.get_or_create(key, "f32", create)
+    if "pcm" in synthesized:
+        return synthesized["pcm"]
+    try:
+        return await asyncio.to_thread(np.fromfile, entry.path, dtype=np.float32)
+    except OSError:
+        # Evicted between lookup and read
+        return await generate_pcm(text, request, voice_id, voice_config)
+
+
+def synthesis_stream(
+    request: TTSRequest,
+    voice_id: str,
+    voice_config: Dict[str, Any]
+) -> Tuple[ChunkedSynthesis, AsyncIterator[bytes]]:
+    """
+    Encoded audio for a request, produced sentence by sentence.
+    
+    With the sentence cache every sentence is synthesized (or reused) on its
+    own; otherwise short sentences are merged into fewer model calls.
+    Returns the synthesis (whose `samples` count gives the duration once
+    consumed) and the encoded byte stream.
+    """
+    async def synthesize_chunk(text: str):
+        if sentence_cache:
+            return await synthesize_sentence(text, request, voice_id, voice_config)
+        return await generate_pcm(text, request, voice_id, voice_config)
+    
+    chunks = synthesis_chunks(request.text)
+    synthesis = ChunkedSynthesis(
+        synthesize_chunk, chunks, crossfade=int(tts_models.sample_rate * CROSSFADE_MS / 1000)
     )
+    audio = encode_stream(
+        synthesis, tts_models.sample_rate, request.format, request.sample_rate,
+        speed=request.speed, pitch=request.pitch
+    )
+    return synthesis, audio
 
 
 # Text-to-speech endpoint
@@ -144,51 +435,78 @@ async def synthesize_speech(
     if not CHATTERBOX_AVAILABLE:
         # In production, this would raise an error
         # For now, return mock response
+        voice_id, _ = resolve_voice(request)
         return TTSResponse(
             audio_url=None,
             audio_base64=None,
-            duration=len(request.text) * 0.1,  # Rough estimate
+            duration=predict_duration(request.text, request.language, voice_id, request.speed),
             text=request.text,
-            voice_used=request.voice_id or DEFAULT_VOICE,
+            voice_used=voice_id,
             language=request.language,
             format=request.format
         )
     
-    # Validate language
-    if request.language not in SUPPORTED_LANGUAGES:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported language. Supported: {', '.join(SUPPORTED_LANGUAGES)}"
-        )
-    
-    # Get voice configuration
-    voice_id = request.voice_id or DEFAULT_VOICE
-    voice_config = voice_library.get(voice_id, voice_library[DEFAULT_VOICE])
-    
-    # TODO: Implement actual TTS synthesis
-    # This would call the Chatterbox TTS model/API
-    # For now, create a placeholder
+    validate_request(request)
+    voice_id, voice_config = resolve_voice(request)
     
-    # In real implementation:
-    # 1. Load voice model
-    # 2. Apply emotion settings
-    # 3. Synthesize audio with specified parameters
-    # 4. Apply neural watermarking
-    # 5. Save to temporary file or return as stream
-    
-    # Mock implementation
-    audio_file_path = None
-    duration = len(request.text.split()) * 0.5  # Rough estimate: 0.5s per word
+    if audio_cache:
+        async def create(path: str) -> float:
+            synthesis, audio = synthesis_stream(request, voice_id, voice_config)
+            with open(path, "wb") as f:
+                async for data in audio:
+                    f.write(data)
+            return synthesis.samples / tts_models.sample_rate / request.speed
+        
+        key = request_cache_key(request, voice_id, voice_config)
+        with start_span("tts.synthesize", attributes={"tts.voice": voice_id, "tts.characters": len(request.text)}) as span:
+            try:
+                entry, source = await audio_cache.get_or_create(key, request.format, create)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Synthesis failed: {e}")
+            if span:
+                span.set_attribute("tts.cache", source)
+            if return_audio:
+                try:
+                    await asyncio.to_thread(artifact_store.publish, entry.filename, entry.path)
+                except Exception as e:
+                    raise HTTPException(status_code=500, detail=f"Failed to store audio: {e}")
+        
+        return TTSResponse(
+            audio_url=artifact_store.url(entry.filename) if return_audio else None,
+            audio_base64=None,
+            duration=entry.duration,
+            text=request.text,
+            voice_used=voice_id,
+            language=request.language,
+            format=request.format,
+            cached=source != "miss"
+        )
     
-    if return_audio:
-        # Create temporary audio file (mock)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{request.format}") as tmp_file:
-            audio_file_path = tmp_file.name
-            # In real implementation, write actual audio data here
-            tmp_file.write(b"mock_audio_data")  # Placeholder
+    artifact = artifact_store.new_name(request.format) if return_audio else None
+    audio_file_path = artifact_store.temp_path(artifact) if artifact else None
+    synthesis, audio = synthesis_stream(request, voice_id, voice_config)
+    with start_span("tts.synthesize", attributes={"tts.voice": voice_id, "tts.characters": len(request.text)}):
+        try:
+            if audio_file_path:
+                with open(audio_file_path, "wb") as f:
+                    async for data in audio:
+                        f.write(data)
+            else:
+                async for _ in audio:
+                    pass
+        except Exception as e:
+            if audio_file_path and os.path.exists(audio_file_path):
+                os.unlink(audio_file_path)
+            raise HTTPException(status_code=500, detail=f"Synthesis failed: {e}")
+    duration = synthesis.samples / tts_models.sample_rate / request.speed
+    if artifact:
+        try:
+            await asyncio.to_thread(artifact_store.put, artifact, audio_file_path, True)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to store audio: {e}")
     
     return TTSResponse(
-        audio_url=f"/audio/{os.path.basename(audio_file_path)}" if audio_file_path else None,
+        audio_url=artifact_store.url(artifact) if artifact else None,
         audio_base64=None,  # Could encode audio as base64 if needed
         duration=duration,
         text=request.text,
@@ -210,26 +528,58 @@ async def synthesize_speech_stream(request: TTSRequest):
             detail="TTS model not loaded"
         )
     
-    # TODO: Implement streaming synthesis
-    # This would generate audio in chunks and stream to client
+    validate_request(request)
+    return await stream_speech(request)
+
+
+async def stream_speech(request: TTSRequest):
+    """Streaming response for a validated request: cached audio, or audio encoded as it is synthesized"""
+    voice_id, voice_config = resolve_voice(request)
+    
+    if audio_cache:
+        key = request_cache_key(request, voice_id, voice_config)
+        entry = await asyncio.to_thread(audio_cache.lookup, key)
+        if entry:
+            return FileResponse(
+                entry.path,
+                media_type=AUDIO_FORMATS[request.format][1],
+                headers={"X-Voice-Used": voice_id, "X-Cache": "hit"}
+            )
+    
+    _, audio = synthesis_stream(request, voice_id, voice_config)
     
-    # For now, return a placeholder
-    raise HTTPException(
-        status_code=501,
-        detail="Streaming not yet implemented"
+    # Wait for the first sentence so synthesis errors still get an error status
+    try:
+        first = await audio.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except Exception as e:
+        await audio.aclose()
+        raise HTTPException(status_code=500, detail=f"Synthesis failed: {e}")
+    
+    async def body() -> AsyncIterator[bytes]:
+        yield first
+        # A later failure can only abort the response (the status is already sent)
+        async for data in audio:
+            yield data
+    
+    return StreamingResponse(
+        body(),
+        media_type=AUDIO_FORMATS[request.format][1],
+        headers={"X-Voice-Used": voice_id}
     )
 
 
 # Batch synthesis endpoint
 @app.post("/synthesize/batch")
-async def synthesize_batch(
-    texts: List[str] = Query(..., description="List of texts to synthesize"),
-    voice_id: Optional[str] = Query(default=None),
-    language: str = Query(default="en"),
-    emotion: Optional[str] = Query(default=None)
-):
+async def synthesize_batch(batch: BatchTTSRequest):
     """
     Synthesize multiple texts in batch
+    
+    Items are synthesized concurrently and their sentences are batched onto
+    the model with other same-voice work. Results come back in order with
+    per-item errors; large batches stream one NDJSON line per item as it
+    completes.
     """
     if not CHATTERBOX_AVAILABLE:
         raise HTTPException(
@@ -237,31 +587,79 @@ async def synthesize_batch(
             detail="TTS model not loaded"
         )
     
-    results = []
+    stream = batch.stream if batch.stream is not None else len(batch.items) > BATCH_STREAM_MIN_ITEMS
+    limiter = asyncio.Semaphore(BATCH_CONCURRENCY)
     
-    for i, text in enumerate(texts):
+    async def synthesize_one(index: int, item: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+        fields = {"text": item} if isinstance(item, str) else item
+        result = {"index": index, "text": fields.get("text")}
         try:
-            request = TTSRequest(
-                text=text,
-                voice_id=voice_id,
-                language=language,
-                emotion=emotion
-            )
-            result = await synthesize_speech(request, return_audio=False)
-            results.append({
-                "index": i,
-                "text": text,
-                "duration": result.duration,
-                "voice_used": result.voice_used
-            })
+            request = TTSRequest(**{**batch.defaults, **fields})
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+            return {**result, "error": f"Invalid item: {errors}"}
+        
+        try:
+            async with limiter:
+                response = await synthesize_speech(request, return_audio=batch.return_audio)
+        except HTTPException as e:
+            return {**result, "error": e.detail}
         except Exception as e:
-            results.append({
-                "index": i,
-                "text": text,
-                "error": str(e)
-            })
+            return {**result, "error": str(e)}
+        return {
+            **result,
+            "audio_url": response.audio_url,
+            "duration": response.duration,
+            "voice_used": response.voice_used,
+            "cached": response.cached
+        }
+    
+    tasks = [asyncio.create_task(synthesize_one(i, item)) for i, item in enumerate(batch.items)]
+    
+    if stream:
+        async def ndjson_results():
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield json.dumps(await next_done) + "\n"
+            finally:
+                # Client went away: stop work that hasn't started yet
+                for pending in tasks:
+                    pending.cancel()
+        
+        return StreamingResponse(ndjson_results(), media_type="application/x-ndjson")
+    
+    try:
+        return {"results": await asyncio.gather(*tasks)}
+    finally:
+        for pending in tasks:
+            pending.cancel()
+
+
+@app.post("/duration", response_model=DurationResponse)
+async def predict_durations(request: DurationRequest):
+    """
+    Predict how long each text will take to speak, without synthesizing
     
-    return {"results": results}
+    Uses speech rate models per language and voice, calibrated from past
+    syntheses; works while the model is still loading.
+    """
+    if request.language not in SUPPORTED_LANGUAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported language. Supported: {', '.join(SUPPORTED_LANGUAGES)}"
+        )
+    voice_id = request.voice_id or voice_library.catalog.default_id
+    durations = [
+        round(predict_duration(text, request.language, voice_id, request.speed), 3)
+        for text in request.texts
+    ]
+    return DurationResponse(
+        durations=durations,
+        total=round(sum(durations), 3),
+        voice_used=voice_id,
+        language=request.language,
+        calibration=duration_model.calibration(request.language, voice_id)
+    )
 
 
 # Voice library endpoints
@@ -270,24 +668,9 @@ async def list_voices(
     language: Optional[str] = Query(default=None, description="Filter by language")
 ):
     """
-    List available voices
+    List available voices (default voice first, then by name)
     """
-    voices = []
-    
-    for voice_id, voice_data in voice_library.items():
-        if language and voice_data["language"] != language:
-            continue
-        
-        voices.append(VoiceInfo(
-            id=voice_id,
-            name=voice_data["name"],
-            language=voice_data["language"],
-            gender=voice_data.get("gender"),
-            emotion_profile=voice_data.get("emotion_profile", {}),
-            sample_url=voice_data.get("sample_url")
-        ))
-    
-    return voices
+    return [voice_info(voice_data) for voice_data in voice_library.catalog.list(language)]
 
 
 @app.get("/voices/{voice_id}", response_model=VoiceInfo)
@@ -295,12 +678,16 @@ async def get_voice(voice_id: str):
     """
     Get details about a specific voice
     """
-    if voice_id not in voice_library:
+    voice_data = voice_library.catalog.get(voice_id)
+    if voice_data is None:
         raise HTTPException(status_code=404, detail="Voice not found")
     
-    voice_data = voice_library[voice_id]
+    return voice_info(voice_data)
+
+
+def voice_info(voice_data: Dict[str, Any]) -> VoiceInfo:
     return VoiceInfo(
-        id=voice_id,
+        id=voice_data["id"],
         name=voice_data["name"],
         language=voice_data["language"],
         gender=voice_data.get("gender"),
@@ -309,54 +696,86 @@ async def get_voice(voice_id: str):
     )
 
 
+async def serve_artifact(
+    filename: str,
+    range_header: Optional[str] = None,
+    if_none_match: Optional[str] = None
+) -> ArtifactResponse:
+    """Response for an audio artifact, fetched from the object store if this replica doesn't have it"""
+    try:
+        file_path = await asyncio.to_thread(artifact_store.open, filename)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Audio storage unavailable: {e}")
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    
+    extension = os.path.splitext(filename)[1].lstrip(".")
+    return ArtifactResponse(
+        file_path,
+        filename,
+        media_type=AUDIO_FORMATS.get(extension, (None, "audio/mpeg"))[1],
+        range_header=range_header,
+        if_none_match=if_none_match
+    )
+
+
 # Audio file serving endpoint
 @app.get("/audio/{filename}")
-async def get_audio(filename: str):
+async def get_audio(
+    filename: str,
+    range: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None)
+):
+    """
+    Serve generated audio files (supports Range requests)
+    """
+    return await serve_artifact(filename, range, if_none_match)
+
+
+@app.delete("/audio/{filename}")
+async def delete_audio(filename: str):
     """
-    Serve generated audio files
+    Delete a generated audio file (used when a job is cancelled)
     """
-    # In production, this would serve from storage (S3, Supabase Storage, etc.)
-    # For now, check temp directory
-    temp_dir = tempfile.gettempdir()
-    file_path = os.path.join(temp_dir, filename)
+    if os.path.basename(filename) != filename:
+        raise HTTPException(status_code=400, detail="Invalid filename")
     
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Audio file not found")
+    # Cached audio may be shared with other requests; the TTL and LRU budget remove it
+    if audio_cache and audio_cache.find(filename):
+        return {"retained": filename}
     
-    return FileResponse(
-        file_path,
-        media_type="audio/mpeg",
-        filename=filename
-    )
+    if not await asyncio.to_thread(artifact_store.delete, filename):
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    return {"deleted": filename}
 
 
 # OpenAI-compatible API endpoint
 @app.post("/v1/audio/speech")
-async def openai_compatible_speech(
-    model: str = Query(default="chatterbox-tts"),
-    input: str = Query(..., description="Text to synthesize"),
-    voice: str = Query(default="default", description="Voice to use"),
-    response_format: str = Query(default="mp3", description="Output format"),
-    speed: float = Query(default=1.0, ge=0.25, le=4.0)
-):
+async def openai_compatible_speech(speech: SpeechRequest):
     """
     OpenAI-compatible TTS endpoint for easy integration
-    """
-    request = TTSRequest(
-        text=input,
-        voice_id=voice,
-        format=response_format,
-        speed=speed
-    )
     
-    result = await synthesize_speech(request, return_audio=True)
+    Takes the same JSON body as OpenAI's API and streams the audio as it is
+    synthesized, like /synthesize/stream.
+    """
+    if not CHATTERBOX_AVAILABLE:
+        raise HTTPException(
+            status_code=503,
+            detail="TTS model not loaded"
+        )
     
-    if result.audio_url:
-        # Return audio file
-        filename = result.audio_url.split("/")[-1]
-        return await get_audio(filename)
-    else:
-        raise HTTPException(status_code=500, detail="Failed to generate audio")
+    # OpenAI allows 0.25-4x; the tempo filter covers that range, so this skips TTSRequest's narrower bounds
+    request = TTSRequest.model_construct(
+        text=speech.input,
+        voice_id=speech.voice,
+        language=speech.language,
+        emotion=speech.emotion,
+        speed=speech.speed,
+        format=speech.response_format,
+        sample_rate=24000
+    )
+    validate_request(request)
+    return await stream_speech(request)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,257 @@
+"""
+Model manager module
+Loads TTS models on first use and keeps them within a memory budget.
+
+Every language is served by a model slot: the default model (MODEL_PATH,
+multilingual when installed) or a language-specific checkpoint listed in
+LANGUAGE_MODELS, e.g. "en=english,de=/models/chatterbox-de" ("english" is
+the published English-only model). No slot is loaded at import; a slot is
+loaded the first time one of its languages is requested, and when the
+loaded models would exceed MODEL_MEMORY_BUDGET_MB the least recently used
+unpinned slots are unloaded first.
+
+Slots serving MODEL_PIN_LANGUAGES, and the MODEL_PIN_TOP most synthesized
+languages, are pinned: they are loaded in the background at startup and
+never evicted.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Union
+import asyncio
+import os
+import threading
+import time
+
+import numpy as np
+
+from tts_engine import MODEL_PATH, TTSEngine
+from voice_embeddings import EmbeddingStore
+
+# Configuration
+LANGUAGE_MODELS = os.getenv("LANGUAGE_MODELS", "")  # "<language>=<path or english>,..."
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "16384"))  # 0 = no limit
+MODEL_PIN_LANGUAGES = [language for language in os.getenv("MODEL_PIN_LANGUAGES", "en").split(",") if language]
+MODEL_PIN_TOP = int(os.getenv("MODEL_PIN_TOP", "2"))  # most synthesized languages also pinned
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "true").lower() == "true"
+
+DEFAULT_SLOT = "default"
+
+
+@dataclass
+class ModelSlot:
+    """One loadable model and the bookkeeping for its residency"""
+    name: str
+    engine: TTSEngine
+    pinned: bool = False
+    bytes: int = 0
+    last_used: float = 0.0
+    loads: int = 0
+    load_seconds: float = 0.0
+    active: int = 0  # generations running; an active slot is never evicted
+    load_lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def parse_language_models(spec: str) -> Dict[str, str]:
+    """`LANGUAGE_MODELS` as {language: path or "english"}"""
+    models = {}
+    for entry in spec.split(","):
+        if "=" in entry:
+            language, source = entry.split("=", 1)
+            models[language.strip()] = source.strip()
+    return models
+
+
+class ModelManager:
+    """
+    Model slots by language, loaded on demand under a memory budget.
+
+    Presents the engine interface the service needs (`generate_batch`,
+    `model_version(language)`, voice preparation) and routes each call to
+    the slot serving its language.
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[EmbeddingStore] = None,
+        language_models: Optional[Dict[str, str]] = None,
+        budget_mb: float = MODEL_MEMORY_BUDGET_MB
+    ):
+        self.embeddings = embeddings
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.available = False
+        self._lock = threading.Lock()
+        self._slots: Dict[str, ModelSlot] = {
+            DEFAULT_SLOT: ModelSlot(DEFAULT_SLOT, TTSEngine(MODEL_PATH, embeddings=embeddings))
+        }
+        models = parse_language_models(LANGUAGE_MODELS) if language_models is None else language_models
+        for language, source in models.items():
+            if source == "english":
+                engine = TTSEngine("", embeddings=embeddings, variant="english")
+            else:
+                engine = TTSEngine(source, embeddings=embeddings, variant="english" if language == "en" else "multilingual")
+            self._slots[language] = ModelSlot(language, engine)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def default(self) -> TTSEngine:
+        return self._slots[DEFAULT_SLOT].engine
+
+    @property
+    def device(self) -> str:
+        return self.default.device
+
+    @property
+    def sample_rate(self) -> int:
+        # Every Chatterbox variant generates at the same rate
+        return self.default.sample_rate
+
+    @property
+    def voices_prepared(self) -> int:
+        return sum(slot.engine.voices_prepared for slot in self._slots.values())
+
+    def probe(self) -> bool:
+        """Check which models are installed without loading any (blocking)"""
+        for name, slot in list(self._slots.items()):
+            if name == DEFAULT_SLOT:
+                continue
+            path = slot.engine.model_path
+            # A missing checkpoint would otherwise fall back to the published weights
+            if (path and not (os.path.isdir(path) and os.listdir(path))) or not slot.engine.resolve():
+                print(f"Warning: model for language {name} is unavailable, using the default model")
+                del self._slots[name]
+        self.available = self.default.resolve()
+        return self.available
+
+    def slot(self, language: str) -> ModelSlot:
+        return self._slots.get(language) or self._slots[DEFAULT_SLOT]
+
+    def engine(self, language: str) -> TTSEngine:
+        return self.slot(language).engine
+
+    def supports(self, language: str) -> bool:
+        return language == "en" or language in self._slots or self.default.multilingual
+
+    def model_version(self, language: str) -> str:
+        return self.engine(language).model_version
+
+    def pin(self, languages: Iterable[str]):
+        for language in languages:
+            self.slot(language).pinned = True
+
+    def pinned_slots(self) -> List[ModelSlot]:
+        return [slot for slot in self._slots.values() if slot.pinned]
+
+    async def ensure(self, language: str) -> bool:
+        """Load the model for `language` if it isn't resident; True if it was loaded now"""
+        slot = self.slot(language)
+        if slot.engine.loaded:
+            self.hits += 1
+            slot.last_used = time.monotonic()
+            return False
+        return await asyncio.to_thread(self.load, slot)
+
+    def load(self, slot: ModelSlot) -> bool:
+        """Load a slot, evicting others to fit the budget (blocking); True if it was loaded now"""
+        with slot.load_lock:
+            if slot.engine.loaded:
+                return False
+            self.misses += 1
+            # Size from an earlier load of this slot, else from the largest resident model
+            estimate = slot.bytes or max((other.bytes for other in self._slots.values()), default=0)
+            self._evict(slot, estimate)
+            start = time.perf_counter()
+            if not slot.engine.load():
+                raise RuntimeError(f"Chatterbox model for {slot.name} is not installed")
+            slot.load_seconds = time.perf_counter() - start
+            slot.loads += 1
+            slot.bytes = slot.engine.memory_bytes()
+            slot.last_used = time.monotonic()
+            print(
+                f"Loaded {slot.name} TTS model in {slot.load_seconds:.1f}s "
+                f"({slot.bytes / 1024 / 1024:.0f} MB, {slot.engine.device})"
+            )
+            self._evict(slot, 0)
+            return True
+
+    def _evict(self, keep: ModelSlot, incoming: int):
+        """Unload least recently used unpinned models until `incoming` more bytes fit"""
+        if not self.budget:
+            return
+        with self._lock:
+            resident = [slot for slot in self._slots.values() if slot.engine.loaded and slot is not keep]
+            used = sum(slot.bytes for slot in resident) + (keep.bytes if keep.engine.loaded else 0)
+            for slot in sorted(resident, key=lambda slot: slot.last_used):
+                if used + incoming <= self.budget:
+                    break
+                if slot.pinned or slot.active:
+                    continue
+                print(f"Unloading {slot.name} TTS model to stay within the memory budget")
+                slot.engine.unload()
+                used -= slot.bytes
+                self.evictions += 1
+            if used + incoming > self.budget:
+                print("Warning: TTS models exceed MODEL_MEMORY_BUDGET_MB (pinned or in use)")
+
+    async def preload(self):
+        """Load pinned models one after another (run in the background at startup)"""
+        for slot in self.pinned_slots():
+            try:
+                await asyncio.to_thread(self.load, slot)
+            except Exception as e:
+                print(f"Error preloading {slot.name} TTS model: {e}")
+
+    def generate_batch(
+        self,
+        texts: List[str],
+        language: str = "en",
+        voice: Optional[Dict[str, Any]] = None,
+        emotion: Optional[str] = None
+    ) -> List[Union[np.ndarray, Exception]]:
+        """Synthesize with the model for `language` (blocking; loads it if it was evicted meanwhile)"""
+        slot = self.slot(language)
+        while True:
+            with self._lock:
+                if slot.engine.loaded:
+                    slot.active += 1
+                    slot.last_used = time.monotonic()
+                    break
+            self.load(slot)
+        try:
+            return slot.engine.generate_batch(texts, language, voice, emotion)
+        finally:
+            with self._lock:
+                slot.active -= 1
+
+    def prepare_voice(self, voice: Dict[str, Any]) -> bool:
+        """Precompute a voice's conditionals on its language's model, if that model is resident"""
+        return self.engine(voice.get("language", "en")).prepare_voice(voice)
+
+    def compact_voices(self, voices: List[Dict[str, Any]]):
+        """Drop stored conditionals of voices no longer in the library, for every model"""
+        if self.embeddings:
+            self.embeddings.compact(
+                key for slot in self._slots.values() for voice in voices
+                if (key := slot.engine.voice_key(voice))
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "budget_mb": round(self.budget / 1024 / 1024),
+            "resident_mb": round(sum(slot.bytes for slot in self._slots.values() if slot.engine.loaded) / 1024 / 1024),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "models": {
+                slot.name: {
+                    "loaded": slot.engine.loaded,
+                    "pinned": slot.pinned,
+                    "multilingual": slot.engine.multilingual,
+                    "mb": round(slot.bytes / 1024 / 1024),
+                    "loads": slot.loads,
+                    "last_load_seconds": round(slot.load_seconds, 2),
+                }
+                for slot in self._slots.values()
+            },
+        }
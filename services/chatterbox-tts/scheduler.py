@@ -0,0 +1,179 @@
+"""
+Synthesis scheduler
+Dynamic batching of sentence synthesis in front of the shared TTS model.
+
+Every piece of text sent to the model is queued here. The scheduler waits
+for the first request, keeps collecting until it has BATCH_MAX_SIZE
+requests or BATCH_MAX_WAIT_MS has passed, and hands the requests that share
+a voice, language and emotion to the engine in one `generate_batch` call.
+All model work runs on a single inference thread, so concurrent requests
+(and the items of a batch request) never contend for the model.
+
+Raise BATCH_MAX_WAIT_MS for throughput, lower it (or set BATCH_MAX_SIZE=1)
+for latency.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import os
+import time
+
+import numpy as np
+
+# Configuration
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+
+@dataclass
+class SynthesisItem:
+    """One queued text and the future its PCM is delivered to"""
+    text: str
+    language: str
+    voice_id: str
+    voice: Dict[str, Any]
+    emotion: Optional[str]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def options_key(self) -> Tuple[Any, ...]:
+        """Texts can only share a forward pass when voice and prosody match"""
+        return (self.voice_id, self.language, self.emotion)
+
+
+class SynthesisScheduler:
+    """
+    Collects synthesis requests into same-voice batches and owns the inference thread.
+
+    `generate_batch(texts, language, voice, emotion)` returns one float32
+    array per text, in order; an exception in place of an array fails only
+    that text.
+    """
+
+    def __init__(
+        self,
+        generate_batch: Callable[..., List[np.ndarray]],
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS
+    ):
+        self.generate_batch = generate_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-inference")
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: List[SynthesisItem] = []
+        self._task: Optional[asyncio.Task] = None
+        self._batches = 0
+        self._batched_items = 0
+        self._max_seen = 0
+
+    async def start(self):
+        """Start the batching loop on the running event loop"""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop batching and fail anything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for item in self._drain():
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("Synthesis scheduler stopped"))
+        self._executor.shutdown(wait=False)
+
+    async def submit(
+        self,
+        text: str,
+        language: str = "en",
+        voice_id: str = "default",
+        voice: Optional[Dict[str, Any]] = None,
+        emotion: Optional[str] = None
+    ) -> np.ndarray:
+        """Queue one piece of text and wait for its PCM"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(SynthesisItem(text, language, voice_id, voice or {}, emotion, future))
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        """Batching counters for the health endpoint"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self._batches,
+            "avg_batch_size": round(self._batched_items / self._batches, 2) if self._batches else 0.0,
+            "largest_batch": self._max_seen,
+            "queued": len(self._pending) + (self._queue.qsize() if self._queue else 0),
+        }
+
+    def _drain(self) -> List[SynthesisItem]:
+        items, self._pending = self._pending, []
+        while self._queue is not None and not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    async def _collect(self) -> List[SynthesisItem]:
+        """Wait for one request, then gather compatible ones until full or timed out"""
+        if not self._pending:
+            self._pending.append(await self._queue.get())
+
+        deadline = self._pending[0].enqueued_at + self.max_wait
+        while len(self._pending) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                self._pending.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Pick up anything that arrived while the previous batch was generating
+        while not self._queue.empty():
+            self._pending.append(self._queue.get_nowait())
+
+        # Oldest request decides the voice; the rest wait for a later batch
+        key = self._pending[0].options_key
+        batch = [item for item in self._pending if item.options_key == key][:self.max_batch_size]
+        chosen = set(map(id, batch))
+        self._pending = [item for item in self._pending if id(item) not in chosen]
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Requests whose callers went away (client disconnects) are skipped
+            batch = [item for item in batch if not item.future.cancelled()]
+            if not batch:
+                continue
+
+            self._batches += 1
+            self._batched_items += len(batch)
+            self._max_seen = max(self._max_seen, len(batch))
+            first = batch[0]
+            try:
+                results = await loop.run_in_executor(
+                    self._executor,
+                    self.generate_batch,
+                    [item.text for item in batch],
+                    first.language,
+                    first.voice,
+                    first.emotion,
+                )
+            except Exception as e:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+            for item, result in zip(batch, results):
+                if item.future.done():
+                    continue
+                if isinstance(result, Exception):
+                    item.future.set_exception(result)
+                else:
+                    item.future.set_result(result)
@@ -0,0 +1,203 @@
+"""
+Streaming synthesis module
+Synthesizes text chunk by chunk and encodes the audio while it is produced.
+
+The text is split into sentence-sized chunks (text_chunking.py) and the
+chunks are synthesized in order. The model works on the next chunk while
+the current chunk is encoded and sent, and ffmpeg encodes PCM into the
+requested format as it arrives. Sample rate, pitch and speed are applied on
+the way (audio_pipeline.py). The first audio is therefore ready after one
+short chunk, whatever the length of the text. Consecutive chunks are joined
+with a short crossfade so separately generated audio doesn't click at the
+seams.
+
+Raw `pcm` output (16-bit little-endian samples, no header) skips ffmpeg
+entirely unless speed or pitch needs its tempo filter.
+"""
+
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import os
+
+import numpy as np
+
+from audio_pipeline import StreamResampler, resample_stream, tempo_filters
+
+# Configuration
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+STREAM_LOOKAHEAD_CHUNKS = int(os.getenv("STREAM_LOOKAHEAD_CHUNKS", "1"))  # chunks synthesized ahead of the encoder
+CROSSFADE_MS = float(os.getenv("CROSSFADE_MS", "20"))  # overlap between consecutive chunks
+READ_SIZE = 1 << 14
+
+# ffmpeg output options and media type per format
+AUDIO_FORMATS: Dict[str, Tuple[List[str], str]] = {
+    "mp3": (["-c:a", "libmp3lame", "-b:a", "128k", "-f", "mp3"], "audio/mpeg"),
+    "wav": (["-c:a", "pcm_s16le", "-f", "wav"], "audio/wav"),
+    "ogg": (["-c:a", "libvorbis", "-q:a", "4", "-f", "ogg"], "audio/ogg"),
+    "opus": (["-c:a", "libopus", "-b:a", "32k", "-f", "ogg", "-page_duration", "100000"], "audio/ogg"),
+    "pcm": (["-c:a", "pcm_s16le", "-f", "s16le"], "audio/pcm"),
+}
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def to_pcm16(chunk: np.ndarray) -> bytes:
+    """float32 samples as 16-bit little-endian PCM"""
+    return (np.clip(chunk, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+class AudioEncodeError(Exception):
+    """Raised when ffmpeg fails to encode synthesized audio"""
+
+
+def crossfade(tail: np.ndarray, head: np.ndarray) -> np.ndarray:
+    """`tail` followed by `head`, overlapped by up to len(tail) samples with a linear fade"""
+    overlap = min(len(tail), len(head))
+    fade_in = np.linspace(0.0, 1.0, overlap, endpoint=False, dtype=np.float32)
+    mixed = tail[len(tail) - overlap:] * (1.0 - fade_in) + head[:overlap] * fade_in
+    return np.concatenate([tail[:len(tail) - overlap], mixed, head[overlap:]])
+
+
+class ChunkedSynthesis:
+    """
+    PCM for a list of text chunks, in order.
+
+    Iterating yields float32 arrays, about one per chunk; up to `lookahead`
+    chunks are synthesized ahead of the consumer. The last `crossfade`
+    samples of each chunk are held back and overlapped with the start of
+    the next. `samples` counts the samples yielded so far.
+    """
+
+    def __init__(
+        self,
+        synthesize: Callable[[str], Awaitable[np.ndarray]],
+        chunks: List[str],
+        lookahead: int = STREAM_LOOKAHEAD_CHUNKS,
+        crossfade: int = 0
+    ):
+        self.synthesize = synthesize
+        self.chunks = chunks
+        self.lookahead = max(1, lookahead)
+        self.crossfade = max(0, crossfade)
+        self.samples = 0
+
+    async def __aiter__(self) -> AsyncIterator[np.ndarray]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.lookahead)
+
+        async def produce():
+            try:
+                for chunk in self.chunks:
+                    await queue.put(await self.synthesize(chunk))
+                await queue.put(None)
+            except Exception as e:
+                await queue.put(e)
+
+        producer = asyncio.create_task(produce())
+        tail: Optional[np.ndarray] = None
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if self.crossfade:
+                    if tail is not None:
+                        item = crossfade(tail, item)
+                    split = max(0, len(item) - self.crossfade)
+                    item, tail = item[:split], item[split:]
+                if len(item):
+                    self.samples += len(item)
+                    yield item
+            if tail is not None and len(tail):
+                self.samples += len(tail)
+                yield tail
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+
+async def encode_stream(
+    pcm: AsyncIterator[np.ndarray],
+    input_rate: int,
+    format: str = "mp3",
+    sample_rate: Optional[int] = None,
+    speed: float = 1.0,
+    pitch: float = 1.0
+) -> AsyncIterator[bytes]:
+    """Encode float32 PCM chunks to `format` with ffmpeg, yielding bytes as they are encoded"""
+    output_args, _ = AUDIO_FORMATS[format]
+    output_rate = sample_rate or input_rate
+    resampler = StreamResampler(input_rate * pitch, output_rate)
+    if not resampler.passthrough:
+        pcm = resample_stream(pcm, resampler)
+    # atempo sets the speed and restores the length the pitch shift changed
+    filters = tempo_filters(speed / pitch)
+    if format == "pcm" and not filters:
+        chunks = pcm.__aiter__()
+        try:
+            async for chunk in chunks:
+                yield to_pcm16(chunk)
+        finally:
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()
+        return
+    # Synthesize the first chunk before starting ffmpeg, which writes container headers
+    # right away: an error here fails the stream before it has produced any bytes
+    chunks = pcm.__aiter__()
+    try:
+        first: Optional[np.ndarray] = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_BINARY, "-nostdin", "-v", "error",
+        # Raw PCM needs no probing; without this ffmpeg waits for seconds of input before encoding
+        "-probesize", "32", "-analyzeduration", "0",
+        "-f", "f32le", "-ar", str(output_rate), "-ac", "1", "-i", "pipe:0",
+        *(["-af", ",".join(filters)] if filters else []), *output_args,
+        "-flush_packets", "1", "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+    async def write(chunk: np.ndarray):
+        process.stdin.write(np.ascontiguousarray(chunk, dtype=np.float32).data.cast("B"))
+        # Backpressure: don't synthesize further ahead than ffmpeg can take
+        await process.stdin.drain()
+
+    async def feed():
+        try:
+            if first is not None:
+                await write(first)
+                async for chunk in chunks:
+                    await write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg exited; its error is reported below
+        finally:
+            if not process.stdin.is_closing():
+                process.stdin.close()
+            if hasattr(chunks, "aclose"):
+                # Stops synthesis of chunks nobody will hear
+                await chunks.aclose()
+
+    feeder = asyncio.create_task(feed())
+    stderr = asyncio.create_task(process.stderr.read())
+    try:
+        while True:
+            data = await process.stdout.read(READ_SIZE)
+            if not data:
+                break
+            yield data
+        # Synthesis errors surface here rather than as a truncated stream
+        await feeder
+        if await process.wait() != 0:
+            message = (await stderr).decode(errors="replace").strip().splitlines()
+            raise AudioEncodeError(f"Failed to encode audio: {message[-1] if message else process.returncode}")
+    finally:
+        if process.returncode is None:
+            process.kill()
+        feeder.cancel()
+        stderr.cancel()
+        await asyncio.gather(feeder, stderr, return_exceptions=True)
+        await process.wait()
@@ -0,0 +1,92 @@
+"""
+Text chunking module
+Splits synthesis input into sentence-sized chunks.
+
+Text is split at sentence ends (including CJK punctuation); sentences longer
+than a chunk are split at clause breaks, then at spaces. The first chunk is
+kept short so the first audio is ready quickly; later chunks merge short
+sentences up to STREAM_MAX_CHUNK_CHARS, which keeps prosody natural and the
+number of model calls low.
+
+With the sentence cache enabled every sentence is synthesized on its own
+(`sentence_chunks`), so its audio can be reused by any later text that
+contains the same sentence.
+"""
+
+from typing import List
+import os
+import re
+
+# Configuration
+FIRST_CHUNK_CHARS = int(os.getenv("STREAM_FIRST_CHUNK_CHARS", "120"))
+MAX_CHUNK_CHARS = int(os.getenv("STREAM_MAX_CHUNK_CHARS", "300"))
+
+# A sentence ends after terminal punctuation (and any closing quotes/brackets) followed by
+# whitespace; CJK full-width terminators need no space after them
+SENTENCE_END = re.compile(r"(?<=[.!?…])[\"'”’)\]]*\s+|(?<=[。！？])")
+CLAUSE_BREAK = re.compile(r"(?<=[,;:，、；：—])\s*")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of `text`, whitespace-trimmed, in order"""
+    text = re.sub(r"\s+", " ", text).strip()
+    return [sentence.strip() for sentence in SENTENCE_END.split(text) if sentence and sentence.strip()]
+
+
+def split_long(sentence: str, limit: int) -> List[str]:
+    """Split a sentence into pieces of at most `limit` characters at clause breaks or spaces"""
+    if len(sentence) <= limit:
+        return [sentence]
+    pieces: List[str] = []
+    for part in (p.strip() for p in CLAUSE_BREAK.split(sentence)):
+        if not part:
+            continue
+        if pieces and len(pieces[-1]) + 1 + len(part) <= limit:
+            pieces[-1] += " " + part
+        elif len(part) <= limit:
+            pieces.append(part)
+        else:
+            # No punctuation to break at: fall back to word boundaries, then a hard cut
+            words = part.split(" ")
+            current = ""
+            for word in words:
+                while len(word) > limit:
+                    if current:
+                        pieces.append(current)
+                        current = ""
+                    pieces.append(word[:limit])
+                    word = word[limit:]
+                if current and len(current) + 1 + len(word) > limit:
+                    pieces.append(current)
+                    current = word
+                else:
+                    current = f"{current} {word}" if current else word
+            if current:
+                pieces.append(current)
+    return pieces
+
+
+def sentence_chunks(text: str, max_chars: int = MAX_CHUNK_CHARS) -> List[str]:
+    """One chunk per sentence (long sentences split); the same sentence always gives the same chunks"""
+    return [piece for sentence in split_sentences(text) for piece in split_long(sentence, max_chars)]
+
+
+def chunk_text(text: str, first_chars: int = FIRST_CHUNK_CHARS, max_chars: int = MAX_CHUNK_CHARS) -> List[str]:
+    """Chunks to synthesize one after another: a short first chunk, then merged sentences"""
+    sentences = split_sentences(text)
+    if not sentences:
+        return []
+
+    head = split_long(sentences[0], first_chars)
+    chunks = head[:1]
+    pieces = head[1:] + [piece for sentence in sentences[1:] for piece in split_long(sentence, max_chars)]
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,305 @@
+"""
+TTS engine module
+Loads the Chatterbox model and synthesizes text to PCM.
+
+The multilingual model (chatterbox.mtl_tts) is used when it is installed,
+otherwise the English-only model; an engine can also be fixed to one of
+them (model_manager.py runs one engine per loaded model). Generation runs on a worker thread and
+returns mono float32 samples at the model's sample rate; the model is not
+safe to call from several threads at once, so calls are serialized.
+`generate_batch` synthesizes several same-voice texts in one forward pass
+when the installed model supports batched generation.
+
+A cloned voice's conditionals (speaker embedding, prompt tokens and
+features from its reference clip) are computed once per voice version and
+kept in the shared embedding store (voice_embeddings.py); generation swaps
+them onto the model instead of re-encoding the clip for every call.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+import asyncio
+import gc
+import hashlib
+import importlib
+import itertools
+import os
+import threading
+
+import numpy as np
+
+from voice_embeddings import EmbeddingStore
+
+# Configuration
+MODEL_PATH = os.getenv("MODEL_PATH", "/models/chatterbox")
+DEVICE = os.getenv("DEVICE", "")  # cuda, cpu or mps; default: cuda when available
+CFG_WEIGHT = float(os.getenv("CFG_WEIGHT", "0.5"))  # classifier-free guidance: lower = slower, more deliberate
+VOICE_CONDITIONALS_CACHE = int(os.getenv("VOICE_CONDITIONALS_CACHE", "16"))  # voices kept on the device
+
+# Chatterbox controls emotion through one "exaggeration" dial (0.25-2.0, 0.5 = neutral)
+EMOTION_EXAGGERATION = {
+    "neutral": 0.5,
+    "calm": 0.35,
+    "sad": 0.4,
+    "happy": 0.65,
+    "excited": 0.85,
+    "angry": 0.9,
+}
+
+
+def default_device() -> str:
+    if DEVICE:
+        return DEVICE
+    try:
+        import torch
+
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except ImportError:
+        return "cpu"
+
+
+class TTSEngine:
+    """The Chatterbox model behind a blocking `generate()` and an async `synthesize()`"""
+
+    def __init__(
+        self,
+        model_path: str = MODEL_PATH,
+        device: Optional[str] = None,
+        embeddings: Optional[EmbeddingStore] = None,
+        variant: str = "auto"
+    ):
+        self.model_path = model_path
+        self.device = device or default_device()
+        self.embeddings = embeddings
+        self.variant = variant  # auto, multilingual or english
+        self.model = None
+        self.multilingual = False
+        self._model_class = None
+        self.sample_rate = 24000
+        self._lock = threading.Lock()
+        self._default_conditionals = None
+        self._conditionals: "OrderedDict[str, Any]" = OrderedDict()  # voice key -> conditionals on the device
+        self.voices_prepared = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    @property
+    def model_version(self) -> str:
+        """Identifies the weights and generation settings, for keying cached audio"""
+        kind = "mtl" if self.multilingual else "en"
+        source = self.model_path if os.path.isdir(self.model_path) else "pretrained"
+        return f"chatterbox-{kind}:{source}:cfg={CFG_WEIGHT}"
+
+    def resolve(self) -> bool:
+        """Import the model class for this engine's variant (blocking); False if Chatterbox is not installed"""
+        if self._model_class is not None:
+            return True
+        if self.variant in ("auto", "multilingual"):
+            try:
+                from chatterbox.mtl_tts import ChatterboxMultilingualTTS
+                self._model_class, self.multilingual = ChatterboxMultilingualTTS, True
+                return True
+            except ImportError:
+                if self.variant == "multilingual":
+                    return False
+        try:
+            from chatterbox.tts import ChatterboxTTS
+            self._model_class = ChatterboxTTS
+            return True
+        except ImportError:
+            return False
+
+    def load(self) -> bool:
+        """Load the model (blocking); False if Chatterbox is not installed"""
+        if not self.resolve():
+            return False
+
+        # Local weights when MODEL_PATH holds them, otherwise the published checkpoint
+        if os.path.isdir(self.model_path) and os.listdir(self.model_path):
+            model = self._model_class.from_local(self.model_path, self.device)
+        else:
+            model = self._model_class.from_pretrained(device=self.device)
+        with self._lock:
+            self.model = model
+            self.sample_rate = model.sr
+            # The bundled voice, restored for voices without a reference clip
+            self._default_conditionals = model.conds
+            self._conditionals.clear()
+        return True
+
+    def unload(self):
+        """Release the model (blocking; waits for a running generation)"""
+        with self._lock:
+            self.model = None
+            self._default_conditionals = None
+            self._conditionals.clear()
+        gc.collect()
+        if self.device.startswith("cuda"):
+            import torch
+
+            torch.cuda.empty_cache()
+
+    def memory_bytes(self) -> int:
+        """Size of the loaded model's parameters and buffers"""
+        if self.model is None:
+            return 0
+        import torch
+
+        seen = set()
+        total = 0
+        for module in vars(self.model).values():
+            if not isinstance(module, torch.nn.Module):
+                continue
+            for tensor in itertools.chain(module.parameters(), module.buffers()):
+                if tensor.data_ptr() not in seen:
+                    seen.add(tensor.data_ptr())
+                    total += tensor.numel() * tensor.element_size()
+        return total
+
+    def voice_key(self, voice: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Embedding store key for a cloned voice's current version (None for the bundled voice)"""
+        if not voice or not voice.get("audio_prompt_path"):
+            return None
+        basis = f"{self.model_version}|{voice['id']}|{voice.get('version', '')}|{voice['audio_prompt_path']}"
+        return hashlib.sha256(basis.encode()).hexdigest()[:32]
+
+    def prepare_voice(self, voice: Dict[str, Any]) -> bool:
+        """Compute and store a voice's conditionals ahead of its first request (blocking); True if computed now"""
+        key = self.voice_key(voice)
+        if key is None or not self.loaded:
+            return False
+        if key in self._conditionals or (self.embeddings and self.embeddings.get(key)):
+            return False
+        with self._lock:
+            self._use_voice(voice)
+        return True
+
+    def compact_voices(self, voices: List[Dict[str, Any]]):
+        """Drop stored conditionals of voices (and versions) no longer in the library"""
+        if self.embeddings:
+            self.embeddings.compact(key for key in map(self.voice_key, voices) if key)
+
+    def _use_voice(self, voice: Optional[Dict[str, Any]]):
+        """Put the voice's conditionals on the model; call with the lock held"""
+        key = self.voice_key(voice)
+        if key is None:
+            self.model.conds = self._default_conditionals
+            return
+
+        conditionals = self._conditionals.get(key)
+        if conditionals is None:
+            stored = self.embeddings.get(key) if self.embeddings else None
+            if stored is not None:
+                conditionals = self._restore_conditionals(*stored)
+            else:
+                self.model.prepare_conditionals(voice["audio_prompt_path"], exaggeration=0.5)
+                conditionals = self.model.conds
+                self.voices_prepared += 1
+                if self.embeddings:
+                    self.embeddings.put(key, *self._flatten_conditionals(conditionals))
+            self._conditionals[key] = conditionals
+            while len(self._conditionals) > VOICE_CONDITIONALS_CACHE:
+                self._conditionals.popitem(last=False)
+        self._conditionals.move_to_end(key)
+        self.model.conds = conditionals
+
+    @staticmethod
+    def _flatten_conditionals(conditionals) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """Arrays and plain values of a Chatterbox Conditionals (the fields its save() writes)"""
+        import torch
+
+        arrays: Dict[str, np.ndarray] = {}
+        values: Dict[str, Any] = {}
+        for group, fields in (("t3", vars(conditionals.t3)), ("gen", conditionals.gen)):
+            for name, value in fields.items():
+                if isinstance(value, torch.Tensor):
+                    tensor = value.detach().cpu()
+                    arrays[f"{group}.{name}"] = (tensor.float() if tensor.dtype == torch.bfloat16 else tensor).numpy()
+                else:
+                    values[f"{group}.{name}"] = value
+        return arrays, values
+
+    def _restore_conditionals(self, arrays: Dict[str, np.ndarray], values: Dict[str, Any]):
+        """Rebuild Conditionals on the device from stored arrays"""
+        import torch
+        from chatterbox.models.t3.modules.cond_enc import T3Cond
+
+        fields: Dict[str, Dict[str, Any]] = {"t3": {}, "gen": {}}
+        for name, value in values.items():
+            group, field = name.split(".", 1)
+            fields[group][field] = value
+        for name, array in arrays.items():
+            group, field = name.split(".", 1)
+            # Copied out of the read-only mapping on the way to the device
+            fields[group][field] = torch.from_numpy(np.array(array))
+        conditionals_class = importlib.import_module(type(self.model).__module__).Conditionals
+        return conditionals_class(T3Cond(**fields["t3"]), fields["gen"]).to(self.device)
+
+    def _options(self, language: str, emotion: Optional[str]) -> Dict[str, Any]:
+        options = {
+            "exaggeration": EMOTION_EXAGGERATION.get(emotion or "neutral", 0.5),
+            "cfg_weight": CFG_WEIGHT,
+        }
+        if self.multilingual:
+            options["language_id"] = language
+        return options
+
+    @staticmethod
+    def _to_pcm(wav) -> np.ndarray:
+        return wav.squeeze(0).detach().cpu().numpy().astype(np.float32, copy=False)
+
+    def generate(
+        self,
+        text: str,
+        language: str = "en",
+        voice: Optional[Dict[str, Any]] = None,
+        emotion: Optional[str] = None
+    ) -> np.ndarray:
+        """Synthesize one piece of text (blocking)"""
+        options = self._options(language, emotion)
+        with self._lock:
+            self._use_voice(voice)
+            wav = self.model.generate(text, **options)
+        return self._to_pcm(wav)
+
+    def generate_batch(
+        self,
+        texts: List[str],
+        language: str = "en",
+        voice: Optional[Dict[str, Any]] = None,
+        emotion: Optional[str] = None
+    ) -> List[Union[np.ndarray, Exception]]:
+        """
+        Synthesize several texts with the same voice (blocking).
+
+        Uses the model's batched generation when it has one, otherwise
+        generates the texts one after another. A text that fails on its own
+        yields its exception in place of PCM, so one bad text doesn't fail
+        the others.
+        """
+        if len(texts) > 1 and hasattr(self.model, "generate_batch"):
+            options = self._options(language, emotion)
+            with self._lock:
+                self._use_voice(voice)
+                wavs = self.model.generate_batch(texts, **options)
+            return [self._to_pcm(wav) for wav in wavs]
+
+        results: List[Union[np.ndarray, Exception]] = []
+        for text in texts:
+            try:
+                results.append(self.generate(text, language, voice, emotion))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def synthesize(
+        self,
+        text: str,
+        language: str = "en",
+        voice: Optional[Dict[str, Any]] = None,
+        emotion: Optional[str] = None
+    ) -> np.ndarray:
+        # Run in thread pool to avoid blocking
+        return await asyncio.to_thread(self.generate, text, language, voice, emotion)
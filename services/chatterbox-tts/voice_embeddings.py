@@ -0,0 +1,166 @@
+"""
+Voice embeddings module
+Speaker and conditioning embeddings per voice, in one memory-mapped file.
+
+Conditioning the model on a cloned voice (encoding the reference clip into
+a speaker embedding and prompt tokens) costs more than synthesizing a short
+sentence. It is done once per voice version; the resulting arrays are
+appended to a data file in VOICE_EMBEDDINGS_DIR and listed in a JSON index
+(embeddings.json) that also names the current data file. Every worker process maps the file read-only, so the arrays
+live once in the page cache, survive restarts and are never recomputed by
+another worker. Appends are serialized across processes with a file lock,
+and superseded versions are dropped by `compact()`.
+"""
+
+from typing import Any, Dict, Iterable, Optional, Tuple
+import fcntl
+import json
+import os
+import threading
+
+import numpy as np
+
+# Configuration
+VOICE_EMBEDDINGS_DIR = os.getenv("VOICE_EMBEDDINGS_DIR", "/tmp/tts-voice-embeddings")
+
+ALIGNMENT = 64  # arrays start on cache-line boundaries
+
+
+class EmbeddingStore:
+    """
+    Named groups of arrays, appended to one data file and read through a shared mmap.
+
+    `get(key)` returns read-only views into the mapping plus the metadata
+    stored with them. Other processes' appends are picked up when the index
+    file changes.
+    """
+
+    def __init__(self, directory: str = VOICE_EMBEDDINGS_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "embeddings.json")
+        self.lock_path = os.path.join(directory, "embeddings.lock")
+        self._lock = threading.Lock()
+        self._data_file = "embeddings.0.bin"
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._index_stamp: Optional[Tuple[int, int, int]] = None
+        self._map: Optional[np.memmap] = None
+        self._map_stamp: Optional[Tuple[str, int]] = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def data_path(self) -> str:
+        return os.path.join(self.directory, self._data_file)
+
+    def _refresh(self):
+        """Reload the index (and remap the data) if another process changed them"""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            self._index, self._index_stamp = {}, None
+            return
+        stamp = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+        if stamp == self._index_stamp:
+            return
+        with open(self.index_path) as f:
+            index = json.load(f)
+        self._data_file, self._index = index["data"], index["entries"]
+        self._index_stamp = stamp
+        try:
+            size = os.path.getsize(self.data_path)
+        except FileNotFoundError:
+            # Compacted away between reading the index and opening the file: the index is new again
+            self._index_stamp = None
+            return self._refresh()
+        if (self._data_file, size) != self._map_stamp:
+            self._map = np.memmap(self.data_path, dtype=np.uint8, mode="r") if size else None
+            self._map_stamp = (self._data_file, size)
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+        with self._lock:
+            self._refresh()
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            arrays = {}
+            for name, (offset, dtype, shape) in entry["arrays"].items():
+                dtype = np.dtype(dtype)
+                count = int(np.prod(shape, dtype=np.int64))
+                arrays[name] = self._map[offset:offset + count * dtype.itemsize].view(dtype).reshape(shape)
+            return arrays, entry["meta"]
+
+    def put(self, key: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+        """Append arrays under `key` (a no-op if another process already stored it)"""
+        with self._lock, open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._index_stamp = None
+            self._refresh()
+            if key in self._index:
+                return
+            entry = {"arrays": {}, "meta": meta}
+            with open(self.data_path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                for name, array in arrays.items():
+                    array = np.ascontiguousarray(array)
+                    padding = -offset % ALIGNMENT
+                    f.write(b"\0" * padding)
+                    offset += padding
+                    f.write(array.data.cast("B"))
+                    entry["arrays"][name] = [offset, array.dtype.str, list(array.shape)]
+                    offset += array.nbytes
+            self._index[key] = entry
+            self._write_index(self._data_file, self._index)
+            self._index_stamp = None
+
+    def compact(self, keep: Iterable[str]):
+        """Rewrite the file with only the `keep` keys, if that frees at least half of it"""
+        keep = set(keep)
+        with self._lock, open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._index_stamp = None
+            self._refresh()
+            if self._map is None:
+                return
+            live = {key: entry for key, entry in self._index.items() if key in keep}
+            live_bytes = sum(
+                int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+                for entry in live.values() for _, dtype, shape in entry["arrays"].values()
+            )
+            if live_bytes * 2 > len(self._map):
+                return
+
+            # A new file under a new name: readers keep using the old one until they read the new index
+            old_path = self.data_path
+            generation = int(self._data_file.split(".")[1]) + 1
+            data_file = f"embeddings.{generation}.bin"
+            index = {}
+            with open(os.path.join(self.directory, data_file), "wb") as f:
+                offset = 0
+                for key, entry in live.items():
+                    moved = {"arrays": {}, "meta": entry["meta"]}
+                    for name, (old_offset, dtype, shape) in entry["arrays"].items():
+                        nbytes = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+                        padding = -offset % ALIGNMENT
+                        f.write(b"\0" * padding)
+                        offset += padding
+                        f.write(self._map[old_offset:old_offset + nbytes].data)
+                        moved["arrays"][name] = [offset, dtype, shape]
+                        offset += nbytes
+                    index[key] = moved
+            self._write_index(data_file, index)
+            self._index_stamp = None
+            # Existing mappings of the old file stay valid after the unlink
+            os.unlink(old_path)
+
+    def _write_index(self, data_file: str, entries: Dict[str, Any]):
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"data": data_file, "entries": entries}, f)
+        os.replace(temp_path, self.index_path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return {
+                "voices": len(self._index),
+                "bytes": len(self._map) if self._map is not None else 0,
+            }
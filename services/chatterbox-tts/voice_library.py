@@ -0,0 +1,248 @@
+"""
+Voice library module
+Voices from the `voice_library` table, kept current by change notifications.
+
+All rows are loaded into an in-memory catalog indexed by ID and by language,
+and a dedicated connection LISTENs on `voice_library_changed` (see
+database/migrations/003_voice_library_notify.sql) to apply each insert,
+update and delete as it happens. When the connection drops the listener
+reconnects and reloads everything, so missed notifications can't leave the
+catalog stale.
+
+Reference clips (`voice_sample_url`) are downloaded once to VOICE_SAMPLE_DIR
+before a voice is published in the catalog; `on_change` is then called with
+the changed voices so their embeddings can be precomputed.
+
+Without VOICE_DATABASE_URL (or asyncpg) the built-in voices are served.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+import asyncio
+import hashlib
+import json
+import os
+import uuid
+
+import httpx
+
+# Try to import asyncpg - the built-in voices are used if it is not installed
+try:
+    import asyncpg
+    ASYNCPG_AVAILABLE = True
+except ImportError:
+    ASYNCPG_AVAILABLE = False
+
+# Configuration
+VOICE_DATABASE_URL = os.getenv("VOICE_DATABASE_URL", os.getenv("DATABASE_URL", ""))
+VOICE_SAMPLE_DIR = os.getenv("VOICE_SAMPLE_DIR", "/tmp/tts-voice-samples")
+VOICE_RECONNECT_SECONDS = float(os.getenv("VOICE_RECONNECT_SECONDS", "5"))
+VOICE_DOWNLOAD_CONCURRENCY = 4
+
+NOTIFY_CHANNEL = "voice_library_changed"
+
+BUILTIN_VOICES: List[Dict[str, Any]] = [
+    {
+        "id": "default",
+        "name": "Default English",
+        "language": "en",
+        "gender": "neutral",
+        "emotion_profile": {
+            "neutral": 1.0,
+            "happy": 0.8,
+            "calm": 0.9
+        },
+        "is_default": True,
+        "version": "builtin",
+    }
+]
+
+
+class VoiceCatalog:
+    """Voices by ID, plus per-language lists (default voice first, then by name) rebuilt on every change"""
+
+    def __init__(self, voices: Iterable[Dict[str, Any]] = ()):
+        self._voices: Dict[str, Dict[str, Any]] = {}
+        self._by_language: Dict[str, List[Dict[str, Any]]] = {}
+        self._all: List[Dict[str, Any]] = []
+        self.default_id = "default"
+        self.replace(voices)
+
+    def replace(self, voices: Iterable[Dict[str, Any]]):
+        self._voices = {voice["id"]: voice for voice in voices}
+        self._reindex()
+
+    def upsert(self, voice: Dict[str, Any]):
+        self._voices[voice["id"]] = voice
+        self._reindex()
+
+    def remove(self, voice_id: str):
+        if self._voices.pop(voice_id, None) is not None:
+            self._reindex()
+
+    def _reindex(self):
+        ordered = sorted(self._voices.values(), key=lambda voice: (not voice.get("is_default"), voice["name"]))
+        by_language: Dict[str, List[Dict[str, Any]]] = {}
+        for voice in ordered:
+            by_language.setdefault(voice["language"], []).append(voice)
+        # Swapped in whole so readers never see a half-built index
+        self._all, self._by_language = ordered, by_language
+        self.default_id = ordered[0]["id"] if ordered and ordered[0].get("is_default") else "default"
+
+    def get(self, voice_id: str) -> Optional[Dict[str, Any]]:
+        return self._voices.get(voice_id)
+
+    def list(self, language: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self._all if language is None else self._by_language.get(language, [])
+
+    def languages(self) -> List[str]:
+        return sorted(self._by_language)
+
+    def __len__(self) -> int:
+        return len(self._voices)
+
+    def __iter__(self):
+        return iter(self._all)
+
+
+def voice_from_row(row) -> Dict[str, Any]:
+    """Catalog entry for a `voice_library` row"""
+    emotion_profile = row["emotion_profile"] or {}
+    if isinstance(emotion_profile, str):
+        emotion_profile = json.loads(emotion_profile)
+    changed = row.get("updated_at") or row.get("created_at")
+    return {
+        "id": str(row["id"]),
+        "name": row["name"],
+        "language": row["language"],
+        "gender": row.get("gender"),
+        "emotion_profile": emotion_profile,
+        "sample_url": row.get("voice_sample_url"),
+        "is_default": bool(row.get("is_default")),
+        # Changes whenever the row is edited; versions the voice's embeddings
+        "version": changed.isoformat() if changed else "",
+    }
+
+
+class VoiceLibrary:
+    """The voice catalog, loaded from the database and updated from its notifications"""
+
+    def __init__(
+        self,
+        database_url: str = VOICE_DATABASE_URL,
+        sample_dir: str = VOICE_SAMPLE_DIR,
+        on_change: Optional[Callable[[List[Dict[str, Any]], bool], Awaitable[None]]] = None
+    ):
+        self.database_url = database_url
+        self.sample_dir = sample_dir
+        self.on_change = on_change
+        self.catalog = VoiceCatalog(BUILTIN_VOICES)
+        self.connected = False
+        self.notifications = 0
+        self._task: Optional[asyncio.Task] = None
+        self._downloads = asyncio.Semaphore(VOICE_DOWNLOAD_CONCURRENCY)
+
+    async def start(self):
+        if not self.database_url:
+            print("Voice library: no VOICE_DATABASE_URL, serving built-in voices")
+            return
+        if not ASYNCPG_AVAILABLE:
+            print("Warning: asyncpg not installed, serving built-in voices. Install with: pip install asyncpg")
+            return
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _listen(self):
+        while True:
+            try:
+                connection = await asyncpg.connect(self.database_url)
+                try:
+                    changes: asyncio.Queue = asyncio.Queue()
+                    connection.add_termination_listener(lambda _: changes.put_nowait(None))
+                    # Listen before loading so a change made in between isn't missed
+                    await connection.add_listener(NOTIFY_CHANNEL, lambda *args: changes.put_nowait(args[-1]))
+                    rows = await connection.fetch("SELECT * FROM voice_library")
+                    await self._replace([voice_from_row(row) for row in rows])
+                    self.connected = True
+                    print(f"Voice library loaded: {len(self.catalog)} voices")
+
+                    while (payload := await changes.get()) is not None:
+                        self.notifications += 1
+                        await self._apply(connection, payload)
+                finally:
+                    self.connected = False
+                    if not connection.is_closed():
+                        await connection.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Voice library connection failed: {e}")
+            await asyncio.sleep(VOICE_RECONNECT_SECONDS)
+
+    async def _apply(self, connection, payload: str):
+        """Apply one change notification"""
+        try:
+            change = json.loads(payload)
+            voice_id = str(change["id"])
+            row = None
+            if change.get("op") != "DELETE":
+                row = await connection.fetchrow("SELECT * FROM voice_library WHERE id = $1", uuid.UUID(voice_id))
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring malformed voice library notification {payload!r}: {e}")
+            return
+
+        if row is None:
+            self.catalog.remove(voice_id)
+            return
+        voice = voice_from_row(row)
+        await self._fetch_sample(voice)
+        self.catalog.upsert(voice)
+        if self.on_change:
+            await self.on_change([voice], False)
+
+    async def _replace(self, voices: List[Dict[str, Any]]):
+        await asyncio.gather(*(self._fetch_sample(voice) for voice in voices))
+        self.catalog.replace(voices or BUILTIN_VOICES)
+        if self.on_change:
+            await self.on_change(list(self.catalog), True)
+
+    async def _fetch_sample(self, voice: Dict[str, Any]):
+        """Download the voice's reference clip (once) and record its local path"""
+        url = voice.get("sample_url")
+        if not url:
+            return
+        if "://" not in url:
+            voice["audio_prompt_path"] = url
+            return
+
+        extension = os.path.splitext(url.split("?")[0])[1] or ".wav"
+        path = os.path.join(self.sample_dir, f"{voice['id']}-{hashlib.sha256(url.encode()).hexdigest()[:16]}{extension}")
+        if not os.path.exists(path):
+            os.makedirs(self.sample_dir, exist_ok=True)
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                async with self._downloads, httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
+                    async with client.stream("GET", url) as response:
+                        response.raise_for_status()
+                        with open(temp_path, "wb") as f:
+                            async for data in response.aiter_bytes():
+                                f.write(data)
+                os.replace(temp_path, path)
+            except Exception as e:
+                print(f"Error downloading sample for voice {voice['id']}: {e}")
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                return
+        voice["audio_prompt_path"] = path
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "source": "database" if self._task is not None else "builtin",
+            "connected": self.connected,
+            "voices": len(self.catalog),
+            "languages": self.catalog.languages(),
+            "notifications": self.notifications,
+        }
@@ -4,7 +4,7 @@ FastAPI wrapper around ComfyUI for video generation workflows
 Integrates with HunyuanVideo and ComfyGPT
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
@@ -15,8 +15,13 @@ import uuid
 from datetime import datetime
 import json
 
+from tracing import setup_tracing
+
 app = FastAPI(title="Kolony ComfyUI API", version="1.0.0")
 
+# Distributed tracing (W3C traceparent in and out)
+setup_tracing(app, "comfyui-api")
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -296,6 +301,9 @@ async def get_queue_status():
 async def cancel_workflow(prompt_id: str):
     """
     Cancel a running or pending workflow
+    
+    Pending prompts are removed from the queue; a running prompt is
+    interrupted so its GPU is released immediately.
     """
     if not comfyui_connected:
         raise HTTPException(
@@ -304,20 +312,40 @@ async def cancel_workflow(prompt_id: str):
         )
     
     try:
+        # Removing a prompt that is not pending is a no-op, so this is always safe
         response = await http_client.post(
             f"{COMFYUI_URL}/queue",
             json={
                 "delete": [prompt_id]
             }
         )
+        action = "cancelled"
+        
+        # Re-read the queue after the delete: the prompt may have started in the meantime
+        queue_response = await http_client.get(f"{COMFYUI_URL}/queue")
+        queue_data = queue_response.json()
+        running = [job[1] for job in queue_data.get("queue_running", [])]
+        
+        if response.status_code == 200 and prompt_id in running:
+            # With prompt_id ComfyUI only interrupts if that prompt is still the one executing,
+            # so a prompt that finished since the queue read doesn't take the next one down
+            response = await http_client.post(
+                f"{COMFYUI_URL}/interrupt",
+                json={
+                    "prompt_id": prompt_id
+                }
+            )
+            action = "interrupted"
         
         if response.status_code == 200:
-            return {"message": f"Workflow {prompt_id} cancelled successfully"}
+            return {"message": f"Workflow {prompt_id} {action} successfully", "action": action}
         else:
             raise HTTPException(
                 status_code=response.status_code,
                 detail=f"Failed to cancel workflow: {response.text}"
             )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -367,9 +395,9 @@ async def get_available_models():
 # Generate workflow from ComfyGPT endpoint
 @app.post("/api/workflow/generate")
 async def generate_workflow_from_comfygpt(
-    prompt: str = Field(..., description="Text description for video generation"),
-    template_id: Optional[str] = Field(None, description="Workflow template ID"),
-    parameters: Optional[Dict[str, Any]] = Field(default={}, description="Additional parameters")
+    prompt: str = Query(..., description="Text description for video generation"),
+    template_id: Optional[str] = Query(None, description="Workflow template ID"),
+    parameters: Optional[Dict[str, Any]] = Body(default={}, description="Additional parameters")
 ):
     """
     Generate a ComfyUI workflow using ComfyGPT based on text prompt
@@ -388,11 +416,11 @@ async def generate_workflow_from_comfygpt(
 # HunyuanVideo specific endpoint
 @app.post("/api/video/generate")
 async def generate_video_hunyuan(
-    prompt: str = Field(..., description="Text prompt for video generation"),
-    duration: int = Field(default=5, ge=1, le=10, description="Video duration in seconds"),
-    resolution: str = Field(default="512x512", description="Video resolution"),
-    style: Optional[str] = Field(None, description="Video style"),
-    extra_params: Optional[Dict[str, Any]] = Field(default={})
+    prompt: str = Query(..., description="Text prompt for video generation"),
+    duration: int = Query(default=5, ge=1, le=10, description="Video duration in seconds"),
+    resolution: str = Query(default="512x512", description="Video resolution"),
+    style: Optional[str] = Query(None, description="Video style"),
+    extra_params: Optional[Dict[str, Any]] = Body(default={})
 ):
     """
     Generate video using HunyuanVideo model via ComfyUI
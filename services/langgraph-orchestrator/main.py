@@ -13,6 +13,8 @@ import asyncio
 from datetime import datetime
 import json
 
+from tracing import setup_tracing
+
 # Try to import LangGraph - will need to be installed
 try:
     from langgraph.graph import StateGraph, END
@@ -33,6 +35,9 @@ except ImportError:
 
 app = FastAPI(title="Kolony LangGraph Orchestrator", version="1.0.0")
 
+# Distributed tracing (W3C traceparent in and out)
+setup_tracing(app, "langgraph-orchestrator")
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -8,36 +8,80 @@ import asyncio
 from typing import Dict, Any, Optional, List
 import os
 
+from metrics import record_cache_lookup, track_downstream
+
 # Service URLs
 WHISPER_API_URL = os.getenv("WHISPER_API_URL", "http://whisper-api:8000")
 CHATTERBOX_API_URL = os.getenv("CHATTERBOX_API_URL", "http://chatterbox-tts:8000")
 COMFYUI_API_URL = os.getenv("COMFYUI_API_URL", "http://comfyui:8000")
 LANGGRAPH_API_URL = os.getenv("LANGGRAPH_API_URL", "http://langgraph-orchestrator:8000")
 
+# Whisper jobs are polled until done instead of holding one request open
+WHISPER_POLL_INTERVAL = float(os.getenv("WHISPER_POLL_INTERVAL", "2"))
+WHISPER_POLL_TIMEOUT = float(os.getenv("WHISPER_POLL_TIMEOUT", "3600"))
+
 # HTTP client with longer timeout for video generation
+# (created after main.setup_tracing so requests carry the W3C traceparent header)
 http_client = httpx.AsyncClient(timeout=600.0)
 
 
 async def transcribe_audio(audio_file_path: str, language: Optional[str] = None) -> Dict[str, Any]:
-    """Transcribe audio using Whisper API"""
+    """
+    Transcribe audio using Whisper API
+    
+    Submitted as a Whisper job and polled, so long recordings don't hold a
+    request open for the whole inference (or hit proxy/client timeouts).
+    """
+    job_id = None
     try:
         with open(audio_file_path, "rb") as f:
             files = {"file": f}
-            data = {
-                "language": language or "",
-                "response_format": "json"
-            }
-            response = await http_client.post(
-                f"{WHISPER_API_URL}/transcribe",
-                files=files,
-                data=data
-            )
+            data = {"language": language or ""}
+            with track_downstream("whisper", "submit"):
+                response = await http_client.post(
+                    f"{WHISPER_API_URL}/jobs",
+                    files=files,
+                    data=data,
+                    timeout=60.0
+                )
+                response.raise_for_status()
+        job_id = response.json()["job_id"]
+        
+        deadline = asyncio.get_running_loop().time() + WHISPER_POLL_TIMEOUT
+        while True:
+            await asyncio.sleep(WHISPER_POLL_INTERVAL)
+            with track_downstream("whisper", "status"):
+                response = await http_client.get(f"{WHISPER_API_URL}/jobs/{job_id}", timeout=10.0)
+                response.raise_for_status()
+            status = response.json()
+            if status["status"] == "completed":
+                break
+            if status["status"] in ("failed", "cancelled"):
+                raise Exception(status.get("error") or f"job {status['status']}")
+            if asyncio.get_running_loop().time() > deadline:
+                raise Exception(f"job {job_id} did not finish within {WHISPER_POLL_TIMEOUT:.0f}s")
+        
+        with track_downstream("whisper", "result"):
+            response = await http_client.get(f"{WHISPER_API_URL}/jobs/{job_id}/result", timeout=30.0)
             response.raise_for_status()
-            return response.json()
+        return response.json()
+    except asyncio.CancelledError:
+        # Pipeline job cancelled: drop the Whisper job if it hasn't started
+        if job_id is not None:
+            await asyncio.shield(cancel_transcription(job_id))
+        raise
     except Exception as e:
         raise Exception(f"Whisper transcription failed: {str(e)}")
 
 
+async def cancel_transcription(job_id: str) -> None:
+    """Best-effort cancel of a queued Whisper job"""
+    try:
+        await http_client.delete(f"{WHISPER_API_URL}/jobs/{job_id}", timeout=10.0)
+    except Exception:
+        pass
+
+
 async def synthesize_speech(
     text: str,
     voice_id: str = "default",
@@ -47,19 +91,24 @@ async def synthesize_speech(
 ) -> Dict[str, Any]:
     """Synthesize speech using Chatterbox TTS"""
     try:
-        response = await http_client.post(
-            f"{CHATTERBOX_API_URL}/synthesize",
-            json={
-                "text": text,
-                "voice_id": voice_id,
-                "language": language,
-                "emotion": emotion,
-                "speed": speed,
-                "format": "mp3"
-            }
-        )
-        response.raise_for_status()
-        return response.json()
+        with track_downstream("chatterbox", "synthesize"):
+            response = await http_client.post(
+                f"{CHATTERBOX_API_URL}/synthesize",
+                json={
+                    "text": text,
+                    "voice_id": voice_id,
+                    "language": language,
+                    "emotion": emotion,
+                    "speed": speed,
+                    "format": "mp3"
+                }
+            )
+            response.raise_for_status()
+        result = response.json()
+        # Chatterbox reports whether the audio came from its content-hash cache
+        if "cached" in result:
+            record_cache_lookup("tts", bool(result["cached"]))
+        return result
     except Exception as e:
         raise Exception(f"TTS synthesis failed: {str(e)}")
 
@@ -72,16 +121,17 @@ async def plan_scenes(
 ) -> Dict[str, Any]:
     """Plan scenes using LangGraph orchestrator"""
     try:
-        response = await http_client.post(
-            f"{LANGGRAPH_API_URL}/api/plan/scenes",
-            json={
-                "script": script,
-                "duration_seconds": duration_seconds,
-                "style_preferences": style_preferences or {},
-                "brand_guidelines": brand_guidelines or {}
-            }
-        )
-        response.raise_for_status()
+        with track_downstream("langgraph", "plan_scenes"):
+            response = await http_client.post(
+                f"{LANGGRAPH_API_URL}/api/plan/scenes",
+                json={
+                    "script": script,
+                    "duration_seconds": duration_seconds,
+                    "style_preferences": style_preferences or {},
+                    "brand_guidelines": brand_guidelines or {}
+                }
+            )
+            response.raise_for_status()
         return response.json()
     except Exception as e:
         raise Exception(f"Scene planning failed: {str(e)}")
@@ -94,15 +144,16 @@ async def plan_workflow(
 ) -> Dict[str, Any]:
     """Plan workflow using LangGraph orchestrator"""
     try:
-        response = await http_client.post(
-            f"{LANGGRAPH_API_URL}/api/plan/workflow",
-            json={
-                "scenes": scenes,
-                "video_type": video_type,
-                "editing_requirements": editing_requirements or []
-            }
-        )
-        response.raise_for_status()
+        with track_downstream("langgraph", "plan_workflow"):
+            response = await http_client.post(
+                f"{LANGGRAPH_API_URL}/api/plan/workflow",
+                json={
+                    "scenes": scenes,
+                    "video_type": video_type,
+                    "editing_requirements": editing_requirements or []
+                }
+            )
+            response.raise_for_status()
         return response.json()
     except Exception as e:
         raise Exception(f"Workflow planning failed: {str(e)}")
@@ -115,15 +166,16 @@ async def submit_video_generation(
 ) -> Dict[str, Any]:
     """Submit video generation job to ComfyUI"""
     try:
-        response = await http_client.post(
-            f"{COMFYUI_API_URL}/api/workflow/submit",
-            json={
-                "workflow": workflow,
-                "prompt": prompt,
-                "extra_data": extra_data or {}
-            }
-        )
-        response.raise_for_status()
+        with track_downstream("comfyui", "submit"):
+            response = await http_client.post(
+                f"{COMFYUI_API_URL}/api/workflow/submit",
+                json={
+                    "workflow": workflow,
+                    "prompt": prompt,
+                    "extra_data": extra_data or {}
+                }
+            )
+            response.raise_for_status()
         return response.json()
     except Exception as e:
         raise Exception(f"Video generation submission failed: {str(e)}")
@@ -132,15 +184,46 @@ async def submit_video_generation(
 async def get_video_generation_status(prompt_id: str) -> Dict[str, Any]:
     """Get status of video generation job"""
     try:
-        response = await http_client.get(
-            f"{COMFYUI_API_URL}/api/workflow/status/{prompt_id}"
-        )
-        response.raise_for_status()
+        with track_downstream("comfyui", "status"):
+            response = await http_client.get(
+                f"{COMFYUI_API_URL}/api/workflow/status/{prompt_id}"
+            )
+            response.raise_for_status()
         return response.json()
     except Exception as e:
         raise Exception(f"Failed to get video status: {str(e)}")
 
 
+async def cancel_video_generation(prompt_id: str) -> Dict[str, Any]:
+    """Cancel a pending or running ComfyUI prompt, freeing its GPU slot"""
+    try:
+        with track_downstream("comfyui", "cancel"):
+            response = await http_client.post(
+                f"{COMFYUI_API_URL}/api/workflow/cancel/{prompt_id}",
+                timeout=10.0
+            )
+            response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        raise Exception(f"Failed to cancel video generation {prompt_id}: {str(e)}")
+
+
+async def delete_audio(audio_url: str) -> None:
+    """Delete a synthesized audio file from the Chatterbox TTS service"""
+    filename = audio_url.rstrip("/").split("/")[-1]
+    try:
+        with track_downstream("chatterbox", "delete_audio"):
+            response = await http_client.delete(
+                f"{CHATTERBOX_API_URL}/audio/{filename}",
+                timeout=10.0
+            )
+            # Already gone is as good as deleted
+            if response.status_code != 404:
+                response.raise_for_status()
+    except Exception as e:
+        raise Exception(f"Failed to delete audio {filename}: {str(e)}")
+
+
 async def check_service_health() -> Dict[str, bool]:
     """Check health of all services"""
     services = {
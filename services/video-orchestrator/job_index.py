@@ -0,0 +1,229 @@
+"""
+Job index module
+Per-user secondary indexes over the `job:{id}` hashes, so a user's jobs can be
+listed newest-first without scanning the keyspace.
+
+Each user has a sorted set of all their jobs plus one per status, scored by
+the job's creation time in milliseconds:
+
+    user:{user_id}:jobs            every job
+    user:{user_id}:jobs:{status}   jobs currently in that status
+
+The indexes are only ever written together with the job hash (a MULTI
+pipeline on creation, a Lua script on status changes), so they cannot drift.
+The same script refuses moves out of a terminal status, and out of
+"cancelling" to anything but cancelled or failed.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import base64
+import binascii
+import time
+
+JOB_STATUSES = ("pending", "processing", "cancelling", "completed", "failed", "cancelled")
+
+# Hash fields returned for each job in a listing
+SUMMARY_FIELDS = (
+    "job_id", "status", "progress", "current_stage", "prompt",
+    "campaign_id", "created_at", "completed_at", "error",
+)
+
+# Statuses a job never leaves
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+# Statuses a cancelling job may still move to
+CANCELLING_EXITS = ("cancelled", "failed")
+
+# Move a job between status indexes in the same step as the hash update, if
+# the move is allowed from the job's current status (checked in the script so
+# a concurrent cancel or completion cannot slip in between).
+# KEYS[1] = job hash; ARGV = job_id, new status, then field/value pairs.
+# Index keys are derived from the hash, which assumes a single (non-cluster) Redis.
+_TRANSITION_SCRIPT = """
+local info = redis.call('HMGET', KEYS[1], 'user_id', 'status', 'created_ts')
+local user_id, old_status, created_ts = info[1], info[2], info[3]
+if not user_id then
+    return 0
+end
+if old_status == 'completed' or old_status == 'failed' or old_status == 'cancelled' then
+    return 0
+end
+if old_status == 'cancelling' and ARGV[2] ~= 'cancelled' and ARGV[2] ~= 'failed' then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'status', ARGV[2], unpack(ARGV, 3))
+if created_ts and user_id ~= '' and old_status ~= ARGV[2] then
+    local prefix = 'user:' .. user_id .. ':jobs:'
+    if old_status then
+        redis.call('ZREM', prefix .. old_status, ARGV[1])
+    end
+    redis.call('ZADD', prefix .. ARGV[2], created_ts, ARGV[1])
+end
+return 1
+"""
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def user_jobs_key(user_id: str, status: Optional[str] = None) -> str:
+    """Index key for a user's jobs, optionally restricted to one status"""
+    if status:
+        return f"user:{user_id}:jobs:{status}"
+    return f"user:{user_id}:jobs"
+
+
+def now_ms() -> int:
+    """Current time in epoch milliseconds (the index score)"""
+    return int(time.time() * 1000)
+
+
+def create_job(redis_client, job_id: str, user_id: str, fields: Dict[str, str], queue: Optional[str] = None):
+    """
+    Write a new job hash and add it to its owner's indexes atomically.
+
+    `fields` must already be serialized and include `status` and `created_ts`.
+    When `queue` is given the job ID is pushed onto that list in the same
+    transaction.
+    """
+    score = int(fields["created_ts"])
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.hset(f"job:{job_id}", mapping=fields)
+    pipe.zadd(user_jobs_key(user_id), {job_id: score})
+    pipe.zadd(user_jobs_key(user_id, fields["status"]), {job_id: score})
+    if queue:
+        pipe.lpush(queue, job_id)
+    pipe.execute()
+
+
+class JobIndex:
+    """Status transitions and cursor-paginated listing over the per-user indexes"""
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._transition = redis_client.register_script(_TRANSITION_SCRIPT)
+
+    def set_status(self, job_id: str, status: str, fields: Optional[Dict[str, str]] = None) -> bool:
+        """
+        Set a job's status (plus any extra hash fields) and move it to the
+        matching status index.
+
+        Returns whether the transition was applied: False if the job does not
+        exist, is already in a terminal status, or is cancelling and `status`
+        is neither cancelled nor failed. Nothing is written in that case.
+        """
+        args: List[str] = [job_id, status]
+        for key, value in (fields or {}).items():
+            args.extend((key, value))
+        # Run through the instrumented client so EVALSHA shows up in /metrics
+        return bool(self._transition(keys=[f"job:{job_id}"], args=args, client=self.redis))
+
+    def list_jobs(
+        self,
+        user_id: str,
+        statuses: Optional[Sequence[str]] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Return one page of a user's jobs, newest first, and the cursor for the
+        next page (None on the last page).
+
+        Each index is read from the cursor position with ZREVRANGEBYSCORE, so a
+        page costs O(log n + limit) per status regardless of how many jobs the
+        user has. Several statuses are merged by (created_ts, job_id).
+        """
+        keys = [user_jobs_key(user_id, status) for status in statuses] if statuses else [user_jobs_key(user_id)]
+        position = decode_cursor(cursor) if cursor else None
+
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            if position is None:
+                pipe.zrevrangebyscore(key, "+inf", "-inf", start=0, num=limit + 1, withscores=True)
+            else:
+                score, job_id = position
+                # Jobs created in the same millisecond as the cursor, then strictly older ones
+                pipe.zrevrangebyscore(key, score, score, withscores=True)
+                pipe.zrevrangebyscore(key, f"({score}", "-inf", start=0, num=limit + 1, withscores=True)
+        results = pipe.execute()
+
+        candidates = set()
+        if position is None:
+            for entries in results:
+                candidates.update((int(score), member) for member, score in entries)
+        else:
+            score, last_id = position
+            for ties, older in zip(results[0::2], results[1::2]):
+                candidates.update((score, member) for member, _ in ties if member < last_id)
+                candidates.update((int(s), member) for member, s in older)
+
+        # Same order Redis uses within one index: score, then member, descending
+        ordered = sorted(candidates, reverse=True)
+        page, has_more = ordered[:limit], len(ordered) > limit
+
+        pipe = self.redis.pipeline(transaction=False)
+        for _, job_id in page:
+            pipe.hmget(f"job:{job_id}", SUMMARY_FIELDS)
+        rows = pipe.execute() if page else []
+
+        jobs = [dict(zip(SUMMARY_FIELDS, values)) for values in rows if values[0] is not None]
+        next_cursor = encode_cursor(*page[-1]) if has_more and page else None
+        return jobs, next_cursor
+
+
+def encode_cursor(score: int, job_id: str) -> str:
+    """Opaque cursor pointing just past (score, job_id)"""
+    return base64.urlsafe_b64encode(f"{score}:{job_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    """Inverse of encode_cursor; raises InvalidCursor on malformed input"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, job_id = base64.urlsafe_b64decode(padded.encode()).decode().split(":", 1)
+        return int(score), job_id
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def backfill(redis_client, batch_size: int = 500) -> int:
+    """
+    Index job hashes created before the indexes existed.
+
+    Jobs without `created_ts` get one derived from `created_at` (or now).
+    Safe to re-run; returns the number of jobs indexed.
+    """
+    from datetime import datetime, timezone
+
+    indexed = 0
+    for key in redis_client.scan_iter(match="job:*", count=batch_size):
+        if key.count(":") != 1:
+            continue  # job:{id}:prompts and similar
+        user_id, status, created_ts, created_at = redis_client.hmget(
+            key, "user_id", "status", "created_ts", "created_at"
+        )
+        if not user_id:
+            continue
+        if not created_ts:
+            try:
+                # created_at is written as naive UTC
+                created = datetime.fromisoformat(created_at).replace(tzinfo=timezone.utc)
+                created_ts = int(created.timestamp() * 1000)
+            except (TypeError, ValueError):
+                created_ts = now_ms()
+        job_id = key.split(":", 1)[1]
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hset(key, "created_ts", str(created_ts))
+        pipe.zadd(user_jobs_key(user_id), {job_id: int(created_ts)})
+        pipe.zadd(user_jobs_key(user_id, status or "pending"), {job_id: int(created_ts)})
+        pipe.execute()
+        indexed += 1
+    return indexed
+
+
+if __name__ == "__main__":
+    import os
+    from redis import Redis
+
+    client = Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379"), decode_responses=True)
+    print(f"Indexed {backfill(client)} jobs")
@@ -3,10 +3,11 @@ Video Orchestrator Service
 FastAPI service for coordinating video generation pipeline
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
+from contextlib import contextmanager
 from datetime import datetime
 import uuid
 import os
@@ -15,8 +16,23 @@ import httpx
 import json
 import asyncio
 
+from metrics import (
+    CONTENT_TYPE_LATEST,
+    JOBS_IN_FLIGHT,
+    JOBS_TOTAL,
+    InstrumentedRedis,
+    register_queue_collector,
+    render_latest,
+    stage_timer,
+)
+from job_index import JOB_STATUSES, InvalidCursor, JobIndex, create_job, now_ms
+from tracing import current_trace_id, current_traceparent, setup_tracing, start_span
+
 app = FastAPI(title="Kolony Video Orchestrator", version="1.0.0")
 
+# Tracing must be set up before integration creates its HTTP client
+setup_tracing(app, "video-orchestrator")
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -26,17 +42,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Redis connection
-redis_client = Redis(
+# Redis connection (every command is timed for /metrics)
+redis_client = InstrumentedRedis(Redis(
     host=os.getenv("REDIS_URL", "redis://redis:6379").replace("redis://", "").split(":")[0],
     port=int(os.getenv("REDIS_URL", "redis://redis:6379").split(":")[-1]) if ":" in os.getenv("REDIS_URL", "redis://redis:6379") else 6379,
     decode_responses=True
-)
+))
+register_queue_collector(redis_client.raw)
+
+# Per-user job indexes (kept in step with the job hashes)
+job_index = JobIndex(redis_client)
 
 # Service URLs
 WHISPER_API_URL = os.getenv("WHISPER_API_URL", "http://whisper-api:8000")
 CHATTERBOX_API_URL = os.getenv("CHATTERBOX_API_URL", "http://chatterbox-tts:8000")
 COMFYUI_URL = os.getenv("COMFYUI_URL", "http://comfyui:8188")
+COMFYUI_POLL_INTERVAL = float(os.getenv("COMFYUI_POLL_INTERVAL", "5"))  # seconds between status checks
+COMFYUI_POLL_TIMEOUT = float(os.getenv("COMFYUI_POLL_TIMEOUT", "600"))  # 10 minutes default
+CANCEL_TIMEOUT = float(os.getenv("CANCEL_TIMEOUT", "10"))  # upper bound on cancellation cleanup
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
@@ -67,6 +90,31 @@ class JobStatusResponse(BaseModel):
     estimated_time_remaining: Optional[int] = None
     assets: Dict[str, Any] = {}
     error: Optional[str] = None
+    trace_id: Optional[str] = None
+
+
+class JobSummary(BaseModel):
+    job_id: str
+    status: str
+    progress: int = 0
+    current_stage: Optional[str] = None
+    prompt: Optional[str] = None
+    campaign_id: Optional[str] = None
+    created_at: Optional[str] = None
+    completed_at: Optional[str] = None
+    error: Optional[str] = None
+
+
+class JobListResponse(BaseModel):
+    jobs: List[JobSummary]
+    next_cursor: Optional[str] = None
+
+
+class CancelJobResponse(BaseModel):
+    job_id: str
+    status: str
+    cancelled_prompts: int = 0
+    deleted_assets: int = 0
 
 
 class ScenePlanRequest(BaseModel):
@@ -79,6 +127,27 @@ class ScenePlanResponse(BaseModel):
     scenes: List[Dict[str, Any]]
 
 
+def serialize_job_fields(fields: Dict[str, Any]) -> Dict[str, str]:
+    """Convert job fields to Redis hash values (None -> "", dicts/lists -> JSON)"""
+    serialized = {}
+    for key, value in fields.items():
+        if value is None:
+            serialized[key] = ""
+        elif isinstance(value, (dict, list)):
+            serialized[key] = json.dumps(value)
+        else:
+            serialized[key] = str(value)
+    return serialized
+
+
+# Cancellation signals for jobs running on this replica
+_cancel_events: Dict[str, asyncio.Event] = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside the pipeline when its job has been cancelled"""
+
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -90,6 +159,13 @@ async def health_check():
     }
 
 
+# Prometheus metrics endpoint
+@app.get("/metrics")
+async def metrics():
+    """Expose pipeline metrics in the Prometheus text format"""
+    return Response(content=render_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 # Video generation endpoint
 @app.post("/api/video/generate", response_model=VideoGenerationResponse)
 async def generate_video(
@@ -104,6 +180,7 @@ async def generate_video(
         raise HTTPException(status_code=401, detail="Authentication required")
     
     job_id = str(uuid.uuid4())
+    created_ts = now_ms()
     
     # Create job record in database (via Supabase)
     # TODO: Implement Supabase client integration
@@ -119,12 +196,15 @@ async def generate_video(
         "voice_settings": request.voice_settings,
         "editing_instructions": request.editing_instructions,
         "brand_guidelines_id": request.brand_guidelines_id,
-        "status": "pending"
+        "status": "pending",
+        "created_at": datetime.utcfromtimestamp(created_ts / 1000).isoformat(),
+        "created_ts": created_ts,
+        "trace_id": current_trace_id() or "",
+        "traceparent": current_traceparent() or ""
     }
     
-    # Add to Redis queue
-    redis_client.lpush("video:planning", str(job_id))
-    redis_client.hset(f"job:{job_id}", mapping=job_data)
+    # Store the job, index it under its owner and queue it in one transaction
+    create_job(redis_client, job_id, user_id, serialize_job_fields(job_data), queue="video:planning")
     
     # Start background processing
     background_tasks.add_task(process_video_generation, job_id)
@@ -136,6 +216,54 @@ async def generate_video(
     )
 
 
+# Job listing endpoint
+@app.get("/api/video/jobs", response_model=JobListResponse)
+async def list_jobs(
+    user_id: str = None,
+    status: Optional[List[str]] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """
+    List the user's jobs, newest first
+    
+    Pass `status` (repeatable) to filter, and the returned `next_cursor` as
+    `cursor` to fetch the next page.
+    """
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    unknown = set(status or []) - set(JOB_STATUSES)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown status: {', '.join(sorted(unknown))}. Allowed: {', '.join(JOB_STATUSES)}"
+        )
+    
+    try:
+        jobs, next_cursor = job_index.list_jobs(user_id, statuses=status, limit=limit, cursor=cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return JobListResponse(
+        jobs=[
+            JobSummary(
+                job_id=job["job_id"],
+                status=job["status"] or "pending",
+                progress=int(job["progress"] or 0),
+                current_stage=job["current_stage"] or None,
+                prompt=job["prompt"],
+                campaign_id=job["campaign_id"] or None,
+                created_at=job["created_at"] or None,
+                completed_at=job["completed_at"] or None,
+                error=job["error"] or None
+            )
+            for job in jobs
+        ],
+        next_cursor=next_cursor
+    )
+
+
 # Job status endpoint
 @app.get("/api/video/jobs/{job_id}", response_model=JobStatusResponse)
 async def get_job_status(job_id: str, user_id: str = None):
@@ -176,7 +304,8 @@ async def get_job_status(job_id: str, user_id: str = None):
         current_stage=current_stage,
         estimated_time_remaining=int(job_data.get("estimated_time_remaining", 0)),
         assets=assets,
-        error=job_data.get("error")
+        error=job_data.get("error"),
+        trace_id=job_data.get("trace_id") or None
     )
 
 
@@ -217,25 +346,135 @@ from integration import (
     plan_workflow,
     submit_video_generation,
     get_video_generation_status,
+    cancel_video_generation,
+    delete_audio,
     check_service_health
 )
 
 
+@contextmanager
+def pipeline_stage(stage: str):
+    """Time a pipeline stage for /metrics and record it as a span"""
+    with start_span(f"stage.{stage}", attributes={"pipeline.stage": stage}):
+        with stage_timer(stage):
+            yield
+
+
+def is_cancel_requested(job_id: str) -> bool:
+    """Check the local signal first, then the job hash (cancel may arrive on another replica)"""
+    event = _cancel_events.get(job_id)
+    if event is not None and event.is_set():
+        return True
+    if redis_client.hget(f"job:{job_id}", "cancel_requested") == "1":
+        if event is not None:
+            event.set()
+        return True
+    return False
+
+
+def raise_if_cancelled(job_id: str):
+    """Cancellation checkpoint between and inside pipeline stages"""
+    if is_cancel_requested(job_id):
+        raise JobCancelled()
+
+
+async def run_cancellable(job_id: str, awaitable):
+    """
+    Await a downstream call, abandoning it as soon as the job is cancelled
+    on this replica, so in-flight HTTP requests don't delay cancellation
+    """
+    event = _cancel_events.get(job_id)
+    if event is None:
+        return await awaitable
+    
+    task = asyncio.ensure_future(awaitable)
+    waiter = asyncio.ensure_future(event.wait())
+    try:
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        task.cancel()
+        raise
+    finally:
+        waiter.cancel()
+    if not task.done():
+        task.cancel()
+        raise JobCancelled()
+    return task.result()
+
+
+async def release_job_resources(job_id: str) -> Dict[str, int]:
+    """
+    Cancel every ComfyUI prompt the job submitted and delete its intermediate
+    audio, within CANCEL_TIMEOUT so capacity returns to the queue promptly
+    """
+    prompt_ids = list(redis_client.smembers(f"job:{job_id}:prompts"))
+    audio_urls = json.loads(redis_client.hget(f"job:{job_id}", "audio_urls") or "[]")
+    
+    cancelled_prompts = 0
+    deleted_assets = 0
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(
+                *(cancel_video_generation(prompt_id) for prompt_id in prompt_ids),
+                *(delete_audio(audio_url) for audio_url in audio_urls),
+                return_exceptions=True
+            ),
+            timeout=CANCEL_TIMEOUT
+        )
+        cancelled_prompts = sum(1 for r in results[:len(prompt_ids)] if not isinstance(r, Exception))
+        deleted_assets = sum(1 for r in results[len(prompt_ids):] if not isinstance(r, Exception))
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Cancellation cleanup warning for job {job_id}: {result}")
+    except asyncio.TimeoutError:
+        print(f"Cancellation cleanup for job {job_id} exceeded {CANCEL_TIMEOUT}s")
+    
+    redis_client.hdel(f"job:{job_id}", "audio_urls", "video_url")
+    return {"cancelled_prompts": cancelled_prompts, "deleted_assets": deleted_assets}
+
+
+def finalize_cancelled_job(job_id: str):
+    """Mark a cancelling job cancelled (the cancel endpoint already released its resources)"""
+    if job_index.set_status(job_id, "cancelled", {
+        "current_stage": "cancelled",
+        "completed_at": datetime.utcnow().isoformat()
+    }):
+        JOBS_TOTAL.labels("cancelled").inc()
+
+
 # Background task for video generation
 async def process_video_generation(job_id: str):
     """
     Background task to process video generation through the pipeline
     """
+    # Get job data
+    job_data = redis_client.hgetall(f"job:{job_id}")
+    if not job_data:
+        return
+    
+    _cancel_events[job_id] = asyncio.Event()
     try:
-        # Get job data
-        job_data = redis_client.hgetall(f"job:{job_id}")
-        if not job_data:
-            return
+        # Rejoin the trace started by the request that created the job
+        with start_span(
+            "video.job",
+            traceparent=job_data.get("traceparent") or None,
+            attributes={"job.id": job_id}
+        ):
+            await _run_video_pipeline(job_id, job_data)
+    finally:
+        _cancel_events.pop(job_id, None)
+
+
+async def _run_video_pipeline(job_id: str, job_data: Dict[str, str]):
+    """Run the pipeline stages for a job and record its final status"""
+    JOBS_IN_FLIGHT.inc()
+    try:
+        # A job cancelled while still queued never starts
+        raise_if_cancelled(job_id)
         
-        # Update status to processing
-        redis_client.hset(f"job:{job_id}", "status", "processing")
-        redis_client.hset(f"job:{job_id}", "current_stage", "planning")
-        redis_client.hset(f"job:{job_id}", "progress", "10")
+        # Update status to processing (refused if a cancel got in first)
+        if not job_index.set_status(job_id, "processing", {"current_stage": "planning", "progress": "10"}):
+            raise JobCancelled()
         
         script = job_data.get("prompt", "")
         duration = int(job_data.get("duration_seconds", 30))
@@ -243,104 +482,194 @@ async def process_video_generation(job_id: str):
         
         # Stage 1: Scene Planning
         try:
-            scene_plan = await plan_scenes(
-                script=script,
-                duration_seconds=duration,
-                style_preferences={"style": style}
-            )
-            redis_client.hset(f"job:{job_id}", "scene_plan", json.dumps(scene_plan))
-            redis_client.hset(f"job:{job_id}", "progress", "20")
+            with pipeline_stage("planning"):
+                scene_plan = await run_cancellable(job_id, plan_scenes(
+                    script=script,
+                    duration_seconds=duration,
+                    style_preferences={"style": style}
+                ))
+                redis_client.hset(f"job:{job_id}", "scene_plan", json.dumps(scene_plan))
+                redis_client.hset(f"job:{job_id}", "progress", "20")
+        except JobCancelled:
+            raise
         except Exception as e:
             raise Exception(f"Scene planning failed: {str(e)}")
         
+        raise_if_cancelled(job_id)
+        
         # Stage 2: Workflow Planning
         try:
-            workflow_plan = await plan_workflow(
-                scenes=scene_plan.get("scenes", []),
-                video_type="hunyuan"
-            )
-            redis_client.hset(f"job:{job_id}", "workflow_plan", json.dumps(workflow_plan))
-            redis_client.hset(f"job:{job_id}", "current_stage", "generation")
-            redis_client.hset(f"job:{job_id}", "progress", "30")
+            with pipeline_stage("workflow"):
+                workflow_plan = await run_cancellable(job_id, plan_workflow(
+                    scenes=scene_plan.get("scenes", []),
+                    video_type="hunyuan"
+                ))
+                redis_client.hset(f"job:{job_id}", "workflow_plan", json.dumps(workflow_plan))
+                redis_client.hset(f"job:{job_id}", "current_stage", "generation")
+                redis_client.hset(f"job:{job_id}", "progress", "30")
+        except JobCancelled:
+            raise
         except Exception as e:
             raise Exception(f"Workflow planning failed: {str(e)}")
         
+        raise_if_cancelled(job_id)
+        
         # Stage 3: Video Generation
         try:
-            # TODO: Convert workflow_plan to ComfyUI workflow format
-            # For now, use a placeholder workflow
-            workflow = {
-                "prompt": {
-                    # ComfyUI workflow structure would go here
+            with pipeline_stage("generation"):
+                # TODO: Convert workflow_plan to ComfyUI workflow format
+                # For now, use a placeholder workflow
+                workflow = {
+                    "prompt": {
+                        # ComfyUI workflow structure would go here
+                    }
                 }
-            }
-            
-            gen_response = await submit_video_generation(
-                workflow=workflow,
-                prompt=script
-            )
-            prompt_id = gen_response.get("prompt_id")
-            redis_client.hset(f"job:{job_id}", "comfyui_prompt_id", prompt_id)
-            redis_client.hset(f"job:{job_id}", "progress", "40")
-            
-            # Poll for completion
-            max_attempts = 120  # 10 minutes max
-            for attempt in range(max_attempts):
-                await asyncio.sleep(5)  # Check every 5 seconds
-                status = await get_video_generation_status(prompt_id)
                 
-                if status.get("status") == "completed":
-                    output_videos = status.get("output_videos", [])
-                    if output_videos:
-                        redis_client.hset(f"job:{job_id}", "video_url", output_videos[0])
-                    redis_client.hset(f"job:{job_id}", "progress", "70")
-                    break
-                elif status.get("status") == "failed":
-                    raise Exception(f"Video generation failed: {status.get('error')}")
+                gen_response = await run_cancellable(job_id, submit_video_generation(
+                    workflow=workflow,
+                    prompt=script
+                ))
+                prompt_id = gen_response.get("prompt_id")
+                # Every submitted prompt is tracked so cancellation can reach all of them
+                redis_client.sadd(f"job:{job_id}:prompts", prompt_id)
+                redis_client.hset(f"job:{job_id}", "comfyui_prompt_id", prompt_id)
+                redis_client.hset(f"job:{job_id}", "progress", "40")
+                if is_cancel_requested(job_id):
+                    # Submitted after the cancel endpoint released the job's prompts
+                    await cancel_video_generation(prompt_id)
+                    raise JobCancelled()
                 
-                # Update progress
-                progress = status.get("progress", 40)
-                redis_client.hset(f"job:{job_id}", "progress", str(progress))
+                # Poll for completion, waking early if the job is cancelled
+                cancel_event = _cancel_events[job_id]
+                max_attempts = max(1, int(COMFYUI_POLL_TIMEOUT / COMFYUI_POLL_INTERVAL))
+                for attempt in range(max_attempts):
+                    try:
+                        await asyncio.wait_for(cancel_event.wait(), timeout=COMFYUI_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    raise_if_cancelled(job_id)
+                    status = await run_cancellable(job_id, get_video_generation_status(prompt_id))
+                    
+                    if status.get("status") == "completed":
+                        output_videos = status.get("output_videos", [])
+                        if output_videos:
+                            redis_client.hset(f"job:{job_id}", "video_url", output_videos[0])
+                        redis_client.hset(f"job:{job_id}", "progress", "70")
+                        break
+                    elif status.get("status") == "failed":
+                        raise Exception(f"Video generation failed: {status.get('error')}")
+                    
+                    # Update progress
+                    progress = status.get("progress", 40)
+                    redis_client.hset(f"job:{job_id}", "progress", str(int(progress)))
             
+        except JobCancelled:
+            raise
         except Exception as e:
             raise Exception(f"Video generation failed: {str(e)}")
         
         # Stage 4: Audio Synthesis (if needed)
         try:
-            # Generate voiceover for scenes
-            audio_urls = []
-            for scene in scene_plan.get("scenes", []):
-                if scene.get("description"):
-                    audio_result = await synthesize_speech(
-                        text=scene["description"],
-                        language="en",
-                        emotion="neutral"
-                    )
-                    if audio_result.get("audio_url"):
-                        audio_urls.append(audio_result["audio_url"])
-            
-            if audio_urls:
-                redis_client.hset(f"job:{job_id}", "audio_urls", json.dumps(audio_urls))
-                redis_client.hset(f"job:{job_id}", "progress", "85")
+            with pipeline_stage("audio"):
+                # Generate voiceover for scenes
+                audio_urls = []
+                for scene in scene_plan.get("scenes", []):
+                    raise_if_cancelled(job_id)
+                    if scene.get("description"):
+                        audio_result = await run_cancellable(job_id, synthesize_speech(
+                            text=scene["description"],
+                            language="en",
+                            emotion="neutral"
+                        ))
+                        if audio_result.get("audio_url"):
+                            audio_urls.append(audio_result["audio_url"])
+                            # Recorded as produced so cancellation can delete partial audio
+                            redis_client.hset(f"job:{job_id}", "audio_urls", json.dumps(audio_urls))
+                            if is_cancel_requested(job_id):
+                                # Produced after the cancel endpoint deleted the job's audio
+                                await delete_audio(audio_result["audio_url"])
+                                raise JobCancelled()
+                
+                if audio_urls:
+                    redis_client.hset(f"job:{job_id}", "progress", "85")
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"Audio synthesis warning: {str(e)}")
             # Don't fail the job if audio fails
         
+        raise_if_cancelled(job_id)
+        
         # Stage 5: Final Assembly
-        # TODO: Combine video and audio using FFmpeg
-        redis_client.hset(f"job:{job_id}", "current_stage", "assembly")
-        redis_client.hset(f"job:{job_id}", "progress", "90")
+        with pipeline_stage("assembly"):
+            # TODO: Combine video and audio using FFmpeg
+            redis_client.hset(f"job:{job_id}", "current_stage", "assembly")
+            redis_client.hset(f"job:{job_id}", "progress", "90")
         
-        # Mark as completed
-        redis_client.hset(f"job:{job_id}", "status", "completed")
-        redis_client.hset(f"job:{job_id}", "progress", "100")
-        redis_client.hset(f"job:{job_id}", "current_stage", "completed")
-        redis_client.hset(f"job:{job_id}", "completed_at", datetime.utcnow().isoformat())
+        # Mark as completed, unless a cancel moved the job to cancelling first
+        if not job_index.set_status(job_id, "completed", {
+            "progress": "100",
+            "current_stage": "completed",
+            "completed_at": datetime.utcnow().isoformat()
+        }):
+            raise JobCancelled()
+        JOBS_TOTAL.labels("completed").inc()
         
+    except JobCancelled:
+        finalize_cancelled_job(job_id)
     except Exception as e:
-        redis_client.hset(f"job:{job_id}", "status", "failed")
-        redis_client.hset(f"job:{job_id}", "error", str(e))
-        redis_client.hset(f"job:{job_id}", "completed_at", datetime.utcnow().isoformat())
+        # Downstream calls fail once their prompts are cancelled; report that as a cancellation
+        if is_cancel_requested(job_id):
+            finalize_cancelled_job(job_id)
+            return
+        if job_index.set_status(job_id, "failed", {
+            "error": str(e),
+            "completed_at": datetime.utcnow().isoformat()
+        }):
+            JOBS_TOTAL.labels("failed").inc()
+    finally:
+        JOBS_IN_FLIGHT.dec()
+
+
+# Cancel job endpoint
+@app.post("/api/video/jobs/{job_id}/cancel", response_model=CancelJobResponse)
+async def cancel_job(job_id: str, user_id: str = None):
+    """
+    Cancel a video generation job
+    
+    Sets the job's cancellation flag (checked by the pipeline between and
+    during stages), removes it from the queue, and immediately cancels its
+    ComfyUI prompts and deletes intermediate audio.
+    """
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    job_data = redis_client.hgetall(f"job:{job_id}")
+    if not job_data:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job_data.get("user_id") != user_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Refused atomically if the job finished or another cancel got in first
+    if not job_index.set_status(job_id, "cancelling", {"cancel_requested": "1"}):
+        status = redis_client.hget(f"job:{job_id}", "status")
+        raise HTTPException(status_code=409, detail=f"Job is already {status}")
+    redis_client.lrem("video:planning", 0, job_id)
+    
+    # Wake the pipeline right away if it runs on this replica
+    event = _cancel_events.get(job_id)
+    if event is not None:
+        event.set()
+    
+    released = await release_job_resources(job_id)
+    
+    return CancelJobResponse(
+        job_id=job_id,
+        status="cancelling",
+        cancelled_prompts=released["cancelled_prompts"],
+        deleted_assets=released["deleted_assets"]
+    )
 
 
 # Import social media functions
@@ -354,20 +683,27 @@ from social_media import (
 )
 
 
+class ExportRequest(BaseModel):
+    job_id: str = Field(..., description="Video generation job ID")
+    platform: Platform = Field(..., description="Target platform")
+    # In the body so the token stays out of URLs and access logs
+    access_token: str = Field(..., description="Platform API access token")
+    title: Optional[str] = Field(None, description="Post title")
+    description: Optional[str] = Field(None, description="Post description")
+    hashtags: Optional[List[str]] = Field(None, description="Hashtags")
+
+
 # Social media export endpoint
 @app.post("/api/video/export")
 async def export_video_to_social_media(
-    job_id: str = Field(..., description="Video generation job ID"),
-    platform: Platform = Field(..., description="Target platform"),
-    access_token: str = Field(..., description="Platform API access token"),
-    title: Optional[str] = Field(None, description="Post title"),
-    description: Optional[str] = Field(None, description="Post description"),
-    hashtags: Optional[List[str]] = Field(None, description="Hashtags"),
+    request: ExportRequest,
     user_id: str = None  # Should come from auth middleware
 ):
     """
     Export generated video to social media platform
     """
+    job_id = request.job_id
+    platform = request.platform
     if not user_id:
         raise HTTPException(status_code=401, detail="Authentication required")
     
@@ -392,18 +728,19 @@ async def export_video_to_social_media(
         raise HTTPException(status_code=400, detail="No video URL found for this job")
     
     try:
-        # Generate platform-optimized version
-        optimized = generate_platform_optimized_video(video_url, platform)
-        
-        # Export to platform
-        result = await export_to_platform(
-            platform=platform,
-            video_url=optimized["output_url"],
-            access_token=access_token,
-            title=title,
-            description=description,
-            hashtags=hashtags
-        )
+        with pipeline_stage("export"):
+            # Generate platform-optimized version
+            optimized = generate_platform_optimized_video(video_url, platform)
+            
+            # Export to platform
+            result = await export_to_platform(
+                platform=platform,
+                video_url=optimized["output_url"],
+                access_token=request.access_token,
+                title=request.title,
+                description=request.description,
+                hashtags=request.hashtags
+            )
         
         return result
     
@@ -0,0 +1,227 @@
+"""
+Metrics module for video orchestrator
+Prometheus instrumentation for the video generation pipeline
+"""
+
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Redis lists that back the pipeline queues, reported as queue depth per lane
+QUEUE_LANES = [
+    lane.strip()
+    for lane in os.getenv("METRICS_QUEUE_LANES", "video:planning").split(",")
+    if lane.strip()
+]
+
+# Pipeline stages are seconds-to-minutes long; downstream and Redis calls are much shorter
+STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200)
+DOWNSTREAM_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+REDIS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+STAGE_LATENCY = Histogram(
+    "orchestrator_stage_duration_seconds",
+    "Time spent in each video pipeline stage",
+    ["stage", "outcome"],
+    buckets=STAGE_BUCKETS,
+)
+
+JOBS_IN_FLIGHT = Gauge(
+    "orchestrator_jobs_in_flight",
+    "Video jobs currently being processed by this replica",
+)
+
+JOBS_TOTAL = Counter(
+    "orchestrator_jobs_total",
+    "Video jobs finished by this replica",
+    ["status"],
+)
+
+DOWNSTREAM_LATENCY = Histogram(
+    "orchestrator_downstream_request_duration_seconds",
+    "Latency of calls to downstream pipeline services",
+    ["service", "operation"],
+    buckets=DOWNSTREAM_BUCKETS,
+)
+
+DOWNSTREAM_ERRORS = Counter(
+    "orchestrator_downstream_errors_total",
+    "Failed calls to downstream pipeline services",
+    ["service", "operation"],
+)
+
+REDIS_LATENCY = Histogram(
+    "orchestrator_redis_command_duration_seconds",
+    "Latency of Redis commands issued by the orchestrator",
+    ["command"],
+    buckets=REDIS_BUCKETS,
+)
+
+CACHE_LOOKUPS = Counter(
+    "orchestrator_cache_lookups_total",
+    "Cache lookups by cache and result (hit ratio = hit / (hit + miss))",
+    ["cache", "result"],
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a pipeline stage, labelling the observation with its outcome"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        STAGE_LATENCY.labels(stage, outcome).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track_downstream(service: str, operation: str):
+    """Time a downstream service call and count it as an error if it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        DOWNSTREAM_ERRORS.labels(service, operation).inc()
+        raise
+    finally:
+        DOWNSTREAM_LATENCY.labels(service, operation).observe(time.perf_counter() - start)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Record a cache hit or miss"""
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+class InstrumentedRedis:
+    """
+    Thin proxy around a Redis client that times every command.
+
+    Bound methods are wrapped once and memoized, so the per-call overhead is
+    a perf_counter pair and a histogram observe on a pre-resolved child.
+    Pipelines are wrapped so execute() is timed as one 'pipeline' command.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._wrapped = {}
+
+    def __getattr__(self, name: str):
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        if name == "pipeline":
+            def pipeline(*args, **kwargs):
+                return _InstrumentedPipeline(attr(*args, **kwargs))
+            wrapped = pipeline
+        else:
+            observe = REDIS_LATENCY.labels(name).observe
+
+            def wrapped(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return attr(*args, **kwargs)
+                finally:
+                    observe(time.perf_counter() - start)
+
+        self._wrapped[name] = wrapped
+        return wrapped
+
+    @property
+    def raw(self):
+        """The underlying, uninstrumented client"""
+        return self._client
+
+
+class _InstrumentedPipeline:
+    """Pipeline proxy that times execute() as a single 'pipeline' command"""
+
+    def __init__(self, pipeline):
+        self._pipeline = pipeline
+
+    def __getattr__(self, name: str):
+        return getattr(self._pipeline, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._pipeline.reset()
+
+    def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._pipeline.execute(*args, **kwargs)
+        finally:
+            REDIS_LATENCY.labels("pipeline").observe(time.perf_counter() - start)
+
+
+class QueueDepthCollector:
+    """
+    Reports queue depth per lane at scrape time.
+
+    Reading LLEN on scrape keeps queue depth off the request hot path
+    entirely; the cost is one pipelined round trip per scrape.
+    """
+
+    def __init__(self, client, lanes: Iterable[str]):
+        self._client = client
+        self._lanes: List[str] = list(lanes)
+
+    @staticmethod
+    def _family() -> GaugeMetricFamily:
+        return GaugeMetricFamily(
+            "orchestrator_queue_depth",
+            "Jobs waiting in each pipeline queue lane",
+            labels=["lane"],
+        )
+
+    def describe(self):
+        # Lets the registry validate names without hitting Redis on register
+        yield self._family()
+
+    def collect(self):
+        depth = self._family()
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for lane in self._lanes:
+                pipe.llen(lane)
+            for lane, length in zip(self._lanes, pipe.execute()):
+                depth.add_metric([lane], length)
+        except Exception as e:
+            print(f"Queue depth collection failed: {e}")
+        yield depth
+
+
+_queue_collector: Optional[QueueDepthCollector] = None
+
+
+def register_queue_collector(client, lanes: Iterable[str] = QUEUE_LANES):
+    """Register the scrape-time queue depth collector (idempotent)"""
+    global _queue_collector
+    if _queue_collector is None:
+        _queue_collector = QueueDepthCollector(client, lanes)
+        REGISTRY.register(_queue_collector)
+
+
+def render_latest() -> bytes:
+    """Render all metrics in the Prometheus text exposition format"""
+    return generate_latest(REGISTRY)
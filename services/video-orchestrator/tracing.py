@@ -0,0 +1,151 @@
+"""
+Tracing module
+OpenTelemetry setup shared by the pipeline services, with W3C trace-context
+(`traceparent`) propagation on inbound FastAPI requests and outbound httpx calls
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+import os
+
+# Try to import OpenTelemetry - tracing becomes a no-op if it is not installed
+try:
+    from opentelemetry import propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import (
+        BatchSpanProcessor,
+        SimpleSpanProcessor,
+        SpanExporter,
+        SpanExportResult,
+    )
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+    TRACING_AVAILABLE = True
+except ImportError:
+    TRACING_AVAILABLE = False
+    print("Warning: OpenTelemetry not installed. Install with: pip install opentelemetry-sdk")
+
+# Configuration
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "otlp").lower()  # otlp, file, memory, console, none
+TRACE_FILE = os.getenv("TRACE_FILE", "/tmp/traces.jsonl")
+TRACE_EXCLUDED_URLS = os.getenv("TRACE_EXCLUDED_URLS", "health,metrics")
+
+tracer = None
+memory_exporter = None
+
+
+if TRACING_AVAILABLE:
+    class FileSpanExporter(SpanExporter):
+        """Append finished spans to a JSON-lines file (one span per line)"""
+
+        def __init__(self, path: str):
+            self.path = path
+
+        def export(self, spans) -> "SpanExportResult":
+            try:
+                with open(self.path, "a") as f:
+                    for span in spans:
+                        f.write(span.to_json(indent=None) + "\n")
+                return SpanExportResult.SUCCESS
+            except OSError as e:
+                print(f"Failed to write spans to {self.path}: {e}")
+                return SpanExportResult.FAILURE
+
+        def shutdown(self):
+            pass
+
+
+def _build_exporter():
+    """Create the span exporter selected by TRACE_EXPORTER"""
+    global memory_exporter
+
+    if TRACE_EXPORTER == "otlp":
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    if TRACE_EXPORTER == "file":
+        return FileSpanExporter(TRACE_FILE)
+    if TRACE_EXPORTER == "memory":
+        memory_exporter = InMemorySpanExporter()
+        return memory_exporter
+    if TRACE_EXPORTER == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+    return None
+
+
+def setup_tracing(app, service_name: str):
+    """
+    Configure the tracer provider and instrument the FastAPI app and httpx.
+
+    Call this right after creating the app and before any module-level
+    httpx clients are constructed, so outbound calls carry `traceparent`.
+    """
+    global tracer
+
+    if not TRACING_AVAILABLE or TRACE_EXPORTER == "none":
+        return
+
+    try:
+        exporter = _build_exporter()
+    except Exception as e:
+        print(f"Error creating {TRACE_EXPORTER} span exporter: {e}")
+        exporter = None
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    if exporter is not None:
+        # Export synchronously for the in-memory exporter so tests see spans immediately
+        processor_cls = SimpleSpanProcessor if TRACE_EXPORTER == "memory" else BatchSpanProcessor
+        provider.add_span_processor(processor_cls(exporter))
+    trace.set_tracer_provider(provider)
+    tracer = trace.get_tracer(service_name)
+
+    FastAPIInstrumentor.instrument_app(
+        app,
+        tracer_provider=provider,
+        excluded_urls=TRACE_EXCLUDED_URLS,
+    )
+    HTTPXClientInstrumentor().instrument(tracer_provider=provider)
+
+
+@contextmanager
+def start_span(
+    name: str,
+    traceparent: Optional[str] = None,
+    attributes: Optional[Dict[str, Any]] = None
+):
+    """
+    Start a span as the current span.
+
+    When `traceparent` is given the span joins that trace instead of the
+    current context, which lets background work rejoin the request's trace.
+    Yields None when tracing is disabled.
+    """
+    if tracer is None:
+        yield None
+        return
+
+    context = propagate.extract({"traceparent": traceparent}) if traceparent else None
+    with tracer.start_as_current_span(name, context=context, attributes=attributes) as span:
+        yield span
+
+
+def current_trace_id() -> Optional[str]:
+    """Hex trace ID of the current span, if any"""
+    if not TRACING_AVAILABLE:
+        return None
+    span_context = trace.get_current_span().get_span_context()
+    if not span_context.is_valid:
+        return None
+    return format(span_context.trace_id, "032x")
+
+
+def current_traceparent() -> Optional[str]:
+    """W3C `traceparent` header value for the current span, if any"""
+    if not TRACING_AVAILABLE:
+        return None
+    carrier: Dict[str, str] = {}
+    propagate.inject(carrier)
+    return carrier.get("traceparent")
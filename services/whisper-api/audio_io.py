@@ -0,0 +1,320 @@
+"""
+Audio ingestion module
+Streams multipart uploads straight into an ffmpeg decode pipe.
+
+The request body is parsed incrementally; each file part's bytes are written
+to ffmpeg's stdin as they arrive and ffmpeg's stdout (16 kHz mono float32,
+the format Whisper expects) is collected into a single growing buffer. The
+upload itself is never held in memory or written to disk, decoding starts
+with the first bytes, and peak memory is about the size of the decoded audio.
+The raw bytes are hashed on the way through for the transcription cache.
+"""
+
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Configuration
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+MAX_FIELD_SIZE = 1024 * 1024  # text form fields
+READ_SIZE = 1 << 16
+
+SAMPLE_RATE = 16000
+
+# Containers whose index may sit at the end of the file (not decodable from a pipe);
+# these are spooled to a temp file as they stream in and decoded once complete
+SEEKABLE_FORMATS = {".mp4", ".m4a"}
+
+
+class AudioDecodeError(Exception):
+    """Raised when ffmpeg cannot decode an upload"""
+
+
+class FormParseError(Exception):
+    """Raised when the request body is not valid multipart/form-data"""
+
+
+class AudioDecoder:
+    """
+    Decodes one upload to a float32 PCM array while it is being received.
+
+    Usage: `await start()`, `await write(chunk)` for each chunk, `await close()`,
+    then `await result()`. `abort()` kills ffmpeg and discards everything.
+    Streaming consumers read decoded audio incrementally instead, with
+    `wait_for_samples()`, `samples()` and `discard_before()`.
+
+    `input_args` are ffmpeg input options, e.g. `-f s16le -ar 16000` for raw PCM.
+    """
+
+    def __init__(self, file_ext: str = "", input_args: Optional[List[str]] = None):
+        self.file_ext = file_ext
+        self.input_args = input_args or []
+        self.spooled = file_ext in SEEKABLE_FORMATS
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._stdout_task: Optional[asyncio.Task] = None
+        self._stderr_task: Optional[asyncio.Task] = None
+        self._spool = None
+        self._pcm = bytearray()
+        self._input_broken = False
+        self._hash = hashlib.sha256()
+        self._offset = 0  # samples discarded from the front of _pcm
+        self._pcm_ready = asyncio.Event()
+        self._eof = False
+
+    @property
+    def content_hash(self) -> str:
+        """SHA-256 of the upload bytes received so far (the whole file once closed)"""
+        return self._hash.hexdigest()
+
+    async def start(self):
+        if self.spooled:
+            self._spool = tempfile.NamedTemporaryFile(delete=False, suffix=self.file_ext)
+        else:
+            await self._spawn("pipe:0")
+
+    async def _spawn(self, source: str):
+        self._process = await asyncio.create_subprocess_exec(
+            FFMPEG_BINARY, "-nostdin", "-threads", "0",
+            *self.input_args,
+            "-i", source,
+            "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE),
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE if source == "pipe:0" else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._stdout_task = asyncio.create_task(self._read_pcm())
+        self._stderr_task = asyncio.create_task(self._process.stderr.read())
+
+    async def _read_pcm(self):
+        stdout = self._process.stdout
+        try:
+            while True:
+                chunk = await stdout.read(READ_SIZE)
+                if not chunk:
+                    return
+                self._pcm += chunk
+                self._pcm_ready.set()
+        finally:
+            self._eof = True
+            self._pcm_ready.set()
+
+    @property
+    def decoded_until(self) -> int:
+        """Number of samples decoded so far (including discarded ones)"""
+        return self._offset + len(self._pcm) // 4
+
+    @property
+    def finished(self) -> bool:
+        """ffmpeg has produced all of its output"""
+        return self._eof
+
+    async def wait_for_samples(self, count: int) -> int:
+        """Wait until `count` samples are decoded or decoding ends; returns decoded_until"""
+        while self.decoded_until < count and not self._eof:
+            self._pcm_ready.clear()
+            await self._pcm_ready.wait()
+        return self.decoded_until
+
+    def samples(self, start: int, end: int) -> np.ndarray:
+        """Copy of decoded samples [start, end) by absolute sample index"""
+        start = max(start, self._offset) - self._offset
+        end = min(end, self.decoded_until) - self._offset
+        return np.frombuffer(bytes(self._pcm[start * 4:end * 4]), dtype=np.float32)
+
+    def discard_before(self, sample: int):
+        """Free decoded audio before an absolute sample index (streaming only)"""
+        drop = min(sample, self.decoded_until) - self._offset
+        if drop > 0:
+            del self._pcm[:drop * 4]
+            self._offset += drop
+
+    async def write(self, chunk: bytes):
+        self._hash.update(chunk)
+        if self._spool is not None:
+            self._spool.write(chunk)
+            return
+        if self._input_broken:
+            return
+        try:
+            self._process.stdin.write(chunk)
+            # Backpressure: stop reading the request while ffmpeg catches up
+            await self._process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg gave up on the input; result() reports its error
+            self._input_broken = True
+
+    async def close(self):
+        """Signal the end of the upload"""
+        if self._spool is not None:
+            self._spool.close()
+            await self._spawn(self._spool.name)
+            return
+        if not self._input_broken:
+            try:
+                self._process.stdin.close()
+                await self._process.stdin.wait_closed()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    async def wait(self):
+        """Wait for ffmpeg to exit; raises AudioDecodeError if decoding failed"""
+        await self._stdout_task
+        stderr = await self._stderr_task
+        returncode = await self._process.wait()
+        if returncode != 0:
+            message = stderr.decode(errors="replace").strip().splitlines()
+            raise AudioDecodeError(f"Failed to decode audio: {message[-1] if message else returncode}")
+
+    async def result(self) -> np.ndarray:
+        """Wait for decoding to finish and return the audio as float32 samples"""
+        try:
+            await self.wait()
+        finally:
+            self._remove_spool()
+        # Zero-copy view over the collected bytes
+        return np.frombuffer(self._pcm, dtype=np.float32)
+
+    def abort(self):
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+        for task in (self._stdout_task, self._stderr_task):
+            if task is not None:
+                task.cancel()
+        if self._spool is not None and not self._spool.closed:
+            self._spool.close()
+        self._remove_spool()
+
+    def _remove_spool(self):
+        if self._spool is not None and os.path.exists(self._spool.name):
+            os.unlink(self._spool.name)
+
+
+class _PartCollector:
+    """python-multipart callbacks that queue part events for async handling"""
+
+    def __init__(self):
+        self.events: List[Tuple[str, object]] = []
+        self.finished = False  # closing boundary seen
+        self._headers: Dict[bytes, bytes] = {}
+        self._field = b""
+        self._value = b""
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field = b""
+        self._value = b""
+
+    def on_headers_finished(self):
+        self.events.append(("part", self._headers))
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        self.events.append(("data", bytes(data[start:end])))
+
+    def on_part_end(self):
+        self.events.append(("end", None))
+
+    def on_end(self):
+        self.finished = True
+
+    def callbacks(self) -> Dict[str, Callable]:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_end": self.on_end,
+        }
+
+
+async def parse_streaming_form(
+    request,
+    open_file: Callable[[str, str], Awaitable[Optional[AudioDecoder]]]
+) -> Dict[str, str]:
+    """
+    Parse a multipart/form-data request body as it streams in.
+
+    For each file part `open_file(field_name, filename)` is awaited; it returns
+    a started AudioDecoder (or None to discard the part), which receives the
+    part's bytes and is closed when the part ends. Returns the text fields.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise FormParseError("Expected a multipart/form-data request")
+
+    collector = _PartCollector()
+    parser = MultipartParser(boundary, collector.callbacks())
+    fields: Dict[str, str] = {}
+    sink: Optional[AudioDecoder] = None
+    field_name: Optional[str] = None
+    field_value = bytearray()
+    is_file = False
+
+    async def handle_events():
+        nonlocal sink, field_name, field_value, is_file
+        events, collector.events = collector.events, []
+        for kind, payload in events:
+            if kind == "part":
+                _, disposition = parse_options_header(payload.get(b"content-disposition", b""))
+                field_name = disposition.get(b"name", b"").decode(errors="replace")
+                filename = disposition.get(b"filename")
+                is_file = filename is not None
+                field_value = bytearray()
+                if is_file:
+                    sink = await open_file(field_name, filename.decode(errors="replace"))
+            elif kind == "data":
+                if is_file:
+                    if sink is not None:
+                        await sink.write(payload)
+                else:
+                    field_value += payload
+                    if len(field_value) > MAX_FIELD_SIZE:
+                        raise FormParseError(f"Form field '{field_name}' is too large")
+            elif kind == "end":
+                if is_file:
+                    if sink is not None:
+                        await sink.close()
+                    sink = None
+                else:
+                    fields[field_name] = field_value.decode(errors="replace")
+
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except ValueError as e:  # python-multipart's parse errors
+                raise FormParseError(f"Malformed multipart body: {e}") from e
+            await handle_events()
+        parser.finalize()
+        await handle_events()
+        # finalize() doesn't check for the closing boundary; a body cut off before it
+        # would leave the file part's decoder open, waiting for input that never comes
+        if not collector.finished or sink is not None:
+            raise FormParseError("Incomplete multipart body")
+    except Exception:
+        if sink is not None:
+            sink.abort()
+        raise
+    return fields
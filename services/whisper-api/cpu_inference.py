@@ -0,0 +1,93 @@
+"""
+CPU inference module
+Model loading and thread placement for CPU-only nodes.
+
+With WHISPER_QUANTIZE=int8 the model's linear layers (attention projections
+and MLPs, nearly all of the compute) are dynamically quantized to int8:
+weights are stored as int8 and activations are quantized on the fly, which
+typically makes CPU inference 1.5-2.5x faster and the model about half the
+size, at a small accuracy cost (measure it with
+services/benchmarks/run_whisper_cpu_benchmark.py).
+
+Each process gets a fixed number of intra-op threads and a single inter-op
+thread. Worker pool processes are also pinned to disjoint core sets, so
+several workers per node never oversubscribe the cores.
+"""
+
+from typing import List, Optional, Sequence
+import os
+
+# Configuration
+WHISPER_QUANTIZE = os.getenv("WHISPER_QUANTIZE", "none").lower()  # none, int8 (CPU only)
+CPU_THREADS = int(os.getenv("CPU_THREADS", "0"))  # intra-op threads for the in-process CPU model; 0 = all cores
+WORKER_PIN_CORES = os.getenv("WORKER_PIN_CORES", "true").lower() in ("1", "true", "yes")
+
+QUANTIZE_MODES = ("none", "int8")
+
+
+def available_cores() -> List[int]:
+    """Cores this process may run on (respects container cpusets)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cores(cores: Sequence[int], parts: int) -> List[List[int]]:
+    """Divide cores into `parts` disjoint, equally sized, contiguous sets"""
+    per_part = max(1, len(cores) // parts)
+    return [list(cores[(i * per_part) % len(cores):][:per_part]) for i in range(parts)]
+
+
+def configure_threads(threads: int, cores: Optional[Sequence[int]] = None):
+    """
+    Pin this process's torch thread pools (and optionally its cores).
+
+    Call before the model runs anything: the inter-op pool can only be sized
+    once, and OpenMP/MKL read their variables when torch is first imported.
+    """
+    threads = max(1, threads)
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    if cores and WORKER_PIN_CORES and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+
+    torch.set_num_threads(threads)
+    try:
+        # Whisper runs one op at a time; extra inter-op threads only compete for cores
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already set, or parallel work has already started
+
+
+def quantize_int8(model):
+    """Dynamically quantize a Whisper model's linear layers to int8 (in place)"""
+    import torch
+
+    for module in model.modules():
+        # whisper.model.Linear only overrides forward() to cast dtypes; quantize_dynamic
+        # matches exact types, so demote it to a plain nn.Linear first
+        if isinstance(module, torch.nn.Linear) and type(module) is not torch.nn.Linear:
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def load_cpu_model(model_size: str, quantize: str = WHISPER_QUANTIZE):
+    """Load a Whisper model for CPU inference, quantized if requested"""
+    import whisper
+
+    if quantize not in QUANTIZE_MODES:
+        raise ValueError(f"WHISPER_QUANTIZE must be one of: {', '.join(QUANTIZE_MODES)}")
+    model = whisper.load_model(model_size, device="cpu")
+    model.eval()
+    if quantize == "int8":
+        model = quantize_int8(model)
+    return model
+
+
+def model_variant(model_size: str, device: str, quantize: str = WHISPER_QUANTIZE) -> str:
+    """Name of the weights actually used (quantized output differs from fp32)"""
+    if device == "cpu" and quantize != "none":
+        return f"{model_size}-{quantize}"
+    return model_size
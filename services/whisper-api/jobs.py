@@ -0,0 +1,395 @@
+"""
+Transcription jobs module
+Asynchronous transcription through a Redis queue.
+
+`POST /jobs` streams the upload to JOB_UPLOAD_DIR (a volume shared with the
+workers), records the job and returns at once. Workers (`worker.py`, or the
+API process itself with API_RUNS_JOBS=true) claim jobs from the queue, run
+JOB_CONCURRENCY of them at a time so they batch on the model, store the
+result and optionally POST it to the job's webhook.
+
+Redis layout:
+    whisper:job:{id}        hash: status, options, timestamps, result/error
+    whisper:jobs:queued     list of waiting job ids (LPUSH in, BLMOVE out)
+    whisper:jobs:running    list of claimed job ids
+    whisper:job:{id}:heartbeat  set with a TTL by the worker running the job
+
+A claimed job stays in the running list until it finishes, and its worker
+refreshes the heartbeat key while it runs (however long that takes), so
+jobs whose worker died are found by `requeue_stale()` once the heartbeat
+expires, and run again.
+"""
+
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import os
+import socket
+import time
+import uuid
+
+from transcription_cache import REDIS_URL, _to_json
+
+# Configuration
+JOB_UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", "/data/whisper-jobs")
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))  # jobs each worker runs at once
+API_RUNS_JOBS = os.getenv("API_RUNS_JOBS", "false").lower() in ("1", "true", "yes")
+JOB_RESULT_TTL_SECONDS = int(os.getenv("JOB_RESULT_TTL_SECONDS", "86400"))
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "60"))  # no heartbeat for this long: worker presumed dead
+JOB_MAX_ATTEMPTS = 3
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Hosts webhooks may reach even though they resolve to private addresses (e.g. other compose services)
+WEBHOOK_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()}
+WEBHOOK_ATTEMPTS = 3
+WEBHOOK_TIMEOUT = 10.0
+
+JOB_STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+
+QUEUE_KEY = "whisper:jobs:queued"
+RUNNING_KEY = "whisper:jobs:running"
+
+
+def job_key(job_id: str) -> str:
+    return f"whisper:job:{job_id}"
+
+
+def heartbeat_key(job_id: str) -> str:
+    return f"whisper:job:{job_id}:heartbeat"
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+class UploadSpool:
+    """
+    Upload sink (same interface as audio_io.AudioDecoder) that writes the raw
+    bytes to the shared job directory and hashes them on the way through
+    """
+
+    def __init__(self, job_id: str, file_ext: str):
+        self.path = os.path.join(JOB_UPLOAD_DIR, f"{job_id}{file_ext}")
+        self._file = None
+        self._hash = hashlib.sha256()
+
+    @property
+    def content_hash(self) -> str:
+        return self._hash.hexdigest()
+
+    async def start(self):
+        os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+        self._file = open(self.path, "wb")
+
+    async def write(self, chunk: bytes):
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    async def close(self):
+        self._file.close()
+
+    def abort(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+        remove_upload(self.path)
+
+
+def remove_upload(path: Optional[str]):
+    if path:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+class JobQueue:
+    """Job records and the queue in Redis (blocking client; call via asyncio.to_thread)"""
+
+    def __init__(self, url: str = REDIS_URL):
+        from redis import Redis
+
+        self.redis = Redis.from_url(url, decode_responses=True)
+        # Claimed jobs not yet marked running, and when this process first saw them so
+        self._unmarked: Dict[str, float] = {}
+
+    def submit(self, job_id: str, fields: Dict[str, Any]):
+        """Record a job and queue it"""
+        record = {
+            **{name: value for name, value in fields.items() if value is not None},
+            "job_id": job_id,
+            "status": "queued",
+            "created_at": datetime.utcnow().isoformat(),
+            "queued_ts": time.time(),
+            "attempts": 0,
+        }
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(job_key(job_id), mapping=record)
+        pipe.lpush(QUEUE_KEY, job_id)
+        pipe.execute()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.redis.hgetall(job_key(job_id))
+        return job or None
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """0 for the next job to be claimed"""
+        index = self.redis.lpos(QUEUE_KEY, job_id)
+        if index is None:
+            return None
+        return self.redis.llen(QUEUE_KEY) - 1 - index
+
+    def claim(self, worker: str, timeout: float = 5.0) -> Optional[str]:
+        """Block until a job is available and mark it running; None on timeout"""
+        job_id = self.redis.blmove(QUEUE_KEY, RUNNING_KEY, timeout, "RIGHT", "LEFT")
+        if job_id is None:
+            return None
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(job_key(job_id), mapping={
+            "status": "running",
+            "started_at": datetime.utcnow().isoformat(),
+            "started_ts": time.time(),
+            "worker": worker,
+        })
+        pipe.hincrby(job_key(job_id), "attempts", 1)
+        pipe.set(heartbeat_key(job_id), worker, ex=JOB_HEARTBEAT_SECONDS)
+        pipe.execute()
+        return job_id
+
+    def heartbeat(self, job_id: str, worker: str):
+        """Keep a running job's claim alive for another JOB_HEARTBEAT_SECONDS"""
+        self.redis.set(heartbeat_key(job_id), worker, ex=JOB_HEARTBEAT_SECONDS)
+
+    def finish(self, job_id: str, status: str, **fields):
+        """Store the outcome, release the claim and start the record's TTL"""
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(job_key(job_id), mapping={
+            **fields,
+            "status": status,
+            "finished_at": datetime.utcnow().isoformat(),
+        })
+        pipe.lrem(RUNNING_KEY, 0, job_id)
+        pipe.delete(heartbeat_key(job_id))
+        pipe.expire(job_key(job_id), JOB_RESULT_TTL_SECONDS)
+        pipe.execute()
+
+    def update(self, job_id: str, **fields):
+        self.redis.hset(job_key(job_id), mapping=fields)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that is still queued; False if a worker already claimed it"""
+        if not self.redis.lrem(QUEUE_KEY, 0, job_id):
+            return False
+        self.finish(job_id, "cancelled")
+        return True
+
+    def requeue_stale(self) -> List[str]:
+        """Put jobs whose worker died back at the front of the queue (or fail them)"""
+        requeued = []
+        now = time.time()
+        running = self.redis.lrange(RUNNING_KEY, 0, -1)
+        self._unmarked = {job_id: seen for job_id, seen in self._unmarked.items() if job_id in running}
+        for job_id in running:
+            job = self.get(job_id)
+            if job is None:
+                self.redis.lrem(RUNNING_KEY, 0, job_id)
+                continue
+            if self.redis.exists(heartbeat_key(job_id)):
+                self._unmarked.pop(job_id, None)
+                continue
+            if job.get("status") != "running":
+                # Claimed but not marked running yet: either mid-claim or the worker died in
+                # between, so only requeue it once it has stayed that way for a heartbeat period
+                first_seen = self._unmarked.setdefault(job_id, now)
+                if now - first_seen < JOB_HEARTBEAT_SECONDS:
+                    continue
+            self._unmarked.pop(job_id, None)
+            # Only one worker wins the LREM, so a job is never requeued twice
+            if not self.redis.lrem(RUNNING_KEY, 0, job_id):
+                continue
+            if int(job.get("attempts") or 0) >= JOB_MAX_ATTEMPTS:
+                self.finish(job_id, "failed", error="Worker stopped while running the job")
+                remove_upload(job.get("audio_path"))
+                continue
+            print(f"Requeueing transcription job {job_id}: worker {job.get('worker')} stopped sending heartbeats")
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.hset(job_key(job_id), "status", "queued")
+            pipe.rpush(QUEUE_KEY, job_id)
+            pipe.execute()
+            requeued.append(job_id)
+        return requeued
+
+    def stats(self) -> Dict[str, int]:
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.llen(QUEUE_KEY)
+        pipe.llen(RUNNING_KEY)
+        queued, running = pipe.execute()
+        return {"queued": queued, "running": running}
+
+
+def sign_payload(body: bytes) -> Optional[str]:
+    """HMAC-SHA256 of a webhook body with WEBHOOK_SECRET, if one is set"""
+    if not WEBHOOK_SECRET:
+        return None
+    return "sha256=" + hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+def check_webhook_url(url: str):
+    """
+    Raise ValueError unless `url` is http(s) and its host resolves only to
+    public addresses (or is in WEBHOOK_ALLOWED_HOSTS), so job submitters
+    cannot make the service call loopback, private or link-local endpoints
+    such as cloud metadata (blocking: resolves the host)
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("webhook_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if host in WEBHOOK_ALLOWED_HOSTS:
+        return
+    try:
+        infos = socket.getaddrinfo(host, parts.port or (443 if parts.scheme == "https" else 80), proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"webhook_url host {host} does not resolve: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"webhook_url host {host} resolves to non-public address {address}")
+
+
+async def send_webhook(url: str, payload: Dict[str, Any]) -> bool:
+    """POST a job's outcome, retrying with backoff; returns whether it was delivered"""
+    import httpx
+
+    # Checked again at delivery in case the host's DNS changed since submission
+    try:
+        await asyncio.to_thread(check_webhook_url, url)
+    except ValueError as e:
+        print(f"Webhook to {url} refused: {e}")
+        return False
+
+    body = _to_json(payload)
+    headers = {"Content-Type": "application/json"}
+    signature = sign_payload(body)
+    if signature:
+        headers["X-Whisper-Signature"] = signature
+
+    async with httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT) as client:
+        for attempt in range(WEBHOOK_ATTEMPTS):
+            try:
+                response = await client.post(url, content=body, headers=headers)
+                if response.status_code < 500:
+                    return response.is_success
+            except httpx.HTTPError as e:
+                print(f"Webhook to {url} failed: {e}")
+            await asyncio.sleep(2 ** attempt)
+    return False
+
+
+class JobRunner:
+    """
+    Claims jobs and runs up to `concurrency` of them at once.
+
+    `transcribe_job(job)` receives the job record and returns the Whisper
+    result; any exception fails the job with its message.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        transcribe_job: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        concurrency: int = JOB_CONCURRENCY
+    ):
+        self.queue = queue
+        self.transcribe_job = transcribe_job
+        self.concurrency = max(1, concurrency)
+        self.worker = f"{os.uname().nodename}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._webhooks: Set[asyncio.Task] = set()
+
+    async def start(self):
+        try:
+            requeued = await asyncio.to_thread(self.queue.requeue_stale)
+            if requeued:
+                print(f"Requeued {len(requeued)} stale transcription jobs")
+        except Exception as e:
+            print(f"Error requeueing stale transcription jobs: {e}")
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._watch_stale()))
+
+    async def stop(self):
+        for task in [*self._tasks, *self._webhooks]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._webhooks, return_exceptions=True)
+
+    async def run_forever(self):
+        await self.start()
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.stop()
+
+    async def _watch_stale(self):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                await asyncio.to_thread(self.queue.requeue_stale)
+            except Exception as e:
+                print(f"Error requeueing stale transcription jobs: {e}")
+
+    async def _heartbeat(self, job_id: str):
+        """Refresh a running job's heartbeat well within its TTL"""
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS / 3)
+            try:
+                await asyncio.to_thread(self.queue.heartbeat, job_id, self.worker)
+            except Exception as e:
+                print(f"Error refreshing heartbeat of transcription job {job_id}: {e}")
+
+    async def _consume(self):
+        while True:
+            try:
+                job_id = await asyncio.to_thread(self.queue.claim, self.worker)
+            except Exception as e:
+                print(f"Error claiming transcription job: {e}")
+                await asyncio.sleep(5)
+                continue
+            if job_id is not None:
+                await self._run(job_id)
+
+    async def _run(self, job_id: str):
+        job = await asyncio.to_thread(self.queue.get, job_id)
+        if job is None:
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await self.transcribe_job(job)
+        except asyncio.CancelledError:
+            # Shutting down: leave the claim for requeue_stale
+            raise
+        except Exception as e:
+            outcome = {"status": "failed", "error": str(e)}
+            await asyncio.to_thread(self.queue.finish, job_id, "failed", error=str(e))
+        else:
+            outcome = {"status": "completed", "result": result}
+            await asyncio.to_thread(self.queue.finish, job_id, "completed", result=_to_json(result))
+        finally:
+            heartbeat.cancel()
+        remove_upload(job.get("audio_path"))
+
+        if job.get("webhook_url"):
+            # Delivered in the background so a slow receiver and its retries don't hold a job slot
+            task = asyncio.create_task(self._deliver_webhook(job_id, job["webhook_url"], outcome))
+            self._webhooks.add(task)
+            task.add_done_callback(self._webhooks.discard)
+
+    async def _deliver_webhook(self, job_id: str, url: str, outcome: Dict[str, Any]):
+        delivered = await send_webhook(url, {"job_id": job_id, **outcome})
+        try:
+            await asyncio.to_thread(self.queue.update, job_id, webhook="delivered" if delivered else "failed")
+        except Exception as e:
+            print(f"Error recording webhook delivery of transcription job {job_id}: {e}")
@@ -0,0 +1,182 @@
+"""
+Long-form transcription module
+Splits long recordings at silences and transcribes the pieces in parallel.
+
+A frame-energy VAD pass (vectorized NumPy, no model) picks cut points in the
+quietest stretch near the end of each window, so chunks fit in one 30-second
+Whisper window and rarely cut through a word. Chunks are transcribed
+concurrently, which lets them batch on the GPU scheduler or spread across
+the CPU worker pool, and the results are stitched back into one transcript
+with global timestamps.
+
+Where no silence is available the cut falls mid-speech; those chunks overlap
+their neighbour by LONGFORM_OVERLAP_SECONDS and each word/segment is kept
+only by the chunk that owns its midpoint, so nothing is transcribed twice.
+"""
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import os
+
+import numpy as np
+
+from scheduler import CHUNK_LENGTH, SAMPLE_RATE
+
+# Configuration
+LONGFORM_MIN_SECONDS = float(os.getenv("LONGFORM_MIN_SECONDS", "60"))  # auto mode threshold
+LONGFORM_OVERLAP_SECONDS = float(os.getenv("LONGFORM_OVERLAP_SECONDS", "1.0"))
+VAD_FRAME_MS = 30
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "8"))  # above the noise floor counts as speech
+SPEECH_FLOOR_DB = -45  # anything louder is never dropped as silence
+MIN_CHUNK_SECONDS = 10  # never cut closer than this to the previous cut
+
+
+@dataclass
+class Chunk:
+    """A slice of the recording and the part of it whose output it keeps"""
+    start: int  # samples, including leading overlap
+    end: int  # samples, including trailing overlap
+    keep_start: float  # seconds, global
+    keep_end: float  # seconds, global
+
+
+def frame_energy_db(audio: np.ndarray, frame: int) -> np.ndarray:
+    """RMS energy per frame in dB"""
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return 20 * np.log10(rms + 1e-10)
+
+
+def plan_chunks(
+    audio: np.ndarray,
+    max_seconds: float = CHUNK_LENGTH,
+    overlap_seconds: float = LONGFORM_OVERLAP_SECONDS
+) -> List[Chunk]:
+    """
+    Choose cut points at silences so every chunk fits in max_seconds.
+
+    Chunks that are silent throughout are dropped.
+    """
+    frame = SAMPLE_RATE * VAD_FRAME_MS // 1000
+    energy = frame_energy_db(audio, frame)
+    if len(energy) == 0:
+        return []
+    threshold = np.percentile(energy, 10) + VAD_MARGIN_DB
+    # Smooth over ~150 ms so a cut lands in a pause rather than a gap between syllables
+    smoothed = np.convolve(energy, np.ones(5) / 5, mode="same")
+    speech = energy > min(threshold, SPEECH_FLOOR_DB)
+
+    overlap_frames = int(overlap_seconds * SAMPLE_RATE) // frame
+    # Leave room for overlap on both sides within one window
+    max_frames = int(max_seconds * SAMPLE_RATE) // frame - 2 * overlap_frames
+    min_frames = min(int(MIN_CHUNK_SECONDS * SAMPLE_RATE) // frame, max_frames // 2)
+
+    cuts = [0]
+    while len(energy) - cuts[-1] > max_frames:
+        lo, hi = cuts[-1] + min_frames, cuts[-1] + max_frames
+        quietest = lo + int(np.argmin(smoothed[lo:hi]))
+        # No pause in reach: use the longest chunk (overlap covers the cut)
+        cuts.append(quietest if smoothed[quietest] <= threshold else hi)
+    cuts.append(len(energy))
+
+    chunks = []
+    total = len(audio)
+    for a, b in zip(cuts[:-1], cuts[1:]):
+        if not speech[a:b].any():
+            continue
+        # Overlap only where the cut itself is in speech
+        pad_before = overlap_frames if a > 0 and smoothed[a] > threshold else 0
+        pad_after = overlap_frames if b < len(energy) and smoothed[b] > threshold else 0
+        end = total if b == len(energy) else (b + pad_after) * frame
+        chunks.append(Chunk(
+            start=max(0, (a - pad_before) * frame),
+            end=min(total, end),
+            keep_start=a * frame / SAMPLE_RATE,
+            keep_end=(total if b == len(energy) else b * frame) / SAMPLE_RATE,
+        ))
+    return chunks
+
+
+def _owned(start: float, end: float, chunk: Chunk) -> bool:
+    midpoint = (start + end) / 2
+    return chunk.keep_start <= midpoint < chunk.keep_end
+
+
+def stitch(chunks: List[Chunk], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-chunk results into one transcribe-shaped result with global timestamps"""
+    segments = []
+    for chunk, result in zip(chunks, results):
+        offset = chunk.start / SAMPLE_RATE
+        for segment in result.get("segments", []):
+            start, end = segment["start"] + offset, segment["end"] + offset
+            words = segment.get("words")
+            if words:
+                kept = [
+                    {**word, "start": round(word["start"] + offset, 3), "end": round(word["end"] + offset, 3)}
+                    for word in words
+                    if _owned(word["start"] + offset, word["end"] + offset, chunk)
+                ]
+                if not kept:
+                    continue
+                text = "".join(word["word"] for word in kept).strip()
+                start, end = kept[0]["start"], kept[-1]["end"]
+            elif _owned(start, end, chunk):
+                kept, text = None, segment["text"].strip()
+            else:
+                continue
+
+            merged = {
+                **segment,
+                "id": len(segments),
+                "seek": int(round(offset * 100)),
+                "start": round(start, 3),
+                "end": round(end, 3),
+                "text": text,
+            }
+            if kept is not None:
+                merged["words"] = kept
+            segments.append(merged)
+
+    languages = [result.get("language") for result in results if result.get("language")]
+    return {
+        "text": " ".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": Counter(languages).most_common(1)[0][0] if languages else None,
+    }
+
+
+async def transcribe_long(
+    audio: np.ndarray,
+    transcribe_chunk: Callable[[np.ndarray, Optional[str]], Awaitable[Dict[str, Any]]],
+    language: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Transcribe a long recording as parallel silence-split chunks.
+
+    `transcribe_chunk(audio, language)` transcribes one chunk (at most one
+    window). Without an explicit language the first chunk is transcribed on
+    its own and its detected language is used for the rest, so chunks can't
+    disagree.
+    """
+    chunks = plan_chunks(audio)
+    if not chunks:
+        return {"text": "", "segments": [], "language": language}
+
+    def piece(chunk: Chunk) -> np.ndarray:
+        return audio[chunk.start:chunk.end]
+
+    results: List[Dict[str, Any]] = []
+    if language is None:
+        first = await transcribe_chunk(piece(chunks[0]), None)
+        language = first.get("language")
+        results.append(first)
+
+    results += await asyncio.gather(*[
+        transcribe_chunk(piece(chunk), language) for chunk in chunks[len(results):]
+    ])
+    return stitch(chunks, results)
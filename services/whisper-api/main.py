@@ -3,15 +3,30 @@ Whisper Turbo API Service
 FastAPI service for speech-to-text conversion using Whisper Large V3 Turbo
 """
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 import os
-import tempfile
 import asyncio
+import hmac
+import json
 from datetime import datetime
 
+import numpy as np
+
+from audio_io import READ_SIZE, AudioDecodeError, AudioDecoder, FormParseError, parse_streaming_form
+from cpu_inference import CPU_THREADS, WHISPER_QUANTIZE, available_cores, configure_threads, load_cpu_model, model_variant
+from jobs import API_RUNS_JOBS, JobQueue, JobRunner, UploadSpool, check_webhook_url, new_job_id, remove_upload
+from longform import LONGFORM_MIN_SECONDS, transcribe_long
+from model_registry import ALLOWED_MODELS, MODEL_MEMORY_BUDGET_MB, WARM_MODELS, LocalModel, ModelRegistry, resolve_checkpoint
+from scheduler import BATCH_MAX_SIZE, N_SAMPLES, SAMPLE_RATE
+from streaming import DuplexStreamingResponse, StreamingTranscriber, stream_input_args
+from tracing import setup_tracing, start_span
+from transcription_cache import cache_key, create_cache
+from worker_pool import WORKER_POOL_SIZE, WORKER_POOL_TOTAL, WorkerPool
+
 # Try to import whisper - will fail if not installed, that's okay for now
 try:
     import whisper
@@ -22,6 +37,9 @@ except ImportError:
 
 app = FastAPI(title="Kolony Whisper API", version="1.0.0")
 
+# Distributed tracing (W3C traceparent in and out)
+setup_tracing(app, "whisper-api")
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -31,10 +49,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global model variable
-whisper_model = None
-MODEL_SIZE = os.getenv("MODEL_SIZE", "large-v3-turbo")
+# Global model registry
+model_registry: Optional["ModelRegistry"] = None
+models_ready = False
+transcription_cache = create_cache()
+job_queue = JobQueue()
+job_runner: Optional[JobRunner] = None
+MODEL_SIZE = os.getenv("MODEL_SIZE", "large-v3-turbo")  # default model
 DEVICE = os.getenv("DEVICE", "cuda")
+MODEL_ADMIN_KEY = os.getenv("MODEL_ADMIN_KEY", "")  # required in X-Admin-Key to load/reload/unload; unset = disabled
+ALLOWED_EXTENSIONS = [".mp3", ".mp4", ".mpeg", ".mpga", ".m4a", ".wav", ".webm"]
 
 
 # Pydantic Models
@@ -59,31 +83,268 @@ class HealthResponse(BaseModel):
     model_loaded: bool
     model_size: str
     device: str
+    quantization: str = "none"
+    batching: Optional[Dict[str, Any]] = None
+    models: Optional[Dict[str, Any]] = None
+    cache: Optional[Dict[str, Any]] = None
+    jobs: Optional[Dict[str, Any]] = None
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    result_url: str
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    filename: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    queue_position: Optional[int] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    webhook: Optional[str] = None
+
+
+def use_worker_pool() -> bool:
+    """CPU deployments can run each model on a pool of processes instead of in-process"""
+    return DEVICE == "cpu" and WORKER_POOL_SIZE > 0
+
+
+async def load_model_backend(checkpoint: str, replaces=None):
+    """Load one model (name or checkpoint path) for the registry"""
+    if use_worker_pool():
+        # A new version of a model runs on the cores of the pool it replaces
+        pool = WorkerPool(WORKER_POOL_SIZE, checkpoint, share_cores_with=replaces)
+        try:
+            await pool.start()
+        except BaseException:
+            await pool.stop()
+            raise
+        return pool
+    
+    # Run in thread pool to avoid blocking
+    if DEVICE == "cpu":
+        model = await asyncio.to_thread(load_cpu_model, checkpoint, WHISPER_QUANTIZE)
+    else:
+        model = await asyncio.to_thread(whisper.load_model, checkpoint, device=DEVICE)
+    backend = LocalModel(model, DEVICE)
+    await backend.start()
+    return backend
+
 
+def model_names() -> List[str]:
+    """Models requests may ask for"""
+    if ALLOWED_MODELS:
+        return [name.strip() for name in ALLOWED_MODELS.split(",") if name.strip()]
+    if WHISPER_AVAILABLE:
+        return whisper.available_models()
+    return [MODEL_SIZE]
 
-# Initialize Whisper model
-def load_whisper_model():
-    """Load Whisper model on startup"""
-    global whisper_model
+
+@app.on_event("startup")
+async def startup_event():
+    """Create the model registry and load the warm models"""
+    global model_registry, models_ready
     
     if not WHISPER_AVAILABLE:
         print("Whisper not available - install openai-whisper")
         return
     
-    try:
-        print(f"Loading Whisper model: {MODEL_SIZE} on {DEVICE}...")
-        whisper_model = whisper.load_model(MODEL_SIZE, device=DEVICE)
-        print(f"Whisper model loaded successfully!")
-    except Exception as e:
-        print(f"Error loading Whisper model: {e}")
-        whisper_model = None
+    if DEVICE == "cpu" and not use_worker_pool():
+        # One thread setup for every in-process model
+        configure_threads(CPU_THREADS or len(available_cores()))
+    
+    model_registry = ModelRegistry(
+        load_model_backend,
+        budget_bytes=int(MODEL_MEMORY_BUDGET_MB * 2**20),
+        allowed=model_names(),
+        worker_budget=WORKER_POOL_TOTAL if use_worker_pool() else 0,
+        workers_per_model=WORKER_POOL_SIZE
+    )
+    warm = [name.strip() for name in (WARM_MODELS or MODEL_SIZE).split(",") if name.strip()]
+    failed = []
+    for name in warm:
+        try:
+            await model_registry.load(name)
+        except Exception as e:
+            print(f"Error loading Whisper model {name}: {e}")
+            failed.append(name)
+    # Serve unless the default model failed to load; other models load on first use
+    models_ready = MODEL_SIZE not in failed
 
 
 @app.on_event("startup")
-async def startup_event():
-    """Load model on startup"""
-    # Run in thread pool to avoid blocking
-    await asyncio.to_thread(load_whisper_model)
+async def start_job_runner():
+    """Run queued jobs in this process too when API_RUNS_JOBS is set"""
+    global job_runner
+    
+    if API_RUNS_JOBS and model_ready():
+        job_runner = JobRunner(job_queue, run_transcription_job)
+        await job_runner.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the job runner and unload every model"""
+    if job_runner is not None:
+        await job_runner.stop()
+    if model_registry is not None:
+        await model_registry.stop()
+
+
+def model_ready() -> bool:
+    """Whether models (in-process or in worker pools) can take requests"""
+    return model_registry is not None and models_ready
+
+
+def resolve_model(value: Optional[str]) -> str:
+    """Model a request asked for; empty (or OpenAI's "whisper-1") means the default"""
+    if not value or value == "whisper-1":
+        return MODEL_SIZE
+    if model_registry is not None and not model_registry.is_allowed(value):
+        raise HTTPException(status_code=400, detail=f"Unknown model. Allowed: {', '.join(model_names())}")
+    return value
+
+
+def model_version(model: str) -> str:
+    """Weights a model name currently serves; part of cache keys"""
+    version = model_registry.version(model) if model_registry is not None else model
+    return model_variant(version, DEVICE)
+
+
+async def transcribe_array(
+    audio: np.ndarray,
+    language: Optional[str] = None,
+    task: str = "transcribe",
+    temperature: float = 0.0,
+    longform: Optional[bool] = None,
+    model: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Transcribe decoded 16 kHz audio with a model from the registry.
+    
+    The model (default MODEL_SIZE) is loaded on first use and held for the
+    whole request. In-process models micro-batch clips that fit in one
+    30-second window with other concurrent requests; CPU deployments may
+    use a worker pool instead. Long-form mode (the default past
+    LONGFORM_MIN_SECONDS; `longform` forces it on or off) splits longer
+    audio at silences and transcribes the chunks in parallel; otherwise it
+    runs one full transcribe.
+    """
+    if longform is None:
+        longform = len(audio) > LONGFORM_MIN_SECONDS * SAMPLE_RATE
+    
+    async with model_registry.lease(model or MODEL_SIZE) as backend:
+        if longform and len(audio) > N_SAMPLES:
+            async def transcribe_chunk(chunk: np.ndarray, chunk_language: Optional[str]) -> Dict[str, Any]:
+                return await backend.transcribe(chunk, language=chunk_language, task=task, temperature=temperature)
+            
+            return await transcribe_long(audio, transcribe_chunk, language=language)
+        
+        return await backend.transcribe(audio, language=language, task=task, temperature=temperature)
+
+
+async def transcribe_upload(
+    decoder: AudioDecoder,
+    language: Optional[str] = None,
+    task: str = "transcribe",
+    temperature: float = 0.0,
+    longform: Optional[bool] = None,
+    model: Optional[str] = None
+) -> Tuple[Dict[str, Any], str]:
+    """
+    Transcribe a fully received upload, answering from the cache when possible.
+    
+    Returns the Whisper result and how it was produced: "miss" (transcribed
+    now), "hit" (from the cache) or "shared" (joined an identical in-flight
+    request).
+    """
+    key = cache_key(
+        decoder.content_hash,
+        model_version(model or MODEL_SIZE),
+        language=language,
+        task=task,
+        temperature=temperature,
+        word_timestamps=True,
+        longform=longform
+    )
+    
+    async def compute() -> Dict[str, Any]:
+        audio = await decoder.result()
+        return await transcribe_array(
+            audio, language=language, task=task, temperature=temperature, longform=longform, model=model
+        )
+    
+    result, source = await transcription_cache.get_or_compute(key, compute)
+    if source != "miss":
+        # This upload's decode isn't needed
+        decoder.abort()
+    return result, source
+
+
+async def run_transcription_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Transcribe a queued job's stored upload (used by the job runner)"""
+    audio_path = job["audio_path"]
+    options = json.loads(job.get("options") or "{}")
+    
+    decoder = AudioDecoder(os.path.splitext(audio_path)[1].lower())
+    await decoder.start()
+    try:
+        with open(audio_path, "rb") as f:
+            while chunk := f.read(READ_SIZE):
+                await decoder.write(chunk)
+        await decoder.close()
+    except BaseException:
+        decoder.abort()
+        raise
+    
+    model = options.get("model") or MODEL_SIZE
+    with start_span("whisper.job", attributes={"whisper.model": model, "whisper.job_id": job["job_id"]}) as span:
+        result, cache_status = await transcribe_upload(decoder, **options)
+        if span is not None:
+            span.set_attribute("whisper.cache", cache_status)
+    return result
+
+
+def parse_longform(value: Optional[str]) -> Optional[bool]:
+    """Form value for `longform`: "true"/"false" force the mode, empty or "auto" decides by length"""
+    value = (value or "auto").lower()
+    if value == "auto":
+        return None
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise HTTPException(status_code=422, detail="longform must be true, false or auto")
+
+
+def open_decoder(file_ext: str) -> AudioDecoder:
+    """Validate the upload's extension and create a decoder for it"""
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+    return AudioDecoder(file_ext)
+
+
+def multipart_form_schema(properties: Dict[str, Any], required: List[str]) -> Dict[str, Any]:
+    """OpenAPI request body for endpoints that parse their multipart body themselves"""
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {"type": "object", "properties": properties, "required": required}
+                }
+            }
+        }
+    }
 
 
 # Health check endpoint
@@ -91,131 +352,182 @@ async def startup_event():
 async def health_check():
     """Health check endpoint"""
     return HealthResponse(
-        status="healthy" if whisper_model is not None else "model_not_loaded",
-        model_loaded=whisper_model is not None,
+        status="healthy" if model_ready() else "model_not_loaded",
+        model_loaded=model_ready(),
         model_size=MODEL_SIZE,
-        device=DEVICE
+        quantization=WHISPER_QUANTIZE if DEVICE == "cpu" else "none",
+        device=DEVICE,
+        batching=default_model_stats(),
+        models=model_registry.stats() if model_registry is not None else None,
+        cache=transcription_cache.stats(),
+        jobs=await job_stats()
     )
 
 
+def default_model_stats() -> Optional[Dict[str, Any]]:
+    """Batching (or worker pool) counters of the default model, if it is loaded"""
+    if model_registry is None:
+        return None
+    return model_registry.backend_stats(MODEL_SIZE)
+
+
+async def job_stats() -> Optional[Dict[str, Any]]:
+    try:
+        return await asyncio.to_thread(job_queue.stats)
+    except Exception as e:
+        return {"error": str(e)}
+
+
 # Transcription endpoint
-@app.post("/transcribe", response_model=TranscriptionResponse)
-async def transcribe_audio(
-    file: UploadFile = File(...),
-    language: Optional[str] = Form(None),
-    task: str = Form("transcribe"),
-    response_format: str = Form("json"),
-    temperature: float = Form(0.0),
-):
+@app.post(
+    "/transcribe",
+    response_model=TranscriptionResponse,
+    openapi_extra=multipart_form_schema({
+        "file": {"type": "string", "format": "binary"},
+        "language": {"type": "string"},
+        "task": {"type": "string", "default": "transcribe"},
+        "response_format": {"type": "string", "default": "json"},
+        "temperature": {"type": "number", "default": 0.0},
+        "longform": {"type": "string", "enum": ["auto", "true", "false"], "default": "auto"},
+        "model": {"type": "string", "description": "Whisper model (default: MODEL_SIZE)"},
+    }, ["file"])
+)
+async def transcribe_audio(request: Request, response: Response):
     """
     Transcribe audio file to text using Whisper Turbo
     
     Supports: mp3, mp4, mpeg, mpga, m4a, wav, webm
+    
+    The upload is decoded by ffmpeg while it streams in; it is never
+    buffered whole or written to a temp file. Repeat uploads are answered
+    from the transcription cache (see the `X-Transcription-Cache` header).
     """
-    if not whisper_model:
+    if not model_ready():
         raise HTTPException(
             status_code=503,
             detail="Whisper model not loaded. Please check service logs."
         )
     
-    # Validate file type
-    allowed_extensions = [".mp3", ".mp4", ".mpeg", ".mpga", ".m4a", ".wav", ".webm"]
-    file_ext = os.path.splitext(file.filename)[1].lower()
+    decoder: Optional[AudioDecoder] = None
+    filename = None
     
-    if file_ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
-        )
+    async def open_file(field_name: str, upload_name: str) -> Optional[AudioDecoder]:
+        nonlocal decoder, filename
+        if field_name != "file" or decoder is not None:
+            return None
+        filename = upload_name
+        decoder = open_decoder(os.path.splitext(upload_name)[1].lower())
+        await decoder.start()
+        return decoder
     
-    # Save uploaded file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp_file:
+    try:
+        fields = await parse_streaming_form(request, open_file)
+        if decoder is None:
+            raise HTTPException(status_code=422, detail="Missing form field: file")
+        
+        language = fields.get("language") or None
+        task = fields.get("task") or "transcribe"
+        response_format = fields.get("response_format") or "json"
         try:
-            # Write uploaded file to temp file
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
-            
-            # Transcribe using Whisper
-            print(f"Transcribing file: {file.filename}")
-            
-            # Run transcription in thread pool (CPU-bound operation)
-            result = await asyncio.to_thread(
-                whisper_model.transcribe,
-                tmp_file_path,
-                language=language if language else None,
+            temperature = float(fields.get("temperature") or 0.0)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="temperature must be a number")
+        longform = parse_longform(fields.get("longform"))
+        model = resolve_model(fields.get("model"))
+    except FormParseError as e:
+        if decoder is not None:
+            decoder.abort()
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        if decoder is not None:
+            decoder.abort()
+        raise
+    
+    # Transcribe using Whisper
+    print(f"Transcribing file: {filename}")
+    
+    # Run transcription on the inference scheduler (batched with concurrent requests)
+    with start_span("whisper.transcribe", attributes={"whisper.model": model}) as span:
+        try:
+            result, cache_status = await transcribe_upload(
+                decoder,
+                language=language,
                 task=task,
                 temperature=temperature,
-                word_timestamps=True,
-                verbose=False
+                longform=longform,
+                model=model
             )
-            
-            # Extract information
-            text = result["text"].strip()
-            detected_language = result.get("language")
-            duration = None
-            segments = []
-            words = []
-            
-            # Process segments if available
-            if "segments" in result:
-                for seg in result["segments"]:
-                    segment_data = {
-                        "id": seg.get("id"),
-                        "start": seg.get("start"),
-                        "end": seg.get("end"),
-                        "text": seg.get("text", "").strip()
-                    }
-                    segments.append(segment_data)
-                
-                # Calculate duration from segments
-                if segments:
-                    duration = segments[-1]["end"]
-            
-            # Process words if available
-            if "words" in result:
-                for word_info in result["words"]:
-                    word_data = {
-                        "word": word_info.get("word"),
-                        "start": word_info.get("start"),
-                        "end": word_info.get("end"),
-                        "probability": word_info.get("probability")
-                    }
-                    words.append(word_data)
-            
-            # Format response based on requested format
-            if response_format == "text":
-                return {"text": text}
-            elif response_format == "srt":
-                # Generate SRT format
-                srt_content = ""
-                for i, seg in enumerate(segments, 1):
-                    start_time = format_timestamp(seg["start"])
-                    end_time = format_timestamp(seg["end"])
-                    srt_content += f"{i}\n{start_time} --> {end_time}\n{seg['text']}\n\n"
-                return {"text": srt_content}
-            elif response_format == "vtt":
-                # Generate VTT format
-                vtt_content = "WEBVTT\n\n"
-                for seg in segments:
-                    start_time = format_timestamp_vtt(seg["start"])
-                    end_time = format_timestamp_vtt(seg["end"])
-                    vtt_content += f"{start_time} --> {end_time}\n{seg['text']}\n\n"
-                return {"text": vtt_content}
-            else:
-                # Default: JSON format
-                return TranscriptionResponse(
-                    text=text,
-                    language=detected_language,
-                    duration=duration,
-                    segments=segments if segments else None,
-                    words=words if words else None
-                )
+        except AudioDecodeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if span is not None:
+            span.set_attribute("whisper.cache", cache_status)
+    response.headers["X-Transcription-Cache"] = cache_status
+    
+    return format_transcription(result, response_format)
+
+
+def format_transcription(result: Dict[str, Any], response_format: str = "json"):
+    """Shape a Whisper result as the requested response format"""
+    text = result["text"].strip()
+    detected_language = result.get("language")
+    duration = None
+    segments = []
+    words = []
+    
+    # Process segments if available
+    if "segments" in result:
+        for seg in result["segments"]:
+            segment_data = {
+                "id": seg.get("id"),
+                "start": seg.get("start"),
+                "end": seg.get("end"),
+                "text": seg.get("text", "").strip()
+            }
+            segments.append(segment_data)
         
-        finally:
-            # Clean up temp file
-            if os.path.exists(tmp_file_path):
-                os.unlink(tmp_file_path)
+        # Calculate duration from segments
+        if segments:
+            duration = segments[-1]["end"]
+    
+    # Process words if available
+    if "words" in result:
+        for word_info in result["words"]:
+            word_data = {
+                "word": word_info.get("word"),
+                "start": word_info.get("start"),
+                "end": word_info.get("end"),
+                "probability": word_info.get("probability")
+            }
+            words.append(word_data)
+    
+    # Format response based on requested format
+    if response_format == "text":
+        return {"text": text}
+    elif response_format == "srt":
+        # Generate SRT format
+        srt_content = ""
+        for i, seg in enumerate(segments, 1):
+            start_time = format_timestamp(seg["start"])
+            end_time = format_timestamp(seg["end"])
+            srt_content += f"{i}\n{start_time} --> {end_time}\n{seg['text']}\n\n"
+        return {"text": srt_content}
+    elif response_format == "vtt":
+        # Generate VTT format
+        vtt_content = "WEBVTT\n\n"
+        for seg in segments:
+            start_time = format_timestamp_vtt(seg["start"])
+            end_time = format_timestamp_vtt(seg["end"])
+            vtt_content += f"{start_time} --> {end_time}\n{seg['text']}\n\n"
+        return {"text": vtt_content}
+    else:
+        # Default: JSON format
+        return TranscriptionResponse(
+            text=text,
+            language=detected_language,
+            duration=duration,
+            segments=segments if segments else None,
+            words=words if words else None
+        )
 
 
 def format_timestamp(seconds: float) -> str:
@@ -236,60 +548,479 @@ def format_timestamp_vtt(seconds: float) -> str:
     return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
 
 
+def summarize_result(filename: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-file entry of the batch response"""
+    return {
+        "filename": filename,
+        "text": result["text"].strip(),
+        "language": result.get("language"),
+        "duration": result.get("segments", [{}])[-1].get("end") if result.get("segments") else None
+    }
+
+
 # Batch transcription endpoint (for processing multiple files)
-@app.post("/transcribe/batch")
-async def transcribe_batch(
-    files: List[UploadFile] = File(...),
-    language: Optional[str] = Form(None),
-    task: str = Form("transcribe")
-):
+@app.post(
+    "/transcribe/batch",
+    openapi_extra=multipart_form_schema({
+        "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+        "language": {"type": "string"},
+        "task": {"type": "string", "default": "transcribe"},
+        "stream": {"type": "boolean", "default": False},
+        "longform": {"type": "string", "enum": ["auto", "true", "false"], "default": "auto"},
+        "model": {"type": "string", "description": "Whisper model (default: MODEL_SIZE)"},
+    }, ["files"])
+)
+async def transcribe_batch(request: Request):
     """
     Transcribe multiple audio files in batch
+    
+    Each file is decoded by ffmpeg while the upload streams in, then files
+    are transcribed concurrently across the worker pool (or batched on the
+    GPU model). Results come back in input order, or with `stream=true` as
+    NDJSON lines (tagged with their `index`) as each file finishes.
     """
-    if not whisper_model:
+    if not model_ready():
         raise HTTPException(
             status_code=503,
             detail="Whisper model not loaded"
         )
     
-    results = []
+    # (filename, decoder, error) per uploaded file, in upload order
+    uploads: List[tuple] = []
     
-    for file in files:
-        try:
-            # Create a temporary file for each upload
-            file_ext = os.path.splitext(file.filename)[1].lower()
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp_file:
-                content = await file.read()
-                tmp_file.write(content)
-                tmp_file_path = tmp_file.name
-                
-                try:
-                    # Transcribe
-                    result = await asyncio.to_thread(
-                        whisper_model.transcribe,
-                        tmp_file_path,
-                        language=language if language else None,
-                        task=task,
-                        word_timestamps=True
+    async def open_file(field_name: str, upload_name: str) -> Optional[AudioDecoder]:
+        if field_name != "files":
+            return None
+        file_ext = os.path.splitext(upload_name)[1].lower()
+        if file_ext not in ALLOWED_EXTENSIONS:
+            uploads.append((upload_name, None, f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"))
+            return None
+        decoder = AudioDecoder(file_ext)
+        await decoder.start()
+        uploads.append((upload_name, decoder, None))
+        return decoder
+    
+    try:
+        fields = await parse_streaming_form(request, open_file)
+    except BaseException as e:
+        for _, decoder, _ in uploads:
+            if decoder is not None:
+                decoder.abort()
+        if isinstance(e, FormParseError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+    
+    if not uploads:
+        raise HTTPException(status_code=422, detail="Missing form field: files")
+    
+    # Options are read once the whole form has arrived; decoding has already run alongside the upload
+    language = fields.get("language") or None
+    task = fields.get("task") or "transcribe"
+    stream = fields.get("stream", "").lower() in ("1", "true", "yes", "on")
+    try:
+        longform = parse_longform(fields.get("longform"))
+        model = resolve_model(fields.get("model"))
+    except HTTPException:
+        for _, decoder, _ in uploads:
+            if decoder is not None:
+                decoder.abort()
+        raise
+    
+    # Bound how many decoded files are being transcribed at once
+    slots = WORKER_POOL_SIZE if use_worker_pool() else BATCH_MAX_SIZE
+    limiter = asyncio.Semaphore(slots * 2)
+    
+    async def transcribe_one(index: int, filename: str, decoder: Optional[AudioDecoder], error: Optional[str]) -> Dict[str, Any]:
+        if error is not None:
+            item = {"filename": filename, "error": error}
+        else:
+            try:
+                async with limiter:
+                    result, cache_status = await transcribe_upload(
+                        decoder, language=language, task=task, longform=longform, model=model
                     )
-                    
-                    results.append({
-                        "filename": file.filename,
-                        "text": result["text"].strip(),
-                        "language": result.get("language"),
-                        "duration": result.get("segments", [{}])[-1].get("end") if result.get("segments") else None
-                    })
-                finally:
-                    if os.path.exists(tmp_file_path):
-                        os.unlink(tmp_file_path)
+                item = {**summarize_result(filename, result), "cached": cache_status != "miss"}
+            except Exception as e:
+                item = {"filename": filename, "error": str(e)}
+        if stream:
+            item = {"index": index, **item}
+        return item
+    
+    tasks = [asyncio.create_task(transcribe_one(i, *upload)) for i, upload in enumerate(uploads)]
+    
+    if stream:
+        async def ndjson_results():
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield json.dumps(await next_done) + "\n"
+            finally:
+                # Client went away: stop work that hasn't started yet
+                for pending in tasks:
+                    pending.cancel()
         
-        except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "error": str(e)
+        return StreamingResponse(ndjson_results(), media_type="application/x-ndjson")
+    
+    try:
+        return {"results": await asyncio.gather(*tasks)}
+    finally:
+        for pending in tasks:
+            pending.cancel()
+
+
+async def stream_events(
+    decoder: AudioDecoder,
+    language: Optional[str] = None,
+    task: str = "transcribe",
+    temperature: float = 0.0,
+    model: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Streaming transcription events for audio arriving in `decoder`"""
+    async def transcribe_window(audio: np.ndarray, window_language: Optional[str]) -> Dict[str, Any]:
+        return await transcribe_array(
+            audio, language=window_language, task=task, temperature=temperature, longform=False, model=model
+        )
+    
+    transcriber = StreamingTranscriber(transcribe_window, language=language)
+    try:
+        async for event in transcriber.events(decoder):
+            yield event
+    except AudioDecodeError as e:
+        yield {"type": "error", "detail": str(e)}
+
+
+# Streaming transcription over WebSocket
+@app.websocket("/transcribe/stream")
+async def transcribe_stream_ws(
+    websocket: WebSocket,
+    language: Optional[str] = None,
+    task: str = "transcribe",
+    temperature: float = 0.0,
+    format: str = "pcm_s16le",
+    sample_rate: int = SAMPLE_RATE,
+    model: Optional[str] = None
+):
+    """
+    Transcribe audio while it is being captured
+    
+    Send audio as binary frames (raw 16-bit PCM by default; `format` also
+    accepts pcm_f32le, webm, ogg, wav, mp3 or auto) and a text frame "end"
+    when done. Finalized words arrive as `segment` events, the unstable
+    tail of the transcript as `partial` events, then one `done` event.
+    """
+    await websocket.accept()
+    try:
+        input_args = stream_input_args(format, sample_rate)
+        model = resolve_model(model)
+    except (ValueError, HTTPException) as e:
+        await websocket.send_json({"type": "error", "detail": getattr(e, "detail", str(e))})
+        await websocket.close(code=1003)
+        return
+    if not model_ready():
+        await websocket.send_json({"type": "error", "detail": "Whisper model not loaded"})
+        await websocket.close(code=1011)
+        return
+    
+    decoder = AudioDecoder(input_args=input_args)
+    await decoder.start()
+    
+    async def feed():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    await decoder.write(message["bytes"])
+                elif message.get("text", "").strip() == "end":
+                    break
+        finally:
+            await decoder.close()
+    
+    feeder = asyncio.create_task(feed())
+    try:
+        async for event in stream_events(decoder, language=language, task=task, temperature=temperature, model=model):
+            await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        feeder.cancel()
+        decoder.abort()
+
+
+# Streaming transcription over chunked HTTP
+@app.post(
+    "/transcribe/stream",
+    openapi_extra={
+        "requestBody": {"required": True, "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}}}
+    }
+)
+async def transcribe_stream_http(
+    request: Request,
+    language: Optional[str] = None,
+    task: str = "transcribe",
+    temperature: float = 0.0,
+    format: str = "pcm_s16le",
+    sample_rate: int = SAMPLE_RATE,
+    model: Optional[str] = None
+):
+    """
+    Transcribe a chunked request body while it is being uploaded
+    
+    Same audio formats and events as the WebSocket endpoint; the events are
+    returned as NDJSON lines while the body is still being received.
+    """
+    try:
+        input_args = stream_input_args(format, sample_rate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    model = resolve_model(model)
+    if not model_ready():
+        raise HTTPException(status_code=503, detail="Whisper model not loaded")
+    
+    decoder = AudioDecoder(input_args=input_args)
+    await decoder.start()
+    
+    async def feed():
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    await decoder.write(chunk)
+        finally:
+            await decoder.close()
+    
+    async def ndjson_events():
+        feeder = asyncio.create_task(feed())
+        try:
+            async for event in stream_events(decoder, language=language, task=task, temperature=temperature, model=model):
+                yield json.dumps(event) + "\n"
+        finally:
+            feeder.cancel()
+            decoder.abort()
+    
+    return DuplexStreamingResponse(ndjson_events(), media_type="application/x-ndjson")
+
+
+# Asynchronous transcription jobs
+@app.post(
+    "/jobs",
+    response_model=JobResponse,
+    status_code=202,
+    openapi_extra=multipart_form_schema({
+        "file": {"type": "string", "format": "binary"},
+        "language": {"type": "string"},
+        "task": {"type": "string", "default": "transcribe"},
+        "temperature": {"type": "number", "default": 0.0},
+        "longform": {"type": "string", "enum": ["auto", "true", "false"], "default": "auto"},
+        "model": {"type": "string", "description": "Whisper model (default: MODEL_SIZE)"},
+        "webhook_url": {"type": "string"},
+    }, ["file"])
+)
+async def submit_job(request: Request):
+    """
+    Queue an audio file for transcription and return immediately
+    
+    The upload is stored for the job workers; poll `status_url` or pass a
+    `webhook_url` to be sent `{"job_id", "status", "result" | "error"}` when
+    the job finishes (signed with `X-Whisper-Signature` if WEBHOOK_SECRET is set).
+    """
+    job_id = new_job_id()
+    spool: Optional[UploadSpool] = None
+    filename = None
+    
+    async def open_file(field_name: str, upload_name: str) -> Optional[UploadSpool]:
+        nonlocal spool, filename
+        if field_name != "file" or spool is not None:
+            return None
+        file_ext = os.path.splitext(upload_name)[1].lower()
+        open_decoder(file_ext)  # validates the extension
+        filename = upload_name
+        spool = UploadSpool(job_id, file_ext)
+        await spool.start()
+        return spool
+    
+    try:
+        fields = await parse_streaming_form(request, open_file)
+        if spool is None:
+            raise HTTPException(status_code=422, detail="Missing form field: file")
+        
+        try:
+            temperature = float(fields.get("temperature") or 0.0)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="temperature must be a number")
+        options = {
+            "language": fields.get("language") or None,
+            "task": fields.get("task") or "transcribe",
+            "temperature": temperature,
+            "longform": parse_longform(fields.get("longform")),
+            "model": resolve_model(fields.get("model")),
+        }
+        webhook_url = fields.get("webhook_url") or None
+        if webhook_url is not None:
+            try:
+                await asyncio.to_thread(check_webhook_url, webhook_url)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+        
+        try:
+            await asyncio.to_thread(job_queue.submit, job_id, {
+                "filename": filename,
+                "audio_path": spool.path,
+                "audio_hash": spool.content_hash,
+                "options": json.dumps(options),
+                "webhook_url": webhook_url,
             })
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Job queue unavailable: {e}")
+    except FormParseError as e:
+        if spool is not None:
+            spool.abort()
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        if spool is not None:
+            spool.abort()
+        raise
+    
+    return JobResponse(
+        job_id=job_id,
+        status="queued",
+        status_url=f"/jobs/{job_id}",
+        result_url=f"/jobs/{job_id}/result"
+    )
+
+
+async def get_job_or_404(job_id: str) -> Dict[str, Any]:
+    try:
+        job = await asyncio.to_thread(job_queue.get, job_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Job queue unavailable: {e}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    """Status of a transcription job"""
+    job = await get_job_or_404(job_id)
+    queue_position = None
+    if job["status"] == "queued":
+        queue_position = await asyncio.to_thread(job_queue.queue_position, job_id)
+    return JobStatusResponse(
+        job_id=job_id,
+        status=job["status"],
+        filename=job.get("filename"),
+        created_at=job.get("created_at"),
+        started_at=job.get("started_at"),
+        finished_at=job.get("finished_at"),
+        queue_position=queue_position,
+        attempts=int(job.get("attempts") or 0),
+        error=job.get("error"),
+        webhook=job.get("webhook")
+    )
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, response_format: str = "json"):
+    """Result of a completed job, in any `/transcribe` response format"""
+    job = await get_job_or_404(job_id)
+    if job["status"] != "completed":
+        detail = f"Job is {job['status']}"
+        if job.get("error"):
+            detail += f": {job['error']}"
+        raise HTTPException(status_code=409, detail=detail)
+    return format_transcription(json.loads(job["result"]), response_format)
+
+
+@app.delete("/jobs/{job_id}", response_model=JobStatusResponse)
+async def cancel_job(job_id: str):
+    """Cancel a job that has not started yet"""
+    job = await get_job_or_404(job_id)
+    if job["status"] == "queued" and await asyncio.to_thread(job_queue.cancel, job_id):
+        remove_upload(job.get("audio_path"))
+        return await get_job_status(job_id)
+    if job["status"] == "cancelled":
+        return await get_job_status(job_id)
+    raise HTTPException(status_code=409, detail=f"Job is {job['status']} and can no longer be cancelled")
+
+
+class ModelReloadRequest(BaseModel):
+    checkpoint: Optional[str] = None  # new weights for the model name; default: reload the current ones
+
+
+@app.get("/models")
+async def list_models():
+    """Models that can be requested, and which are loaded right now"""
+    return {
+        "default": MODEL_SIZE,
+        "available": model_names(),
+        **(model_registry.stats() if model_registry is not None else {}),
+    }
+
+
+def require_admin(admin_key: Optional[str]):
+    """Model management changes what every request runs on, so it needs MODEL_ADMIN_KEY"""
+    if not MODEL_ADMIN_KEY:
+        raise HTTPException(status_code=403, detail="Model management is disabled (MODEL_ADMIN_KEY is not set)")
+    if not admin_key or not hmac.compare_digest(admin_key.encode(), MODEL_ADMIN_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Key")
+
+
+def require_registry(name: str) -> ModelRegistry:
+    if model_registry is None:
+        raise HTTPException(status_code=503, detail="Whisper model not loaded")
+    if not model_registry.is_allowed(name):
+        raise HTTPException(status_code=404, detail=f"Unknown model. Allowed: {', '.join(model_names())}")
+    return model_registry
+
+
+@app.post("/models/{name}/load")
+async def load_model(name: str, x_admin_key: Optional[str] = Header(default=None)):
+    """Load a model ahead of its first request"""
+    require_admin(x_admin_key)
+    registry = require_registry(name)
+    try:
+        await registry.load(name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load {name}: {e}")
+    return registry.stats()
+
+
+@app.post("/models/{name}/reload")
+async def reload_model(
+    name: str,
+    body: Optional[ModelReloadRequest] = None,
+    x_admin_key: Optional[str] = Header(default=None)
+):
+    """
+    Hot-swap a model to new weights
     
-    return {"results": results}
+    The new version loads alongside the old one; new requests switch over
+    once it is ready and in-flight requests finish on the old version.
+    """
+    require_admin(x_admin_key)
+    registry = require_registry(name)
+    checkpoint = body.checkpoint if body is not None else None
+    if checkpoint:
+        try:
+            checkpoint = resolve_checkpoint(checkpoint)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        entry = await registry.swap(name, checkpoint)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to reload {name}: {e}")
+    return {"name": name, "version": entry.version, **registry.stats()}
+
+
+@app.delete("/models/{name}")
+async def unload_model(name: str, x_admin_key: Optional[str] = Header(default=None)):
+    """Unload a model (requests using it finish first)"""
+    require_admin(x_admin_key)
+    registry = require_registry(name)
+    if not await registry.unload(name):
+        raise HTTPException(status_code=404, detail="Model not loaded")
+    return registry.stats()
 
 
 if __name__ == "__main__":
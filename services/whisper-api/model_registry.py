@@ -0,0 +1,367 @@
+"""
+Model registry module
+Whisper models loaded on demand and kept under a memory budget.
+
+Requests name the model they want (`model` form field); the registry loads it
+on first use, keeps recently used models resident and evicts the least
+recently used idle ones when loading another would exceed
+MODEL_MEMORY_BUDGET_MB. WARM_MODELS are loaded at startup.
+
+Every request holds a lease on the model while it runs, so a model is never
+unloaded under a request. Reloading a model (e.g. to pick up a new
+checkpoint) loads the new version next to the old one and switches new
+requests over at once; the old version is unloaded when its last lease ends
+(the two may exceed the budget meanwhile). A load waiting for leases to free
+memory does not hold up other loads.
+"""
+
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import gc
+import os
+import time
+
+import numpy as np
+
+from scheduler import N_SAMPLES, InferenceScheduler, make_whisper_decoder
+
+# Configuration
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))  # 0 = no limit
+WARM_MODELS = os.getenv("WARM_MODELS", "")  # comma-separated; default: MODEL_SIZE
+ALLOWED_MODELS = os.getenv("ALLOWED_MODELS", "")  # comma-separated; default: every official model
+MODEL_CHECKPOINT_DIR = os.getenv("MODEL_CHECKPOINT_DIR", "/models")  # reload checkpoints must be under here
+
+# Approximate parameter counts, used to budget a model before it is first loaded
+MODEL_PARAMETERS = {
+    "tiny": 39e6, "base": 74e6, "small": 244e6, "medium": 769e6,
+    "large": 1550e6, "turbo": 809e6,
+}
+
+
+def resolve_checkpoint(path: str) -> str:
+    """
+    Real path of a reload checkpoint, which must be a file inside
+    MODEL_CHECKPOINT_DIR: loading one unpickles it, so arbitrary paths would
+    let a caller run code from any file the service can read
+    """
+    root = os.path.realpath(MODEL_CHECKPOINT_DIR)
+    checkpoint = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, checkpoint]) != root:
+        raise ValueError(f"Checkpoint must be inside {MODEL_CHECKPOINT_DIR}")
+    if not os.path.isfile(checkpoint):
+        raise ValueError(f"Checkpoint not found: {path}")
+    return checkpoint
+
+
+def estimate_bytes(checkpoint: str) -> int:
+    """Rough fp32 footprint of a model by name (used until it has been measured)"""
+    name = os.path.basename(checkpoint).lower()
+    for key in ("turbo", "large", "medium", "small", "base", "tiny"):
+        if key in name:
+            return int(MODEL_PARAMETERS[key] * 4)
+    return int(MODEL_PARAMETERS["large"] * 4)
+
+
+def model_bytes(model) -> int:
+    """Bytes held by a model's weights and buffers (including int8 packed weights)"""
+    def size(value) -> int:
+        if hasattr(value, "element_size"):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(size(item) for item in value)
+        return 0
+
+    return sum(size(value) for value in model.state_dict().values())
+
+
+class LocalModel:
+    """An in-process model behind its own batching scheduler"""
+
+    def __init__(self, model, device: str):
+        self.model = model
+        self.scheduler = InferenceScheduler(make_whisper_decoder(model, device))
+        self.memory_bytes = model_bytes(model)
+
+    async def start(self):
+        await self.scheduler.start()
+
+    async def stop(self):
+        await self.scheduler.stop()
+        self.model = None
+
+    async def transcribe(
+        self,
+        audio: np.ndarray,
+        language: Optional[str] = None,
+        task: str = "transcribe",
+        temperature: float = 0.0
+    ) -> Dict[str, Any]:
+        """Single-window clips are micro-batched; longer audio runs a full transcribe"""
+        if len(audio) <= N_SAMPLES:
+            return await self.scheduler.submit(
+                audio, language=language, task=task, temperature=temperature, word_timestamps=True
+            )
+        return await self.scheduler.run(
+            self.model.transcribe,
+            audio,
+            language=language,
+            task=task,
+            temperature=temperature,
+            word_timestamps=True,
+            verbose=False
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return self.scheduler.stats()
+
+
+@dataclass
+class LoadedModel:
+    """One loaded version of a model and the requests using it"""
+    name: str
+    version: str
+    backend: Any
+    memory_bytes: int
+    workers: int = 0  # pool worker processes (each pinned to a core set)
+    leases: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    retired: bool = False
+
+
+class ModelRegistry:
+    """
+    Loads models through `loader(checkpoint, replaces)` and bounds their
+    total memory and pool workers.
+
+    The loader returns a started backend with `transcribe()`, `stop()`,
+    `stats()` and a `memory_bytes` attribute (LocalModel or WorkerPool, which
+    also has `workers`); `replaces` is the backend of the version a swap
+    replaces, else None. With `worker_budget`, each load needs
+    `workers_per_model` of the budget's workers, like memory.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str, Any], Awaitable[Any]],
+        budget_bytes: int = 0,
+        allowed: Optional[List[str]] = None,
+        worker_budget: int = 0,
+        workers_per_model: int = 0
+    ):
+        self.loader = loader
+        self.budget_bytes = budget_bytes
+        self.worker_budget = worker_budget
+        self.workers_per_model = workers_per_model
+        self.allowed = set(allowed) if allowed else None
+        self._loaded: "OrderedDict[str, LoadedModel]" = OrderedDict()  # least recently used first
+        self._retired: List[LoadedModel] = []
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._checkpoints: Dict[str, str] = {}
+        self._measured: Dict[str, int] = {}
+        self._admission = asyncio.Lock()
+        self._released = asyncio.Event()
+        self.loads = 0
+        self.evictions = 0
+
+    def is_allowed(self, name: str) -> bool:
+        return self.allowed is None or name in self.allowed
+
+    def checkpoint(self, name: str) -> str:
+        """Model name or checkpoint path that `name` currently loads from"""
+        return self._checkpoints.get(name, name)
+
+    def version(self, name: str) -> str:
+        """Identifies the weights `name` serves; changes when it is swapped to new weights"""
+        checkpoint = self.checkpoint(name)
+        if os.path.isfile(checkpoint):
+            return f"{checkpoint}@{int(os.path.getmtime(checkpoint))}"
+        return checkpoint
+
+    def used_bytes(self) -> int:
+        return sum(entry.memory_bytes for entry in [*self._loaded.values(), *self._retired])
+
+    def used_workers(self) -> int:
+        return sum(entry.workers for entry in [*self._loaded.values(), *self._retired])
+
+    @asynccontextmanager
+    async def lease(self, name: str) -> AsyncIterator[Any]:
+        """Use a model's backend, loading it first if needed; it stays loaded until released"""
+        entry = await self._acquire(name)
+        try:
+            yield entry.backend
+        finally:
+            await self._release(entry)
+
+    async def _acquire(self, name: str) -> LoadedModel:
+        while True:
+            entry = self._loaded.get(name)
+            if entry is not None:
+                entry.leases += 1
+                entry.last_used = time.monotonic()
+                self._loaded.move_to_end(name)
+                return entry
+            # Concurrent first requests share one load
+            task = self._loading.get(name)
+            if task is None:
+                task = asyncio.create_task(self._load(name))
+                self._loading[name] = task
+                task.add_done_callback(lambda _: self._loading.pop(name, None))
+            await asyncio.shield(task)
+
+    async def _release(self, entry: LoadedModel):
+        entry.leases -= 1
+        entry.last_used = time.monotonic()
+        if entry.retired and entry.leases == 0 and entry in self._retired:
+            self._retired.remove(entry)
+            await self._stop(entry)
+        self._released.set()
+
+    async def load(self, name: str):
+        """Make sure a model is loaded (startup warm-up, admin preload)"""
+        async with self.lease(name):
+            pass
+
+    async def _load(self, name: str, replace: bool = False) -> LoadedModel:
+        checkpoint = self.checkpoint(name)
+        while True:
+            async with self._admission:
+                if name in self._loaded and not replace:
+                    return self._loaded[name]
+                needed = self._measured.get(checkpoint) or estimate_bytes(checkpoint)
+                if await self._make_room(needed, replacing=name if replace else None):
+                    print(f"Loading Whisper model {name} ({checkpoint})...")
+                    replaced = self._loaded.get(name) if replace else None
+                    backend = await self.loader(checkpoint, replaced.backend if replaced else None)
+                    entry = LoadedModel(
+                        name, self.version(name), backend, int(getattr(backend, "memory_bytes", needed)),
+                        workers=getattr(backend, "workers", 0)
+                    )
+                    self._measured[checkpoint] = entry.memory_bytes
+                    self.loads += 1
+
+                    previous = self._loaded.pop(name, None)
+                    self._loaded[name] = entry
+                    if previous is not None:
+                        await self._retire(previous)
+                    print(f"Whisper model {name} loaded ({entry.memory_bytes / 2**20:.0f} MB)")
+                    return entry
+                # Everything resident is in use: wait for a request to finish, without
+                # holding up loads that do fit, then check again
+                self._released.clear()
+            await self._released.wait()
+
+    async def _make_room(self, needed: int, replacing: Optional[str] = None) -> bool:
+        """
+        Evict idle models, least recently used first, until `needed` more bytes
+        (and `workers_per_model` more pool workers) fit the budgets. False if
+        they only fit once in-use models are released.
+
+        A swap doesn't count the version it replaces: memory may exceed the
+        budget until that version's last request finishes and it is unloaded
+        (its pool workers share the replaced pool's cores meanwhile).
+        """
+        replaced = self._loaded.get(replacing)
+
+        def over_budget() -> bool:
+            if self.budget_bytes:
+                used = self.used_bytes() - (replaced.memory_bytes if replaced else 0)
+                if used + needed > self.budget_bytes:
+                    return True
+            if self.worker_budget:
+                used = self.used_workers() - (replaced.workers if replaced else 0)
+                if used + self.workers_per_model > self.worker_budget:
+                    return True
+            return False
+
+        while over_budget():
+            idle = [entry for name, entry in self._loaded.items() if entry.leases == 0 and name != replacing]
+            if idle:
+                self.evictions += 1
+                await self._unload(idle[0])
+                continue
+            in_use = [entry for name, entry in self._loaded.items() if entry.leases and name != replacing]
+            if not in_use and not self._retired:
+                # Nothing left to free: a model larger than the budget still has to load
+                print(f"Warning: model needs {needed / 2**20:.0f} MB, over MODEL_MEMORY_BUDGET_MB")
+                return True
+            return False
+        return True
+
+    async def _retire(self, entry: LoadedModel):
+        """Take a replaced version out of service once its requests are done"""
+        entry.retired = True
+        if entry.leases == 0:
+            await self._stop(entry)
+        else:
+            self._retired.append(entry)
+
+    async def _unload(self, entry: LoadedModel):
+        if self._loaded.get(entry.name) is entry:
+            del self._loaded[entry.name]
+        await self._retire(entry)
+
+    async def _stop(self, entry: LoadedModel):
+        print(f"Unloading Whisper model {entry.name} ({entry.version})")
+        await entry.backend.stop()
+        entry.backend = None
+        gc.collect()
+        try:
+            import torch
+
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    async def swap(self, name: str, checkpoint: Optional[str] = None) -> LoadedModel:
+        """
+        Hot-swap a model to new weights (a checkpoint path, or reload the
+        current one) without interrupting requests already using it
+        """
+        if checkpoint:
+            self._checkpoints[name] = checkpoint
+        return await self._load(name, replace=True)
+
+    async def unload(self, name: str) -> bool:
+        """Unload a model now (in-flight requests finish first); False if not loaded"""
+        entry = self._loaded.get(name)
+        if entry is None:
+            return False
+        await self._unload(entry)
+        return True
+
+    async def stop(self):
+        for entry in [*self._loaded.values()]:
+            await self._unload(entry)
+        for entry in self._retired:
+            await self._stop(entry)
+        self._retired = []
+
+    def backend_stats(self, name: str) -> Optional[Dict[str, Any]]:
+        """Batching or worker pool counters of a loaded model"""
+        entry = self._loaded.get(name)
+        return entry.backend.stats() if entry is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "budget_mb": round(self.budget_bytes / 2**20) if self.budget_bytes else None,
+            "used_mb": round(self.used_bytes() / 2**20),
+            "pool_workers": {"used": self.used_workers(), "budget": self.worker_budget} if self.worker_budget else None,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "loaded": [
+                {
+                    "name": entry.name,
+                    "version": entry.version,
+                    "memory_mb": round(entry.memory_bytes / 2**20),
+                    "in_flight": entry.leases,
+                    "idle_seconds": round(now - entry.last_used, 1) if entry.leases == 0 else 0.0,
+                }
+                for entry in reversed(self._loaded.values())
+            ],
+            "draining": [{"name": entry.name, "version": entry.version, "in_flight": entry.leases} for entry in self._retired],
+        }
@@ -0,0 +1,291 @@
+"""
+Inference scheduler
+Dynamic micro-batching in front of the shared Whisper model.
+
+Requests for clips that fit in a single 30-second window are queued and
+decoded together: the scheduler waits for the first request, then keeps
+collecting until it has BATCH_MAX_SIZE requests or BATCH_MAX_WAIT_MS has
+passed, and runs one batched `whisper.decode` for the lot. Everything that
+touches the model (batches and full-length `transcribe` calls) runs on a
+single inference thread, so concurrent requests never contend for it.
+
+Raise BATCH_MAX_WAIT_MS for throughput, lower it (or set BATCH_MAX_SIZE=1)
+for latency.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import math
+import os
+import time
+
+import numpy as np
+
+# Configuration
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+# Whisper audio constants (kept here so the scheduler imports without whisper)
+SAMPLE_RATE = 16000
+HOP_LENGTH = 160
+TIME_PRECISION = 0.02  # seconds per timestamp token
+CHUNK_LENGTH = 30  # seconds per decoding window
+N_SAMPLES = CHUNK_LENGTH * SAMPLE_RATE
+
+
+@dataclass
+class BatchItem:
+    """One queued clip and the future its result is delivered to"""
+    audio: np.ndarray
+    language: Optional[str]
+    task: str
+    temperature: float
+    word_timestamps: bool
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def options_key(self) -> Tuple[Any, ...]:
+        """Requests can only share a decode call when their options match"""
+        return (self.language, self.task, self.temperature)
+
+
+class InferenceScheduler:
+    """
+    Collects single-window requests into batches and owns the inference thread.
+
+    `decode_batch` receives a list of BatchItems with identical options and
+    returns one result per item, in order.
+    """
+
+    def __init__(
+        self,
+        decode_batch: Callable[[List[BatchItem]], List[Dict[str, Any]]],
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS
+    ):
+        self.decode_batch = decode_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper-inference")
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: List[BatchItem] = []
+        self._task: Optional[asyncio.Task] = None
+        self._batches = 0
+        self._batched_items = 0
+        self._max_seen = 0
+
+    async def start(self):
+        """Start the batching loop on the running event loop"""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop batching and fail anything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for item in self._drain():
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("Inference scheduler stopped"))
+        self._executor.shutdown(wait=False)
+
+    async def submit(
+        self,
+        audio: np.ndarray,
+        language: Optional[str] = None,
+        task: str = "transcribe",
+        temperature: float = 0.0,
+        word_timestamps: bool = True
+    ) -> Dict[str, Any]:
+        """Queue a clip of at most 30 seconds and wait for its transcription"""
+        if len(audio) > N_SAMPLES:
+            raise ValueError("Clip is longer than one decoding window; use run() instead")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(BatchItem(audio, language, task, temperature, word_timestamps, future))
+        return await future
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run arbitrary model work (e.g. a full transcribe) on the inference thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        """Batching counters for the health endpoint"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self._batches,
+            "avg_batch_size": round(self._batched_items / self._batches, 2) if self._batches else 0.0,
+            "largest_batch": self._max_seen,
+            "queued": len(self._pending) + (self._queue.qsize() if self._queue else 0),
+        }
+
+    def _drain(self) -> List[BatchItem]:
+        items, self._pending = self._pending, []
+        while self._queue is not None and not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    async def _collect(self) -> List[BatchItem]:
+        """Wait for one request, then gather compatible ones until full or timed out"""
+        if not self._pending:
+            self._pending.append(await self._queue.get())
+
+        deadline = self._pending[0].enqueued_at + self.max_wait
+        while len(self._pending) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                self._pending.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Pick up anything that arrived while the previous batch was decoding
+        while len(self._pending) < self.max_batch_size * 2 and not self._queue.empty():
+            self._pending.append(self._queue.get_nowait())
+
+        # Oldest request decides the options; the rest wait for a later batch
+        key = self._pending[0].options_key
+        batch = [item for item in self._pending if item.options_key == key][:self.max_batch_size]
+        chosen = set(map(id, batch))
+        self._pending = [item for item in self._pending if id(item) not in chosen]
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Requests whose callers went away (client disconnects) are skipped
+            batch = [item for item in batch if not item.future.cancelled()]
+            if not batch:
+                continue
+
+            self._batches += 1
+            self._batched_items += len(batch)
+            self._max_seen = max(self._max_seen, len(batch))
+            try:
+                results = await loop.run_in_executor(self._executor, self.decode_batch, batch)
+            except Exception as e:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+            for item, result in zip(batch, results):
+                if not item.future.done():
+                    item.future.set_result(result)
+
+
+def make_whisper_decoder(model, device: str) -> Callable[[List[BatchItem]], List[Dict[str, Any]]]:
+    """
+    Build a batch decode function for a loaded Whisper model.
+
+    The batch's mel spectrograms are computed in one call and decoded with a
+    single `whisper.decode`. Results have the same shape as
+    `whisper.transcribe` output: segments are cut at the decoded timestamp
+    tokens and word timestamps are aligned per clip after the batched decode.
+    """
+    import torch
+    import whisper
+    from whisper.timing import add_word_timestamps
+    from whisper.tokenizer import get_tokenizer
+
+    n_mels = model.dims.n_mels
+    fp16 = device == "cuda"
+
+    def decode_batch(items: List[BatchItem]) -> List[Dict[str, Any]]:
+        first = items[0]
+        audio = torch.from_numpy(np.stack([whisper.pad_or_trim(item.audio) for item in items]))
+        mel = whisper.log_mel_spectrogram(audio.to(model.device), n_mels)
+
+        options = whisper.DecodingOptions(
+            task=first.task,
+            language=first.language,
+            temperature=first.temperature,
+            without_timestamps=False,
+            fp16=fp16,
+        )
+        with torch.no_grad():
+            decoded = whisper.decode(model, mel, options)
+
+        results = []
+        for index, (item, result) in enumerate(zip(items, decoded)):
+            duration = len(item.audio) / SAMPLE_RATE
+            # Same no-speech rule whisper.transcribe applies per window
+            silent = result.no_speech_prob > 0.6 and result.avg_logprob < -1.0
+            text = "" if silent else result.text.strip()
+            tokenizer = get_tokenizer(
+                model.is_multilingual,
+                num_languages=model.num_languages,
+                language=result.language,
+                task=item.task,
+            )
+            segments = [] if silent else segments_from_tokens(list(result.tokens), tokenizer, duration)
+            for segment in segments:
+                segment.update({
+                    "temperature": item.temperature,
+                    "avg_logprob": result.avg_logprob,
+                    "compression_ratio": result.compression_ratio,
+                    "no_speech_prob": result.no_speech_prob,
+                })
+
+            if segments and item.word_timestamps:
+                add_word_timestamps(
+                    segments=segments,
+                    model=model,
+                    tokenizer=tokenizer,
+                    mel=mel[index],
+                    num_frames=math.ceil(len(item.audio) / HOP_LENGTH),
+                    last_speech_timestamp=0.0,
+                )
+
+            results.append({"text": text, "segments": segments, "language": result.language})
+        return results
+
+    return decode_batch
+
+
+def segments_from_tokens(tokens: List[int], tokenizer, duration: float) -> List[Dict[str, Any]]:
+    """
+    Split one window's decoded tokens into timestamped segments.
+
+    Mirrors whisper.transcribe: a segment ends where two timestamp tokens are
+    adjacent (or at a single trailing timestamp); a final segment without a
+    closing timestamp runs to the end of the clip.
+    """
+    begin = tokenizer.timestamp_begin
+    is_timestamp = [token >= begin for token in tokens]
+    cuts = [i for i in range(1, len(tokens)) if is_timestamp[i] and is_timestamp[i - 1]]
+    if len(tokens) >= 2 and is_timestamp[-1] and not is_timestamp[-2]:
+        cuts.append(len(tokens))
+
+    pieces, last = [], 0
+    for cut in cuts:
+        pieces.append(tokens[last:cut])
+        last = cut
+    if last < len(tokens):
+        pieces.append(tokens[last:])
+
+    segments = []
+    for piece in pieces:
+        text_tokens = [token for token in piece if token < tokenizer.eot]
+        if not text_tokens:
+            continue
+        previous_end = segments[-1]["end"] if segments else 0.0
+        start = (piece[0] - begin) * TIME_PRECISION if piece[0] >= begin else previous_end
+        end = (piece[-1] - begin) * TIME_PRECISION if len(piece) > 1 and piece[-1] >= begin else duration
+        start = min(max(start, previous_end), duration)
+        segments.append({
+            "id": len(segments),
+            "seek": 0,
+            "start": round(start, 3),
+            "end": round(min(max(end, start), duration), 3),
+            "text": tokenizer.decode(text_tokens).strip(),
+            "tokens": piece,
+        })
+    return segments
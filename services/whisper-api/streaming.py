@@ -0,0 +1,201 @@
+"""
+Streaming transcription module
+Incremental transcription of audio that is still arriving (live captioning,
+voice briefs that downstream planning can start on early).
+
+Decoded audio accumulates in a rolling buffer. Every STREAM_STEP_SECONDS of
+new audio the buffer is re-transcribed, and words are finalized by local
+agreement: a word is emitted once two consecutive passes produce it at the
+same position. Finalized words are sent as a segment; the rest of the latest
+hypothesis is sent as a partial. The buffer keeps already-finalized audio as
+context and is trimmed at the last finalized word once it grows past
+STREAM_TRIM_SECONDS, so every pass fits in one 30-second Whisper window.
+
+Events (dicts, sent as JSON):
+    {"type": "segment", "id", "start", "end", "text", "words"}
+    {"type": "partial", "start", "end", "text"}
+    {"type": "done", "text", "language", "duration"}
+"""
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import os
+import re
+
+from starlette.responses import StreamingResponse
+
+from audio_io import AudioDecoder
+from scheduler import SAMPLE_RATE
+
+# Configuration
+STREAM_STEP_SECONDS = float(os.getenv("STREAM_STEP_SECONDS", "1.0"))  # new audio between passes
+STREAM_TRIM_SECONDS = float(os.getenv("STREAM_TRIM_SECONDS", "15"))  # buffer length that triggers a trim
+STREAM_MAX_BUFFER_SECONDS = 25  # force-finalize before the buffer outgrows one window
+FORCE_HOLD_SECONDS = 5  # audio kept unfinalized when forcing
+
+# ffmpeg input options per stream format; raw PCM needs them, containers are probed
+STREAM_FORMATS = {
+    "pcm_s16le": ["-f", "s16le", "-ac", "1"],
+    "pcm_f32le": ["-f", "f32le", "-ac", "1"],
+    "webm": ["-f", "matroska"],
+    "ogg": ["-f", "ogg"],
+    "wav": ["-f", "wav"],
+    "mp3": ["-f", "mp3"],
+    "auto": [],
+}
+
+_WORD_CHARS = re.compile(r"[^\w']+")
+
+
+def stream_input_args(stream_format: str, sample_rate: int) -> List[str]:
+    """ffmpeg input options for a stream format; raises ValueError if unknown"""
+    if stream_format not in STREAM_FORMATS:
+        raise ValueError(f"Unsupported format. Allowed: {', '.join(STREAM_FORMATS)}")
+    args = list(STREAM_FORMATS[stream_format])
+    if stream_format.startswith("pcm_"):
+        args += ["-ar", str(sample_rate)]
+    return args
+
+
+def _normalize(word: str) -> str:
+    return _WORD_CHARS.sub("", word.lower())
+
+
+class StreamingTranscriber:
+    """
+    Turns a growing AudioDecoder into segment/partial events.
+
+    `transcribe(audio, language)` transcribes one buffer (at most one
+    window) and returns a Whisper-shaped result with word timestamps.
+    """
+
+    def __init__(
+        self,
+        transcribe: Callable[[Any, Optional[str]], Awaitable[Dict[str, Any]]],
+        language: Optional[str] = None
+    ):
+        self.transcribe = transcribe
+        self.language = language
+        self.buffer_start = 0  # samples
+        self.committed_end = 0.0  # seconds
+        self.hypothesis: List[Dict[str, Any]] = []
+        self.segments: List[Dict[str, Any]] = []
+
+    async def events(self, decoder: AudioDecoder) -> AsyncIterator[Dict[str, Any]]:
+        step = int(STREAM_STEP_SECONDS * SAMPLE_RATE)
+        processed = 0
+        while True:
+            available = await decoder.wait_for_samples(processed + step)
+            final = decoder.finished
+            if final:
+                # Surface decode failures instead of finalizing a truncated transcript
+                await decoder.wait()
+            processed = available
+
+            if available - self.buffer_start > 0:
+                audio = decoder.samples(self.buffer_start, available)
+                result = await self.transcribe(audio, self.language)
+                if self.language is None:
+                    self.language = result.get("language")
+                words = self._new_words(result)
+            else:
+                words = []
+
+            commit = words if final else self._agreed(words, available)
+            if commit:
+                yield self._commit(commit)
+            self.hypothesis = words[len(commit):]
+
+            if final:
+                yield {
+                    "type": "done",
+                    "text": " ".join(segment["text"] for segment in self.segments),
+                    "language": self.language,
+                    "duration": round(available / SAMPLE_RATE, 3),
+                }
+                return
+
+            if self.hypothesis:
+                yield {
+                    "type": "partial",
+                    "start": self.hypothesis[0]["start"],
+                    "end": self.hypothesis[-1]["end"],
+                    "text": "".join(word["word"] for word in self.hypothesis).strip(),
+                }
+            self._trim(decoder, available)
+
+    def _new_words(self, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Words of this pass in global time, minus those already finalized"""
+        offset = self.buffer_start / SAMPLE_RATE
+        words = []
+        for segment in result.get("segments", []):
+            for word in segment.get("words") or []:
+                start, end = word["start"] + offset, word["end"] + offset
+                if (start + end) / 2 <= self.committed_end:
+                    continue
+                words.append({
+                    "word": word["word"],
+                    "start": round(start, 3),
+                    "end": round(end, 3),
+                    "probability": word.get("probability"),
+                })
+        return words
+
+    def _agreed(self, words: List[Dict[str, Any]], available: int) -> List[Dict[str, Any]]:
+        """Longest prefix this pass shares with the previous one"""
+        agreed = 0
+        for previous, current in zip(self.hypothesis, words):
+            if _normalize(previous["word"]) != _normalize(current["word"]):
+                break
+            agreed += 1
+        commit = words[:agreed]
+
+        # Never let the buffer outgrow a window waiting for agreement
+        buffered = (available - self.buffer_start) / SAMPLE_RATE
+        if buffered > STREAM_MAX_BUFFER_SECONDS:
+            horizon = available / SAMPLE_RATE - FORCE_HOLD_SECONDS
+            forced = [word for word in words if word["end"] <= horizon]
+            if len(forced) > len(commit):
+                commit = forced
+        return commit
+
+    def _commit(self, words: List[Dict[str, Any]]) -> Dict[str, Any]:
+        segment = {
+            "type": "segment",
+            "id": len(self.segments),
+            "start": words[0]["start"],
+            "end": words[-1]["end"],
+            "text": "".join(word["word"] for word in words).strip(),
+            "words": words,
+        }
+        self.segments.append(segment)
+        self.committed_end = words[-1]["end"]
+        return segment
+
+    def _trim(self, decoder: AudioDecoder, available: int):
+        """Drop finalized audio once the buffer is long enough to need it"""
+        buffered = (available - self.buffer_start) / SAMPLE_RATE
+        if buffered <= STREAM_TRIM_SECONDS:
+            return
+        if self.committed_end * SAMPLE_RATE > self.buffer_start:
+            cut = int(self.committed_end * SAMPLE_RATE)
+        elif not self.hypothesis and buffered > STREAM_MAX_BUFFER_SECONDS:
+            # Nothing heard for a whole window: keep only the recent tail
+            cut = available - int(FORCE_HOLD_SECONDS * SAMPLE_RATE)
+        else:
+            return
+        self.buffer_start = cut
+        decoder.discard_before(cut)
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that can be sent while the request body is still being read.
+
+    Starlette's version listens for client disconnects by consuming `receive`,
+    which would swallow the request body chunks the handler is reading.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,82 @@
+"""
+Regression checks for streaming multipart parsing (no ffmpeg or model needed)
+
+    pip install pytest && python -m pytest test_audio_io.py
+"""
+
+import asyncio
+
+import pytest
+
+from audio_io import FormParseError, parse_streaming_form
+
+BOUNDARY = "testboundary"
+
+
+class FakeRequest:
+    def __init__(self, body: bytes, chunk_size: int = 7):
+        self.headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+        self._body = body
+        self._chunk_size = chunk_size
+
+    async def stream(self):
+        for start in range(0, len(self._body), self._chunk_size):
+            yield self._body[start:start + self._chunk_size]
+
+
+class FakeSink:
+    def __init__(self):
+        self.data = b""
+        self.closed = False
+        self.aborted = False
+
+    async def write(self, chunk: bytes):
+        self.data += chunk
+
+    async def close(self):
+        self.closed = True
+
+    def abort(self):
+        self.aborted = True
+
+
+def form_body(audio: bytes = b"RIFF0000WAVEdata") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="language"\r\n\r\n'
+        "en\r\n"
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="clip.wav"\r\n'
+        "Content-Type: audio/wav\r\n\r\n"
+    ).encode() + audio + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def parse(body: bytes):
+    sink = FakeSink()
+
+    async def open_file(field_name: str, filename: str):
+        return sink if field_name == "file" else None
+
+    return sink, asyncio.run(parse_streaming_form(FakeRequest(body), open_file))
+
+
+def test_complete_body_closes_the_file_sink():
+    sink, fields = parse(form_body())
+    assert fields == {"language": "en"}
+    assert sink.data == b"RIFF0000WAVEdata"
+    assert sink.closed and not sink.aborted
+
+
+@pytest.mark.parametrize("cut", [10, 120, -len(f"\r\n--{BOUNDARY}--\r\n")])
+def test_truncated_body_fails_and_aborts_the_file_sink(cut):
+    body = form_body()
+    sink = FakeSink()
+
+    async def open_file(field_name: str, filename: str):
+        return sink
+
+    with pytest.raises(FormParseError, match="Incomplete multipart body"):
+        asyncio.run(parse_streaming_form(FakeRequest(body[:cut]), open_file))
+    assert not sink.closed
+    if sink.data:
+        assert sink.aborted
@@ -0,0 +1,233 @@
+"""
+Transcription cache module
+Content-addressed cache of Whisper results.
+
+Uploads are hashed while they stream in (see audio_io.AudioDecoder), and the
+result of transcribing them is stored under a key built from that hash and
+every option that changes the output. Repeat uploads (jingles, re-sent
+voiceovers, retried jobs) are answered from the cache without touching the
+model, and concurrent identical requests share a single inference.
+
+Backends (TRANSCRIPTION_CACHE):
+    disk   JSON files under TRANSCRIPTION_CACHE_DIR, LRU-evicted past
+           TRANSCRIPTION_CACHE_MAX_MB (default)
+    redis  strings in REDIS_URL with an access-time sorted set, LRU-evicted
+           past TRANSCRIPTION_CACHE_MAX_ENTRIES
+    none   caching disabled (identical concurrent requests still share work)
+"""
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Configuration
+TRANSCRIPTION_CACHE = os.getenv("TRANSCRIPTION_CACHE", "disk").lower()
+TRANSCRIPTION_CACHE_DIR = os.getenv("TRANSCRIPTION_CACHE_DIR", "/tmp/whisper-cache")
+TRANSCRIPTION_CACHE_MAX_MB = float(os.getenv("TRANSCRIPTION_CACHE_MAX_MB", "1024"))
+TRANSCRIPTION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPTION_CACHE_MAX_ENTRIES", "100000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+
+# Bump when the stored result shape changes so old entries are ignored
+CACHE_VERSION = "1"
+
+
+def _to_json(value: Dict[str, Any]) -> bytes:
+    # Whisper results can contain numpy scalars (e.g. word probabilities)
+    return json.dumps(value, default=lambda o: o.tolist() if hasattr(o, "tolist") else str(o)).encode()
+
+
+def cache_key(audio_hash: str, model_size: str, **options) -> str:
+    """Key covering the audio content, the model and every decoding option"""
+    parts = [CACHE_VERSION, audio_hash, model_size]
+    parts += [f"{name}={options[name]!r}" for name in sorted(options)]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+class DiskCache:
+    """One JSON file per entry; least recently read entries are evicted past max_bytes"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()  # oldest access first
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        """Rebuild the LRU order from file mtimes (bumped on every read)"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self._total += size
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = json.loads(f.read())
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]):
+        path = self._path(key)
+        data = _to_json(value)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total += len(data) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(data)
+            evicted = []
+            while self._total > self.max_bytes and len(self._sizes) > 1:
+                old_key, old_size = self._sizes.popitem(last=False)
+                self._total -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.unlink(self._path(old_key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "disk", "entries": len(self._sizes), "bytes": self._total}
+
+
+class RedisCache:
+    """Entries as Redis strings; a sorted set of access times drives LRU eviction"""
+
+    PREFIX = "whisper:cache:"
+    LRU_KEY = "whisper:cache:lru"
+
+    def __init__(self, url: str, max_entries: int):
+        from redis import Redis
+
+        self.redis = Redis.from_url(url)
+        self.max_entries = max_entries
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(self.PREFIX + key)
+        pipe.zadd(self.LRU_KEY, {key: time.time()}, xx=True)
+        data, _ = pipe.execute()
+        return json.loads(data) if data else None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.set(self.PREFIX + key, _to_json(value))
+        pipe.zadd(self.LRU_KEY, {key: time.time()})
+        pipe.zcard(self.LRU_KEY)
+        size = pipe.execute()[-1]
+
+        overflow = size - self.max_entries
+        if overflow > 0:
+            evicted = [member for member, _ in self.redis.zpopmin(self.LRU_KEY, overflow)]
+            if evicted:
+                self.redis.delete(*[self.PREFIX + member.decode() for member in evicted])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "entries": self.redis.zcard(self.LRU_KEY)}
+
+
+class TranscriptionCache:
+    """
+    Async front for a cache backend with single-flight deduplication.
+
+    `get_or_compute(key, compute)` returns `(result, source)` where source is
+    "hit", "miss" or "shared". The lookup and `compute()` run in one task per
+    key; concurrent callers for the same key await that task instead of
+    starting their own, and it keeps running (and fills the cache) even if
+    the caller that started it disconnects.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Tuple[Dict[str, Any], str]:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fill(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            return await asyncio.shield(task)
+
+        self.shared += 1
+        result, _ = await asyncio.shield(task)
+        return result, "shared"
+
+    def _finished(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here so abandoned failures aren't logged as unhandled
+
+    async def _fill(self, key: str, compute) -> Tuple[Dict[str, Any], str]:
+        cached = await self._backend_call("get", key)
+        if cached is not None:
+            self.hits += 1
+            return cached, "hit"
+
+        self.misses += 1
+        result = await compute()
+        await self._backend_call("set", key, result)
+        return result, "miss"
+
+    async def _backend_call(self, method: str, *args):
+        if self.backend is None:
+            return None
+        try:
+            return await asyncio.to_thread(getattr(self.backend, method), *args)
+        except Exception as e:
+            # The cache is an optimization; a broken backend must not fail requests
+            print(f"Transcription cache {method} failed: {e}")
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"hits": self.hits, "misses": self.misses, "shared": self.shared}
+        if self.backend is not None:
+            try:
+                stats.update(self.backend.stats())
+            except Exception as e:
+                stats["error"] = str(e)
+        return stats
+
+
+def create_cache() -> TranscriptionCache:
+    """Build the cache selected by TRANSCRIPTION_CACHE"""
+    try:
+        if TRANSCRIPTION_CACHE == "disk":
+            return TranscriptionCache(DiskCache(TRANSCRIPTION_CACHE_DIR, int(TRANSCRIPTION_CACHE_MAX_MB * 1024 * 1024)))
+        if TRANSCRIPTION_CACHE == "redis":
+            return TranscriptionCache(RedisCache(REDIS_URL, TRANSCRIPTION_CACHE_MAX_ENTRIES))
+    except Exception as e:
+        print(f"Error creating {TRANSCRIPTION_CACHE} transcription cache: {e}")
+    return TranscriptionCache(None)
@@ -0,0 +1,37 @@
+"""
+Whisper job worker
+Runs queued transcription jobs (`POST /jobs`) outside the API process.
+
+Loads the model the same way the API does (batching scheduler on GPU, worker
+pool on CPU with WORKER_POOL_SIZE) and runs JOB_CONCURRENCY jobs at a time so
+they batch on it. Scale out by starting more workers.
+
+    python worker.py
+"""
+
+import asyncio
+import sys
+
+import main
+from jobs import JobRunner
+
+
+async def run_worker():
+    await main.startup_event()
+    if not main.model_ready():
+        print("Whisper model not loaded; worker exiting")
+        sys.exit(1)
+
+    runner = JobRunner(main.job_queue, main.run_transcription_job)
+    print(f"Whisper job worker {runner.worker} running {runner.concurrency} jobs at a time")
+    try:
+        await runner.run_forever()
+    finally:
+        await main.shutdown_event()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_worker())
+    except KeyboardInterrupt:
+        pass
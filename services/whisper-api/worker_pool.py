@@ -0,0 +1,171 @@
+"""
+Worker pool module
+Process pool of Whisper model replicas for CPU deployments.
+
+Each worker process loads its own copy of the model once (in the pool
+initializer), int8-quantized with WHISPER_QUANTIZE=int8, and is pinned to
+its own share of the machine's cores, so N files are transcribed N at a
+time instead of one after another without oversubscribing the CPU.
+
+The cores are split once per process into WORKER_POOL_TOTAL disjoint sets,
+shared by the pools of every loaded model: a pool takes WORKER_POOL_SIZE
+free sets and returns them when it stops, and the model registry counts
+pool workers against that total, so two resident models never pin workers
+to the same cores. GPU
+deployments don't use the pool; there the inference scheduler batches
+concurrent requests on the single model instead.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+import asyncio
+import multiprocessing
+import os
+
+import numpy as np
+
+from cpu_inference import WHISPER_QUANTIZE, available_cores, split_cores
+
+# Configuration
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "0"))  # 0 = no process pool
+# Pool workers across all loaded models; default: one model's pool
+WORKER_POOL_TOTAL = max(int(os.getenv("WORKER_POOL_TOTAL", "0")), WORKER_POOL_SIZE)
+
+# Per-process model, set by the pool initializer
+_worker_model = None
+
+
+class CoreAllocator:
+    """Disjoint core sets for pool workers, handed out to pools and returned when they stop"""
+
+    def __init__(self, workers: int, cores: Optional[List[int]] = None):
+        self.core_sets = split_cores(cores or available_cores(), max(1, workers))
+        self._holders = [0] * len(self.core_sets)
+
+    @property
+    def free(self) -> int:
+        return self._holders.count(0)
+
+    def acquire(self, count: int, share: Optional[List[int]] = None) -> List[int]:
+        """
+        Indexes of `count` free core sets, or the sets `share` holds (a new
+        version of a model runs on its old version's cores while that drains)
+        """
+        if share is not None:
+            slots = list(share)
+        else:
+            slots = [index for index, holders in enumerate(self._holders) if not holders][:count]
+            if len(slots) < count:
+                raise RuntimeError(f"No free cores for {count} pool workers ({self.free} of {len(self.core_sets)} sets free)")
+        for index in slots:
+            self._holders[index] += 1
+        return slots
+
+    def release(self, slots: List[int]):
+        for index in slots:
+            self._holders[index] -= 1
+
+
+_core_allocator: Optional[CoreAllocator] = None
+
+
+def core_allocator() -> CoreAllocator:
+    """The process-wide allocator every pool takes its cores from"""
+    global _core_allocator
+    if _core_allocator is None:
+        _core_allocator = CoreAllocator(WORKER_POOL_TOTAL)
+    return _core_allocator
+
+
+def _init_worker(model_size: str, quantize: str, core_sets: List[List[int]], counter):
+    """Pin this worker to its core set, then load the model once"""
+    global _worker_model
+    from cpu_inference import configure_threads, load_cpu_model
+
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    cores = core_sets[index % len(core_sets)]
+    configure_threads(len(cores), cores)
+    _worker_model = load_cpu_model(model_size, quantize)
+
+
+def _worker_model_bytes() -> int:
+    from model_registry import model_bytes
+
+    return model_bytes(_worker_model) if _worker_model is not None else 0
+
+
+def _worker_transcribe(audio: np.ndarray, options: Dict[str, Any]) -> Dict[str, Any]:
+    return _worker_model.transcribe(audio, fp16=False, verbose=False, **options)
+
+
+class WorkerPool:
+    """Transcribes audio arrays on a pool of model worker processes"""
+
+    def __init__(
+        self,
+        workers: int,
+        model_size: str,
+        quantize: str = WHISPER_QUANTIZE,
+        share_cores_with: Optional["WorkerPool"] = None
+    ):
+        self.workers = workers
+        self.model_size = model_size
+        self._allocator = core_allocator()
+        # The replaced pool may already have stopped (unloaded meanwhile): then take free cores
+        share = share_cores_with._slots if share_cores_with is not None and share_cores_with._slots else None
+        self._slots = self._allocator.acquire(workers, share)
+        self.core_sets = [self._allocator.core_sets[index] for index in self._slots]
+        # spawn, not fork: torch's thread pools don't survive a fork
+        context = multiprocessing.get_context("spawn")
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(model_size, quantize, self.core_sets, context.Value("i", 0)),
+        )
+        self.ready = False
+        self.memory_bytes = 0
+
+    async def start(self):
+        """Start every worker and wait until each has loaded its model"""
+        loop = asyncio.get_running_loop()
+        # Submitting one task per worker at once makes the executor spawn them all
+        sizes = await asyncio.gather(*[
+            loop.run_in_executor(self._executor, _worker_model_bytes)
+            for _ in range(self.workers)
+        ])
+        self.memory_bytes = sum(sizes)
+        self.ready = True
+        print(f"Whisper worker pool ready: {self.workers} processes, {len(self.core_sets[0])} cores each")
+
+    async def stop(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._slots:
+            self._allocator.release(self._slots)
+            self._slots = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "cores_per_worker": len(self.core_sets[0]),
+            "core_sets_free": self._allocator.free,
+        }
+
+    async def transcribe(
+        self,
+        audio: np.ndarray,
+        language: Optional[str] = None,
+        task: str = "transcribe",
+        temperature: float = 0.0
+    ) -> Dict[str, Any]:
+        """Transcribe on the next free worker"""
+        loop = asyncio.get_running_loop()
+        options = {
+            "language": language,
+            "task": task,
+            "temperature": temperature,
+            "word_timestamps": True,
+        }
+        return await loop.run_in_executor(self._executor, _worker_transcribe, audio, options)